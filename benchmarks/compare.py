@@ -0,0 +1,80 @@
+"""
+Compare two benchmark result files and flag regressions.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.15
+
+Exits with status 1 when any metric got worse by more than the threshold (relative).
+"""
+import sys
+import json
+import argparse
+from typing import Any, Dict, Iterator, Tuple
+
+# Latency statistics compared for the end-to-end request and each node
+LATENCY_KEYS = ("p50_ms", "p95_ms")
+
+
+def metrics(results: Dict[str, Any]) -> Iterator[Tuple[str, float, bool]]:
+    """Yield (metric name, value, higher is better) for every comparable metric in a results file."""
+    for dataset, stats in results.get("ingestion", {}).items():
+        yield f"ingestion.{dataset}.docs_per_sec", stats.get("docs_per_sec"), True
+        yield f"ingestion.{dataset}.peak_rss_mb", stats.get("peak_rss_mb"), False
+    graph = results.get("graph", {})
+    for key in LATENCY_KEYS:
+        yield f"graph.end_to_end.{key}", graph.get("end_to_end", {}).get(key), False
+    for node, stats in graph.get("nodes", {}).items():
+        for key in LATENCY_KEYS:
+            yield f"graph.nodes.{node}.{key}", stats.get(key), False
+    if "peak_rss_mb" in graph:
+        yield "graph.peak_rss_mb", graph["peak_rss_mb"], False
+
+
+def compare(baseline: Dict[str, Any], candidate: Dict[str, Any], threshold: float) -> Tuple[list, list]:
+    """
+    Relative change of every metric present in both files.
+
+    Returns:
+        Tuple[list, list]: Rows of (metric, baseline, candidate, change), and the names of regressed metrics
+    """
+    baseline_metrics = {name: (value, higher) for name, value, higher in metrics(baseline)}
+    rows, regressions = [], []
+    for name, value, higher_is_better in metrics(candidate):
+        base = baseline_metrics.get(name, (None, None))[0]
+        if base is None or value is None or base == 0:
+            continue
+        change = (value - base) / base
+        worse = -change if higher_is_better else change
+        if worse > threshold:
+            regressions.append(name)
+        rows.append((name, base, value, change))
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    if baseline.get("config", {}).get("latency") != candidate.get("config", {}).get("latency"):
+        print("warning: the runs used different stand-in latencies", file=sys.stderr)
+
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    print(f"{(baseline['git'].get('commit') or '?')[:10]} -> {(candidate['git'].get('commit') or '?')[:10]}")
+    for name, base, value, change in rows:
+        flag = "  REGRESSION" if name in regressions else ""
+        print(f"{name:<45} {base:>10.1f} {value:>10.1f} {change:>+8.1%}{flag}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+Retrieval quality vs latency/cost evaluation of the search graph.
+
+Generate a labelled query set from data/flights.json, where the filters named in each
+query define the relevant flights:
+
+    python -m benchmarks.evaluate generate --count 150 --output benchmarks/labels/flights.jsonl
+
+Sweep retrieval settings over it, offline against an in-memory Qdrant with stand-in models,
+or against a live collection with the real models:
+
+    python -m benchmarks.evaluate run --labels benchmarks/labels/flights.jsonl --offline \\
+        --flight-k 10 20 40 --retrieval-mode dense hybrid --reranker rankllm none --quantization none scalar
+    python -m benchmarks.evaluate run --labels benchmarks/labels/flights.jsonl --offline --dimensions 0 384 256 128
+    python -m benchmarks.evaluate run --labels benchmarks/labels/flights.jsonl --collection flights --hnsw-ef 0 64 256
+
+Each line of a label file is {"query": ..., "key": <metadata field>, "relevant": [values of key]}.
+"""
+import os
+import json
+import math
+import time
+import random
+import asyncio
+import logging
+import argparse
+import warnings
+import itertools
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+import numpy as np
+from benchmarks.run import DATASETS, REPO_ROOT, RESULTS_DIR, add_latency_arguments, git_revision, install_stand_ins
+
+FLIGHTS_FILE = os.path.join(REPO_ROOT, "data", "flights.json")
+EVAL_COLLECTION_NAME = "jetkart_eval"
+
+# Query templates and the filters they state; a flight is relevant when it matches all of them
+TEMPLATES = [
+    ("{airline} flights to {to_country}", ("airline", "to_country")),
+    ("{travel_class} class flights from {from_country} to {to_country}", ("travel_class", "from_country", "to_country")),
+    ("flights from {from_country} to {to_country} under ${max_price}", ("from_country", "to_country", "max_price")),
+    ("{airline} {travel_class} class flights", ("airline", "travel_class")),
+    ("cheap flights to {to_country} under ${max_price}", ("to_country", "max_price")),
+]
+
+# Price bound of generated queries: the seed flight's price rounded up to this step
+PRICE_STEP = 500
+
+
+def _matches(record: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    for field_name, value in filters.items():
+        if field_name == "max_price":
+            if record["price_usd"] > value:
+                return False
+        elif record.get(field_name) != value:
+            return False
+    return True
+
+
+def generate_labels(flights: List[Dict[str, Any]], count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Synthetic labelled queries: a template filled from a random flight, labelled with the
+    `item_index` of every flight matching the template's filters.
+
+    Args:
+        flights: Records of data/flights.json, in file order
+        count: Number of distinct queries to generate
+        seed: Seed of the record and template choice
+
+    Returns:
+        List[Dict[str, Any]]: Labels with query, key, relevant and filters
+    """
+    rng = random.Random(seed)
+    labels: Dict[str, Dict[str, Any]] = {}
+    attempts = 0
+    while len(labels) < count and attempts < count * 50:
+        attempts += 1
+        template, fields = rng.choice(TEMPLATES)
+        record = rng.choice(flights)
+        filters = {
+            field_name: math.ceil(record["price_usd"] / PRICE_STEP) * PRICE_STEP if field_name == "max_price" else record[field_name]
+            for field_name in fields
+        }
+        values = {**filters, "travel_class": str(filters.get("travel_class", "")).replace("_", " ")}
+        query = template.format(**values)
+        if query in labels:
+            continue
+        relevant = [index for index, flight in enumerate(flights) if _matches(flight, filters)]
+        labels[query] = {"query": query, "key": "item_index", "relevant": relevant, "filters": filters}
+    return list(labels.values())
+
+
+def ranking_metrics(ranked: List[Any], relevant: set, cutoffs: List[int]) -> Dict[str, float]:
+    """recall@k (relative to min(|relevant|, k), so 1.0 is reachable) for each cut-off, and reciprocal rank."""
+    metrics = {}
+    for cutoff in cutoffs:
+        hits = len(relevant.intersection(ranked[:cutoff]))
+        metrics[f"recall@{cutoff}"] = hits / min(len(relevant), cutoff)
+    first_hit = next((rank for rank, value in enumerate(ranked, 1) if value in relevant), None)
+    metrics["mrr"] = 1.0 / first_hit if first_hit else 0.0
+    return metrics
+
+
+async def evaluate_config(
+    labels: List[Dict[str, Any]],
+    collection_name: str,
+    search_params: Dict[str, Any],
+    retrieval: Dict[str, Any],
+    cutoffs: List[int]
+) -> Dict[str, Any]:
+    """Run every labelled query with one configuration and average its quality, latency and cost."""
+    from src.graph import run_search_and_answer
+    from src.timings import summarize
+
+    per_query: List[Dict[str, float]] = []
+    latencies_ms: List[float] = []
+    costs: List[float] = []
+    tokens: List[int] = []
+    failures = 0
+    for label in labels:
+        relevant = set(label["relevant"])
+        start = time.perf_counter()
+        result = await run_search_and_answer(label["query"], collection_name, search_params, retrieval)
+        latencies_ms.append((time.perf_counter() - start) * 1000)
+        if not result["success"]:
+            failures += 1
+            continue
+
+        key = label.get("key", "item_index")
+        ranked = [doc.metadata.get(key) for doc in result["reranked_docs"]]
+        retrieved = {doc.metadata.get(key) for doc in result["retrieved_docs"]}
+        metrics = ranking_metrics(ranked, relevant, cutoffs)
+        depth = retrieval.get("flight_k") or len(result["retrieved_docs"]) or 1
+        metrics["candidate_recall"] = len(relevant & retrieved) / min(len(relevant), depth)
+        per_query.append(metrics)
+
+        total = summarize(result["timings"])
+        costs.append(total["cost_usd"])
+        tokens.append(total["input_tokens"] + total["output_tokens"])
+
+    quality = {name: float(np.mean([metrics[name] for metrics in per_query])) for name in (per_query[0] if per_query else {})}
+    p50, p95 = np.percentile(latencies_ms, [50, 95]) if latencies_ms else (None, None)
+    return {
+        "queries": len(labels),
+        "failures": failures,
+        **quality,
+        "p50_ms": float(p50) if p50 is not None else None,
+        "p95_ms": float(p95) if p95 is not None else None,
+        "mean_cost_usd": float(np.mean(costs)) if costs else 0.0,
+        "mean_tokens": float(np.mean(tokens)) if tokens else 0.0,
+    }
+
+
+def pareto_front(results: List[Dict[str, Any]], quality_metric: str) -> List[int]:
+    """Indexes of configurations no other configuration beats on quality, p95 latency and cost at once."""
+    def dominates(a, b):
+        at_least = (a[quality_metric] >= b[quality_metric] and a["p95_ms"] <= b["p95_ms"]
+                    and a["mean_cost_usd"] <= b["mean_cost_usd"])
+        better = (a[quality_metric] > b[quality_metric] or a["p95_ms"] < b["p95_ms"]
+                  or a["mean_cost_usd"] < b["mean_cost_usd"])
+        return at_least and better
+
+    metrics = [result["metrics"] for result in results]
+    return [
+        index for index, candidate in enumerate(metrics)
+        if quality_metric in candidate and not any(
+            quality_metric in other and dominates(other, candidate) for other in metrics if other is not candidate
+        )
+    ]
+
+
+async def prepare_offline_collections(quantizations: List[str], dimensions: List[int]) -> Dict[str, str]:
+    """One in-memory collection per quantization and vector size, holding every benchmark dataset."""
+    from src.models import FileType
+    from src.ingestion import create_collection, ingest_data_to_qdrant
+
+    collections = {}
+    for quantization, size in itertools.product(quantizations, dimensions):
+        label = f"{quantization}/{size}" if size else quantization
+        collection_name = f"{EVAL_COLLECTION_NAME}_{quantization}_{size or 'full'}"
+        created = await create_collection(collection_name, quantization=quantization, embedding_dimensions=size or None)
+        if not created["success"]:
+            raise RuntimeError(created["error"])
+        for files in DATASETS.values():
+            for path, file_type in files:
+                await ingest_data_to_qdrant(os.path.join(REPO_ROOT, path), FileType(file_type), collection_name)
+        collections[label] = collection_name
+    return collections
+
+
+def configurations(args: argparse.Namespace, collections: Dict[str, str]):
+    """Cartesian product of the swept settings."""
+    for (label, collection_name), flight_k, info_k, mode, reranker, hnsw_ef in itertools.product(
+        collections.items(), args.flight_k, args.info_k, args.retrieval_mode, args.reranker, args.hnsw_ef
+    ):
+        yield {
+            "collection": label,
+            "collection_name": collection_name,
+            "search_params": {"hnsw_ef": hnsw_ef or None},
+            "retrieval": {
+                "flight_k": flight_k,
+                "info_k": info_k,
+                "flight_top_n": args.top_n,
+                "info_top_n": args.top_n,
+                "merged_top_n": args.top_n,
+                "retrieval_mode": mode,
+                "reranker": reranker,
+            },
+        }
+
+
+async def run_evaluation(args: argparse.Namespace) -> Dict[str, Any]:
+    with open(args.labels, encoding="utf-8") as f:
+        labels = [json.loads(line) for line in f if line.strip()]
+    if args.limit:
+        labels = labels[:args.limit]
+
+    latencies = None
+    if args.offline:
+        latencies = install_stand_ins(
+            args.chat_latency, args.embedding_latency, args.sparse_latency, args.reranker_latency,
+            args.seed, chat_model=args.chat_model
+        )
+        collections = await prepare_offline_collections(args.quantization, args.dimensions)
+    else:
+        collections = {name: name for name in args.collection}
+
+    started = datetime.now(timezone.utc)
+    results = []
+    for config in configurations(args, collections):
+        metrics = await evaluate_config(labels, config["collection_name"], config["search_params"], config["retrieval"], args.cutoffs)
+        results.append({**config, "metrics": metrics})
+        print_row(config, metrics, args.cutoffs)
+
+    if args.offline:
+        from src.ingestion import shutdown_process_pool
+        shutdown_process_pool()
+
+    quality_metric = f"recall@{max(args.cutoffs)}"
+    for index in pareto_front(results, quality_metric):
+        results[index]["pareto_optimal"] = True
+    return {
+        "benchmark": "jetkart-retrieval-eval",
+        "started_at": started.isoformat(),
+        "git": git_revision(),
+        "config": {
+            "labels": args.labels, "queries": len(labels), "offline": args.offline, "cutoffs": args.cutoffs,
+            "latency": latencies, "pareto_metric": quality_metric,
+        },
+        "results": results,
+    }
+
+
+def describe(config: Dict[str, Any]) -> str:
+    retrieval = config["retrieval"]
+    return (f"{config['collection']:<10} k={retrieval['flight_k']:<3} info_k={retrieval['info_k']:<3} "
+            f"{retrieval['retrieval_mode']:<6} rerank={retrieval['reranker']:<7} ef={config['search_params']['hnsw_ef'] or '-':<4}")
+
+
+def print_row(config: Dict[str, Any], metrics: Dict[str, Any], cutoffs: List[int]):
+    quality = "  ".join(f"R@{cutoff} {metrics.get(f'recall@{cutoff}', 0):.3f}" for cutoff in cutoffs)
+    print(f"{describe(config)}  {quality}  MRR {metrics.get('mrr', 0):.3f}  cand {metrics.get('candidate_recall', 0):.3f}  "
+          f"p50 {metrics['p50_ms'] or 0:>7.0f} ms  p95 {metrics['p95_ms'] or 0:>7.0f} ms  ${metrics['mean_cost_usd']:.5f}/query")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="Write a synthetic labelled query set from data/flights.json")
+    generate.add_argument("--count", type=int, default=100)
+    generate.add_argument("--seed", type=int, default=0)
+    generate.add_argument("--output", default=os.path.join(REPO_ROOT, "benchmarks", "labels", "flights.jsonl"))
+
+    run = commands.add_parser("run", help="Sweep retrieval settings over a labelled query set")
+    run.add_argument("--labels", required=True)
+    run.add_argument("--limit", type=int, help="Only use the first N labels")
+    run.add_argument("--offline", action="store_true", help="In-memory Qdrant and stand-in models instead of the live services")
+    run.add_argument("--collection", nargs="+", default=["flights"], help="Live collections to compare (e.g. differently quantized or re-projected builds)")
+    run.add_argument("--quantization", nargs="+", default=["none"], choices=["none", "scalar", "binary"],
+                     help="Offline: build one collection per setting (local Qdrant searches exactly, so only the live service shows its effect)")
+    run.add_argument("--dimensions", type=int, nargs="+", default=[0],
+                     help="Offline: build one collection per truncated vector size; 0 keeps full vectors")
+    run.add_argument("--flight-k", type=int, nargs="+", default=[20])
+    run.add_argument("--info-k", type=int, nargs="+", default=[10])
+    run.add_argument("--top-n", type=int, default=10, help="Documents kept after reranking")
+    run.add_argument("--retrieval-mode", nargs="+", default=["dense"], choices=["dense", "sparse", "hybrid"])
+    run.add_argument("--reranker", nargs="+", default=["rankllm"], choices=["rankllm", "none"])
+    run.add_argument("--hnsw-ef", type=int, nargs="+", default=[0], help="Query-time hnsw_ef; 0 keeps the collection default")
+    run.add_argument("--cutoffs", type=int, nargs="+", default=[1, 5, 10])
+    run.add_argument("--chat-model", default="gemini-2.5-flash", help="Offline: model name used to price the stand-in's tokens")
+    run.add_argument("--output", help="Results file (default: benchmarks/results/eval-<commit>-<time>.json)")
+    add_latency_arguments(run)
+    # Offline latency then reflects the graph and local Qdrant only
+    run.set_defaults(chat_latency="constant:0", embedding_latency="constant:0", reranker_latency="constant:0")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.command == "generate":
+        with open(FLIGHTS_FILE, encoding="utf-8") as f:
+            flights = json.load(f)
+        labels = generate_labels(flights, args.count, args.seed)
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            for label in labels:
+                f.write(json.dumps(label) + "\n")
+        print(f"wrote {len(labels)} labelled queries to {args.output}")
+        return
+
+    logging.basicConfig(level=logging.WARNING)
+    warnings.filterwarnings("ignore", message="Payload indexes have no effect in the local Qdrant")
+    results = asyncio.run(run_evaluation(args))
+    print("pareto-optimal on " + results["config"]["pareto_metric"] + ", p95 latency and cost:")
+    for result in results["results"]:
+        if result.get("pareto_optimal"):
+            print(f"  {describe(result)}")
+
+    commit = (results["git"]["commit"] or "unknown")[:10]
+    stamp = datetime.fromisoformat(results["started_at"]).strftime("%Y%m%dT%H%M%S")
+    output_path = args.output or os.path.join(RESULTS_DIR, f"eval-{commit}-{stamp}.json")
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import re
+import json
+import math
+import time
+import zlib
+import random
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_qdrant.sparse_embeddings import SparseEmbeddings, SparseVector
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+DISTRIBUTIONS = ("constant", "uniform", "normal", "lognormal")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def _bucket(word: str, buckets: int) -> int:
+    # crc32 rather than hash(): stable across processes and PYTHONHASHSEED
+    return zlib.crc32(word.encode()) % buckets
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / 4))
+
+
+@dataclass
+class Latency:
+    """
+    Latency distribution of a stand-in model, sampled with its own seeded generator.
+
+    `spec` strings are `constant:<ms>`, `uniform:<low_ms>:<high_ms>`,
+    `normal:<mean_ms>:<stddev_ms>` or `lognormal:<median_ms>:<sigma>`.
+    """
+    distribution: str = "constant"
+    a: float = 0.0
+    b: float = 0.0
+    seed: int = 0
+    _rng: random.Random = field(init=False, repr=False)
+    _lock: threading.Lock = field(init=False, repr=False)
+
+    def __post_init__(self):
+        if self.distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution '{self.distribution}', expected one of {DISTRIBUTIONS}")
+        self._rng = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: str, seed: int = 0) -> "Latency":
+        name, *params = spec.split(":")
+        values = [float(param) for param in params] + [0.0, 0.0]
+        return cls(name, values[0], values[1], seed)
+
+    def spec(self) -> str:
+        if self.distribution == "constant":
+            return f"constant:{self.a:g}"
+        return f"{self.distribution}:{self.a:g}:{self.b:g}"
+
+    def sample(self) -> float:
+        """One latency in seconds."""
+        with self._lock:
+            if self.distribution == "constant":
+                ms = self.a
+            elif self.distribution == "uniform":
+                ms = self._rng.uniform(self.a, self.b)
+            elif self.distribution == "normal":
+                ms = self._rng.gauss(self.a, self.b)
+            else:
+                ms = self.a * math.exp(self._rng.gauss(0.0, self.b))
+        return max(ms, 0.0) / 1000
+
+    def wait(self):
+        time.sleep(self.sample())
+
+    async def await_(self):
+        await asyncio.sleep(self.sample())
+
+
+class FakeChatModel:
+    """
+    Stand-in for ChatGoogleGenerativeAI in the graph. Recognises the classification, filter
+    and answer prompts and replies deterministically from the query words, with token usage
+    estimated at four characters per token.
+    """
+
+    FLIGHT_WORDS = {"flight", "flights", "fly", "flying", "cheap", "cheapest", "business", "economy",
+                    "airline", "airlines", "nonstop", "wifi", "fare", "fares", "price"}
+    INFO_WORDS = {"visa", "visas", "refund", "refunds", "policy", "policies", "rule", "rules", "requirements",
+                  "cancel", "cancellation", "documents", "passport", "allowance", "tips"}
+    # Country filters only match after the preposition naming their direction
+    DIRECTION_WORDS = {"from_country": "from ", "to_country": "to "}
+
+    def __init__(self, latency: Optional[Latency] = None, model: str = "fake-chat", answer_words: int = 80):
+        self.latency = latency or Latency()
+        self.model = model
+        self.answer_words = answer_words
+
+    def _classify(self, query: str) -> str:
+        words = set(_words(query))
+        flight = bool(words & self.FLIGHT_WORDS)
+        info = bool(words & self.INFO_WORDS)
+        if flight and info:
+            return "both"
+        return "info_only" if info else "flight_only" if flight else "both"
+
+    def _filters(self, prompt: str, query: str) -> str:
+        query_text = f" {' '.join(_words(query))} "
+        filters: Dict[str, Any] = {}
+        for line in prompt.splitlines():
+            field_name, _, values = line.partition(": ")
+            if not values or not re.fullmatch(r"[a-z_]+", field_name):
+                continue
+            for value in values.split(" | "):
+                phrase = f" {self.DIRECTION_WORDS.get(field_name, '')}{' '.join(_words(value))} "
+                if value not in ("true", "false") and phrase in query_text:
+                    filters[field_name] = value
+                    break
+        price = re.search(r"(?:under|below|less than)\s*\$?\s*(\d+)", query.lower())
+        if price:
+            filters["max_price"] = int(price.group(1))
+        return json.dumps(filters)
+
+    def _answer(self, context: str, query: str) -> str:
+        words = (context or query).split()
+        return " ".join(words[:self.answer_words]) or "No context."
+
+    def invoke(self, messages: List[BaseMessage], **kwargs) -> AIMessage:
+        system = "\n".join(m.content for m in messages if isinstance(m, SystemMessage))
+        human = "\n".join(m.content for m in messages if isinstance(m, HumanMessage))
+        query = human.rsplit("User Query:", 1)[-1].split("\n\n")[0].strip() if "User Query:" in human else human
+
+        # With Gemini context caching the system prompt is not sent; the user suffix still identifies the call
+        if "Classify this query" in human:
+            content = self._classify(query)
+        elif "Generate filters" in human:
+            content = self._filters(f"{system}\n{human}", query)
+        else:
+            content = self._answer(system.split("Context:", 1)[-1], query)
+
+        self.latency.wait()
+        prompt_text = system + human
+        return AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": _approx_tokens(prompt_text),
+                "output_tokens": _approx_tokens(content),
+                "total_tokens": _approx_tokens(prompt_text) + _approx_tokens(content),
+            },
+        )
+
+    async def ainvoke(self, messages: List[BaseMessage], **kwargs) -> AIMessage:
+        return await asyncio.to_thread(self.invoke, messages, **kwargs)
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Dense stand-in: hashed bag of words and word bigrams, L2-normalised. Texts sharing
+    words are close, so retrieval behaves plausibly. One latency sample per call, batched or not.
+    """
+
+    def __init__(self, size: int = 768, latency: Optional[Latency] = None):
+        self.size = size
+        self.latency = latency or Latency()
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        words = _words(text)
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            vector[_bucket(feature, self.size)] += 1.0 if zlib.adler32(feature.encode()) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0] = norm = 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.latency.wait()
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.latency.wait()
+        return self._embed(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        self.latency.wait()
+        return [self._embed(text) for text in texts]
+
+
+class FakeSparseEmbeddings(SparseEmbeddings):
+    """Sparse stand-in for FastEmbed BM25: term frequencies over hashed word indices."""
+
+    BUCKETS = 1 << 20
+
+    def __init__(self, latency: Optional[Latency] = None):
+        self.latency = latency or Latency()
+
+    def _embed(self, text: str) -> SparseVector:
+        counts: Dict[int, float] = {}
+        for word in _words(text):
+            index = _bucket(word, self.BUCKETS)
+            counts[index] = counts.get(index, 0.0) + 1.0
+        indices = sorted(counts)
+        return SparseVector(indices=indices, values=[counts[index] for index in indices])
+
+    def embed_documents(self, texts: List[str]) -> List[SparseVector]:
+        self.latency.wait()
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> SparseVector:
+        self.latency.wait()
+        return self._embed(text)
+
+
+class FakeReranker:
+    """Stand-in for RankLLMRerank: orders documents by query word overlap, ties kept in input order."""
+
+    def __init__(self, top_n: int, latency: Optional[Latency] = None):
+        self.top_n = top_n
+        self.latency = latency or Latency()
+
+    def _rank(self, documents: List[Document], query: str) -> List[Document]:
+        query_words = set(_words(query))
+        scored = sorted(
+            enumerate(documents),
+            key=lambda item: (-len(query_words & set(_words(item[1].page_content))), item[0])
+        )
+        return [document for _, document in scored[:self.top_n]]
+
+    def compress_documents(self, documents: List[Document], query: str, callbacks=None) -> List[Document]:
+        self.latency.wait()
+        return self._rank(list(documents), query)
+
+    async def acompress_documents(self, documents: List[Document], query: str, callbacks=None) -> List[Document]:
+        await self.latency.await_()
+        return self._rank(list(documents), query)
@@ -0,0 +1,263 @@
+"""
+Load generator for a running JetKart API: drives /search (and optionally /ingest) with a
+query mix at a fixed request rate (open loop) or a fixed number of concurrent clients
+(closed loop), stepping through the given levels to find where the server saturates.
+
+    python -m benchmarks.server --workers 2
+    python -m benchmarks.load --concurrency 1 2 4 8 16 32 --duration 30
+    python -m benchmarks.load --rps 1 2 5 10 20 --mix flight_only=0.6,info_only=0.2,both=0.2 --ingest-ratio 0.02
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import httpx
+import numpy as np
+from benchmarks.run import COLLECTION_NAME, RESULTS_DIR, git_revision
+
+# Queries replayed per query type; the stand-in chat model classifies them the same way
+QUERY_MIX = {
+    "flight_only": [
+        "Turkish Airlines flights to Turkey",
+        "business class flights from India under $3000",
+        "cheapest economy flights to UK with wifi",
+        "Qantas flights to USA",
+        "Ryanair economy flights under $800",
+    ],
+    "info_only": [
+        "visa requirements for travelling to Japan",
+        "how long does a refund take after cancellation",
+        "what documents do I need for a Schengen visa",
+    ],
+    "both": [
+        "what is the refund policy for cancelled flights",
+        "Emirates flights to UAE and their baggage allowance",
+        "business class flights to UK and the visa rules for entry",
+    ],
+}
+DEFAULT_MIX = "flight_only=0.5,info_only=0.25,both=0.25"
+
+# A level counts as saturated once throughput grows less than this fraction over the previous level ...
+SATURATION_MIN_GAIN = 0.05
+# ... or its error rate exceeds this
+SATURATION_MAX_ERROR_RATE = 0.01
+
+
+@dataclass
+class Sample:
+    kind: str  # query type, or "ingest"
+    latency_ms: float
+    status: Optional[int]  # None when the request failed without a response
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status is not None and self.status < 400
+
+
+@dataclass
+class Workload:
+    collection_name: str
+    mix: Dict[str, float]
+    ingest_ratio: float
+    ingest_file: str
+    rng: random.Random = field(default_factory=random.Random)
+
+    def next_request(self):
+        """Endpoint, JSON body and kind of the next request."""
+        if self.rng.random() < self.ingest_ratio:
+            return "/ingest", {"filename": self.ingest_file, "collection_name": self.collection_name}, "ingest"
+        kinds = list(self.mix)
+        kind = self.rng.choices(kinds, weights=[self.mix[k] for k in kinds])[0]
+        query = self.rng.choice(QUERY_MIX[kind])
+        return "/search", {"query": query, "collection_name": self.collection_name}, kind
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in QUERY_MIX:
+            raise ValueError(f"Unknown query type '{kind}', expected one of {list(QUERY_MIX)}")
+        mix[kind] = float(weight)
+    return mix
+
+
+async def send(client: httpx.AsyncClient, workload: Workload, scheduled: float) -> Sample:
+    """Send one request; latency runs from `scheduled`, so queueing in the generator counts too."""
+    path, body, kind = workload.next_request()
+    try:
+        response = await client.post(path, json=body)
+        status, error = response.status_code, None if response.status_code < 400 else response.text[:200]
+    except httpx.HTTPError as e:
+        status, error = None, f"{type(e).__name__}: {e}"
+    return Sample(kind, (time.perf_counter() - scheduled) * 1000, status, error)
+
+
+async def run_closed_loop(client: httpx.AsyncClient, workload: Workload, concurrency: int, duration: float) -> List[Sample]:
+    """`concurrency` clients, each sending its next request as soon as the previous one finishes."""
+    deadline = time.perf_counter() + duration
+    samples: List[Sample] = []
+
+    async def user():
+        while time.perf_counter() < deadline:
+            samples.append(await send(client, workload, time.perf_counter()))
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return samples
+
+
+async def run_open_loop(client: httpx.AsyncClient, workload: Workload, rps: float, duration: float) -> List[Sample]:
+    """Poisson arrivals at `rps`, independent of how fast the server answers."""
+    start = time.perf_counter()
+    tasks = []
+    next_at = start
+    while next_at < start + duration:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(client, workload, next_at)))
+        next_at += workload.rng.expovariate(rps)
+    return list(await asyncio.gather(*tasks))
+
+
+def summarize_samples(samples: List[Sample], elapsed: float) -> Dict[str, Any]:
+    def stats(group: List[Sample]) -> Dict[str, Any]:
+        latencies = [sample.latency_ms for sample in group if sample.ok]
+        errors = sum(1 for sample in group if not sample.ok)
+        result = {
+            "requests": len(group),
+            "errors": errors,
+            "error_rate": errors / len(group) if group else 0.0,
+            "throughput_rps": sum(1 for sample in group if sample.ok) / elapsed if elapsed else 0.0,
+        }
+        if latencies:
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            result.update(p50_ms=float(p50), p95_ms=float(p95), p99_ms=float(p99), max_ms=float(max(latencies)))
+        return result
+
+    by_kind = {}
+    for sample in samples:
+        by_kind.setdefault(sample.kind, []).append(sample)
+    error_examples = sorted({sample.error or str(sample.status) for sample in samples if not sample.ok})[:5]
+    return {"overall": stats(samples), "by_kind": {kind: stats(group) for kind, group in sorted(by_kind.items())},
+            "error_examples": error_examples}
+
+
+def find_saturation(levels: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """First level where throughput stops growing or errors appear, with the last healthy level before it."""
+    previous = None
+    for level in levels:
+        overall = level["overall"]
+        if overall["error_rate"] > SATURATION_MAX_ERROR_RATE:
+            reason = f"error rate {overall['error_rate']:.1%}"
+        elif previous and overall["throughput_rps"] < previous["overall"]["throughput_rps"] * (1 + SATURATION_MIN_GAIN):
+            reason = "throughput stopped growing"
+        else:
+            previous = level
+            continue
+        return {"level": level["level"], "reason": reason,
+                "last_healthy_level": previous["level"] if previous else None,
+                "max_throughput_rps": max(l["overall"]["throughput_rps"] for l in levels)}
+    return None
+
+
+async def run_load(args: argparse.Namespace) -> Dict[str, Any]:
+    started = datetime.now(timezone.utc)
+    workload = Workload(
+        collection_name=args.collection,
+        mix=parse_mix(args.mix),
+        ingest_ratio=args.ingest_ratio,
+        ingest_file=args.ingest_file,
+        rng=random.Random(args.seed),
+    )
+    mode = "rps" if args.rps else "concurrency"
+    levels = args.rps or args.concurrency
+    max_connections = max(args.concurrency or [0]) or args.max_connections
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+
+    results = []
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        for level in levels:
+            if args.warmup:
+                await run_closed_loop(client, workload, 1, args.warmup)
+            start = time.perf_counter()
+            if mode == "rps":
+                samples = await run_open_loop(client, workload, level, args.duration)
+            else:
+                samples = await run_closed_loop(client, workload, int(level), args.duration)
+            elapsed = time.perf_counter() - start
+            summary = summarize_samples(samples, elapsed)
+            results.append({"level": level, "seconds": elapsed, **summary})
+            print_level(mode, level, summary)
+
+    return {
+        "benchmark": "jetkart-load",
+        "started_at": started.isoformat(),
+        "git": git_revision(),
+        "config": {
+            "url": args.url, "mode": mode, "levels": levels, "duration": args.duration, "mix": workload.mix,
+            "ingest_ratio": args.ingest_ratio, "seed": args.seed, "timeout": args.timeout,
+        },
+        "levels": results,
+        "saturation": find_saturation(results),
+    }
+
+
+def print_level(mode: str, level: float, summary: Dict[str, Any]):
+    overall = summary["overall"]
+    latency = f"p50 {overall.get('p50_ms', 0):>8.0f}  p95 {overall.get('p95_ms', 0):>8.0f}  p99 {overall.get('p99_ms', 0):>8.0f} ms"
+    print(f"{mode}={level:<6g} {overall['throughput_rps']:>7.2f} req/s  {latency}  errors {overall['error_rate']:.1%}")
+    for error in summary["error_examples"]:
+        print(f"    {error}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    levels = parser.add_mutually_exclusive_group()
+    levels.add_argument("--rps", type=float, nargs="+", help="Open loop: request rates to step through")
+    levels.add_argument("--concurrency", type=int, nargs="+", help="Closed loop: client counts to step through")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per level")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Seconds of single-client traffic before each level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Query type weights, e.g. flight_only=0.5,info_only=0.25,both=0.25")
+    parser.add_argument("--ingest-ratio", type=float, default=0.0, help="Fraction of requests sent to /ingest")
+    parser.add_argument("--ingest-file", default="data/test.md", help="File the /ingest requests load")
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--max-connections", type=int, default=1000, help="Connection pool size in rps mode")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/load-<commit>-<time>.json)")
+    args = parser.parse_args(argv)
+    if not args.rps and not args.concurrency:
+        args.concurrency = [1, 2, 4, 8, 16]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = asyncio.run(run_load(args))
+
+    saturation = results["saturation"]
+    if saturation:
+        print(f"saturated at {results['config']['mode']}={saturation['level']:g} ({saturation['reason']}); "
+              f"last healthy level {saturation['last_healthy_level']}, max {saturation['max_throughput_rps']:.2f} req/s")
+    else:
+        print("no saturation within the tested levels")
+
+    commit = (results["git"]["commit"] or "unknown")[:10]
+    stamp = datetime.fromisoformat(results["started_at"]).strftime("%Y%m%dT%H%M%S")
+    output_path = args.output or os.path.join(RESULTS_DIR, f"load-{commit}-{stamp}.json")
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
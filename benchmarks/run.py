@@ -0,0 +1,295 @@
+"""
+Offline end-to-end benchmarks: ingestion throughput and per-node graph latency against an
+in-memory Qdrant, with deterministic stand-ins for Gemini, the OpenAI reranker and FastEmbed.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --iterations 10 --chat-latency lognormal:700:0.35 --output baseline.json
+    python -m benchmarks.compare baseline.json benchmarks/results/<commit>-<time>.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import warnings
+import argparse
+import platform
+import resource
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+import numpy as np
+from benchmarks.fakes import Latency, FakeChatModel, FakeEmbeddings, FakeSparseEmbeddings, FakeReranker
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+COLLECTION_NAME = "jetkart_bench"
+
+# Dataset name -> files ingested for it, in order
+DATASETS = {
+    "flights": [("data/flights.json", "json")],
+    "markdown": [("data/refund_policies.md", "markdown"), ("data/visa_rules.md", "markdown")],
+}
+
+DEFAULT_QUERIES = [
+    "Turkish Airlines flights to Turkey",
+    "business class flights from India under $3000",
+    "cheapest economy flights to UK with wifi",
+    "visa requirements for travelling to Japan",
+    "what is the refund policy for cancelled flights",
+    "Emirates flights to UAE and their baggage allowance",
+]
+
+# Environment switches that change what the graph does, recorded with the results
+RECORDED_SETTINGS = ("FLIGHT_INDEX_ENABLED", "FILTER_OPTIONS_PRUNING", "PROMPT_CACHE", "INGESTION_WORKERS")
+
+
+def install_stand_ins(
+    chat_latency: str,
+    embedding_latency: str,
+    sparse_latency: str = "constant:0",
+    reranker_latency: str = "constant:0",
+    seed: int = 0,
+    vector_size: int = 768,
+    chat_model: str = "fake-chat"
+) -> Dict[str, str]:
+    """
+    Point the model factories of src at the stand-ins and Qdrant at an in-memory instance.
+
+    Args:
+        chat_latency: Latency spec of the Gemini stand-in, e.g. "lognormal:600:0.3"
+        embedding_latency: Latency spec of one embedding request
+        sparse_latency: Latency spec of the sparse model
+        reranker_latency: Latency spec of one reranker call
+        seed: Base seed of the latency samplers
+        vector_size: Dense vector size of the embedding stand-in; collections take their size from it
+        chat_model: Model name the chat stand-in reports; a priced name such as
+            "gemini-2.5-flash" makes its token counts show up as cost
+
+    Returns:
+        Dict[str, str]: Latency spec of each stand-in
+    """
+    os.environ["QDRANT_LOCATION"] = ":memory:"
+
+    import src.graph as graph
+    import src.embeddings as embeddings
+    import src.client_qdrant as client_qdrant
+    import src.shared_cache as shared_cache
+
+    chat = Latency.parse(chat_latency, seed)
+    embedding = Latency.parse(embedding_latency, seed + 1)
+    sparse = Latency.parse(sparse_latency, seed + 2)
+    reranker = Latency.parse(reranker_latency, seed + 3)
+
+    embeddings.embedding_model_factory = lambda model_name: FakeEmbeddings(vector_size, embedding)
+    client_qdrant.sparse_embedding_factory = lambda model_name: FakeSparseEmbeddings(sparse)
+    graph.chat_model_factory = lambda: FakeChatModel(chat, chat_model)
+    graph.reranker_factory = lambda top_n: FakeReranker(top_n, reranker)
+    # Collections live in the in-memory Qdrant, so their embedding records must not outlive the run
+    embeddings.COLLECTION_EMBEDDINGS_FILE = ""
+    # Cached answers and embeddings would hide the latency being measured
+    shared_cache.SHARED_CACHE_PATH = ""
+    embeddings.clear_embedding_models()
+    graph.llm = graph.client = None
+
+    return {"chat": chat.spec(), "embedding": embedding.spec(), "sparse": sparse.spec(), "reranker": reranker.spec()}
+
+
+def add_latency_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the latency samplers")
+    parser.add_argument("--chat-latency", default="lognormal:600:0.3", help="Gemini call latency, e.g. constant:0 or normal:600:100")
+    parser.add_argument("--embedding-latency", default="lognormal:120:0.3", help="Latency of one embedding request (a batch at ingestion)")
+    parser.add_argument("--sparse-latency", default="constant:0", help="Sparse embedding latency (local model)")
+    parser.add_argument("--reranker-latency", default="lognormal:1500:0.4", help="Reranker call latency")
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def latency_stats(values_ms: List[float]) -> Dict[str, float]:
+    if not values_ms:
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(values_ms, [50, 95, 99])
+    return {
+        "count": len(values_ms),
+        "mean_ms": float(np.mean(values_ms)),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "max_ms": float(np.max(values_ms)),
+    }
+
+
+def git_revision() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout
+        return {"commit": commit, "dirty": bool(status.strip())}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+async def bench_ingestion(collection_name: str, datasets: List[str]) -> Dict[str, Any]:
+    """Ingest each dataset into one fresh collection and measure documents/second and memory."""
+    from src.models import FileType
+    from src.ingestion import create_collection, ingest_data_to_qdrant, load_documents
+
+    created = await create_collection(collection_name)
+    if not created["success"]:
+        raise RuntimeError(created["error"])
+
+    results = {}
+    for dataset in datasets:
+        files = [(os.path.join(REPO_ROOT, path), FileType(file_type)) for path, file_type in DATASETS[dataset]]
+        # Warm-up parse: starts the chunking workers so their spawn time is not counted
+        for path, file_type in files:
+            await load_documents(path, file_type)
+
+        peak_before = peak_rss_mb()
+        start = time.perf_counter()
+        documents = 0
+        for path, file_type in files:
+            documents += await ingest_data_to_qdrant(path, file_type, collection_name)
+        elapsed = time.perf_counter() - start
+
+        results[dataset] = {
+            "documents": documents,
+            "seconds": elapsed,
+            "docs_per_sec": documents / elapsed if elapsed else None,
+            "peak_rss_mb": peak_rss_mb(),
+            "peak_rss_growth_mb": peak_rss_mb() - peak_before,
+        }
+        logger.info(f"Ingested {documents} {dataset} documents in {elapsed:.2f}s")
+    return results
+
+
+async def bench_graph(collection_name: str, queries: List[str], iterations: int, warmup: int) -> Dict[str, Any]:
+    """Run every query `warmup + iterations` times and aggregate the per-node timings of the measured runs."""
+    from src.graph import run_search_and_answer
+
+    for _ in range(warmup):
+        for query in queries:
+            await run_search_and_answer(query, collection_name)
+
+    node_ms: Dict[str, List[float]] = {}
+    upstream_ms: Dict[str, List[float]] = {}
+    end_to_end_ms: List[float] = []
+    query_types: Dict[str, str] = {}
+    failures = 0
+    peak_before = peak_rss_mb()
+    for _ in range(iterations):
+        for query in queries:
+            start = time.perf_counter()
+            result = await run_search_and_answer(query, collection_name)
+            end_to_end_ms.append((time.perf_counter() - start) * 1000)
+            if not result["success"]:
+                failures += 1
+                continue
+            query_types[query] = result["query_type"]
+            for node, record in result["timings"].items():
+                node_ms.setdefault(node, []).append(record["wall_ms"])
+                for upstream, elapsed in record["upstream_ms"].items():
+                    upstream_ms.setdefault(upstream, []).append(elapsed)
+
+    return {
+        "requests": len(end_to_end_ms),
+        "failures": failures,
+        "query_types": query_types,
+        "end_to_end": latency_stats(end_to_end_ms),
+        "nodes": {node: latency_stats(values) for node, values in sorted(node_ms.items())},
+        "upstream": {upstream: latency_stats(values) for upstream, values in sorted(upstream_ms.items())},
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_growth_mb": peak_rss_mb() - peak_before,
+    }
+
+
+async def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    latencies = install_stand_ins(
+        args.chat_latency, args.embedding_latency, args.sparse_latency, args.reranker_latency,
+        args.seed, args.vector_size
+    )
+    from src.ingestion import shutdown_process_pool
+
+    started = datetime.now(timezone.utc)
+    try:
+        ingestion = await bench_ingestion(args.collection, args.datasets)
+        graph = await bench_graph(args.collection, args.queries or DEFAULT_QUERIES, args.iterations, args.warmup)
+    finally:
+        shutdown_process_pool()
+
+    return {
+        "benchmark": "jetkart-e2e",
+        "started_at": started.isoformat(),
+        "git": git_revision(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "settings": {name: os.getenv(name) for name in RECORDED_SETTINGS},
+        },
+        "config": {
+            "seed": args.seed,
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "datasets": args.datasets,
+            "vector_size": args.vector_size,
+            "latency": latencies,
+        },
+        "ingestion": ingestion,
+        "graph": graph,
+    }
+
+
+def default_output_path(results: Dict[str, Any]) -> str:
+    commit = (results["git"]["commit"] or "unknown")[:10]
+    stamp = datetime.fromisoformat(results["started_at"]).strftime("%Y%m%dT%H%M%S")
+    return os.path.join(RESULTS_DIR, f"{commit}-{stamp}.json")
+
+
+def print_summary(results: Dict[str, Any]):
+    for dataset, stats in results["ingestion"].items():
+        print(f"ingest {dataset:<10} {stats['documents']:>6} docs  {stats['docs_per_sec']:>9.1f} docs/s  peak RSS {stats['peak_rss_mb']:.0f} MB")
+    graph = results["graph"]
+    print(f"graph: {graph['requests']} requests, {graph['failures']} failed")
+    for name, stats in [("end_to_end", graph["end_to_end"])] + list(graph["nodes"].items()):
+        if stats["count"]:
+            print(f"  {name:<20} n={stats['count']:<4} p50 {stats['p50_ms']:>8.1f} ms  p95 {stats['p95_ms']:>8.1f} ms")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5, help="Measured runs of each query")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured runs of each query first")
+    parser.add_argument("--datasets", nargs="+", choices=list(DATASETS), default=list(DATASETS))
+    parser.add_argument("--query", dest="queries", action="append", help="Query to run (repeatable); defaults to a built-in mix")
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--vector-size", type=int, default=768)
+    add_latency_arguments(parser)
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    warnings.filterwarnings("ignore", message="Payload indexes have no effect in the local Qdrant")
+
+    results = asyncio.run(run_benchmarks(args))
+
+    output_path = args.output or default_output_path(results)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print_summary(results)
+    print(f"results written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+The JetKart API (src.main:app) with stand-in upstreams, for load tests.
+
+    python -m benchmarks.server --workers 4 --port 8000
+    python -m benchmarks.load --url http://localhost:8000 --concurrency 1 2 4 8 16 32
+
+Every worker process holds its own in-memory Qdrant and ingests the benchmark
+collection at startup, so workers share nothing but the port, unless --shared-cache
+points them at a common SQLite cache (query embeddings, facet catalogs, and answers
+when ANSWER_CACHE_TTL is set).
+"""
+import os
+import logging
+import argparse
+from contextlib import asynccontextmanager
+import uvicorn
+from benchmarks.run import COLLECTION_NAME, DATASETS, REPO_ROOT, add_latency_arguments, install_stand_ins
+
+logger = logging.getLogger(__name__)
+
+# Workers are separate processes started by uvicorn; the command line reaches them through the environment
+ENV_PREFIX = "JETKART_BENCH_"
+LATENCY_SETTINGS = ("chat_latency", "embedding_latency", "sparse_latency", "reranker_latency")
+
+
+def _setting(name: str, default: str) -> str:
+    return os.getenv(f"{ENV_PREFIX}{name.upper()}", default)
+
+
+latencies = install_stand_ins(
+    _setting("chat_latency", "lognormal:600:0.3"),
+    _setting("embedding_latency", "lognormal:120:0.3"),
+    _setting("sparse_latency", "constant:0"),
+    _setting("reranker_latency", "lognormal:1500:0.4"),
+    # Distinct seeds per worker, otherwise every worker replays the same latency sequence
+    seed=int(_setting("seed", "0")) * 1000 + os.getpid() % 1000,
+)
+
+from src.main import app, NEST_ASYNCIO
+from src import shared_cache
+from src.models import FileType
+from src.ingestion import create_collection, ingest_data_to_qdrant
+
+shared_cache.SHARED_CACHE_PATH = _setting("shared_cache", "")
+
+_api_lifespan = app.router.lifespan_context
+
+
+async def seed_collection(collection_name: str):
+    """Create the benchmark collection in this worker's Qdrant and load every dataset into it."""
+    created = await create_collection(collection_name)
+    if not created["success"]:
+        raise RuntimeError(created["error"])
+    for files in DATASETS.values():
+        for path, file_type in files:
+            await ingest_data_to_qdrant(os.path.join(REPO_ROOT, path), FileType(file_type), collection_name)
+    logger.info(f"Seeded '{collection_name}' with stand-in latencies {latencies}")
+
+
+@asynccontextmanager
+async def lifespan(api):
+    async with _api_lifespan(api) as state:
+        await seed_collection(_setting("collection", COLLECTION_NAME))
+        yield state
+
+
+app.router.lifespan_context = lifespan
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--shared-cache", default="", help="SQLite file of the cross-worker cache (default: disabled)")
+    add_latency_arguments(parser)
+    args = parser.parse_args(argv)
+
+    for name in LATENCY_SETTINGS + ("seed", "collection", "shared_cache"):
+        os.environ[f"{ENV_PREFIX}{name.upper()}"] = str(getattr(args, name))
+
+    # nest_asyncio (when src.main applies it) needs the standard asyncio loop
+    uvicorn.run("benchmarks.server:app", host=args.host, port=args.port, workers=args.workers,
+                loop="asyncio" if NEST_ASYNCIO else "auto")
+
+
+if __name__ == "__main__":
+    main()
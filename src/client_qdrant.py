@@ -1,14 +1,55 @@
 import os
+import re
+import time
+import uuid
 import asyncio
 import logging
 from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, SparseVectorParams, Distance
+from qdrant_client.models import (
+    VectorParams, SparseVectorParams, Distance, HnswConfigDiff, OptimizersConfigDiff,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType, BinaryQuantization,
+    BinaryQuantizationConfig, SearchParams, QuantizationSearchParams,
+    CreateAliasOperation, CreateAlias, DeleteAliasOperation, DeleteAlias, CollectionStatus, PointStruct
+)
 from langchain_qdrant import FastEmbedSparse, RetrievalMode, QdrantVectorStore
-from typing import Optional
+from typing import Optional, Dict, Any, List, Callable
+from src.payloads import FLIGHT_INDEX_FIELDS, payload_key
 
 logger = logging.getLogger(__name__)
 
+# Indexing threshold (KB) restored after a bulk load when the collection had indexing disabled from the start
+DEFAULT_INDEXING_THRESHOLD = 20000
+
+# Collection of per-collection settings every host has to agree on (bulk-load state, embedding model),
+# one vectorless point per physical collection
+COLLECTION_SETTINGS_COLLECTION = os.getenv("COLLECTION_SETTINGS_COLLECTION", "jetkart_collection_settings")
+
+# Physical collections whose payload indexes this process has already created
+_indexed_collections: set = set()
+
+# Sparse model constructor override, e.g. an offline stand-in for FastEmbed in the benchmarks
+sparse_embedding_factory: Optional[Callable[[str], Any]] = None
+
+# Local Qdrant shared by every caller when QDRANT_LOCATION is set
+_local_client: Optional[QdrantClient] = None
+
 def get_qdrant_client(timeout: int = 30):
+    """
+    Qdrant Cloud client for QDRANT_CLOUD, or with QDRANT_LOCATION set (":memory:" or a
+    directory) a local in-process Qdrant. The local instance is shared, since each
+    local client has its own storage.
+    """
+    global _local_client
+    location = os.getenv("QDRANT_LOCATION")
+    if location:
+        if _local_client is None:
+            if location == ":memory:":
+                _local_client = QdrantClient(location=location)
+            else:
+                _local_client = QdrantClient(path=location)
+            logger.info(f"Using local Qdrant at {location}")
+        return _local_client
+    
     qdrant_url = os.getenv("QDRANT_CLOUD")
     return QdrantClient(
         url=qdrant_url,
@@ -18,6 +59,12 @@ def get_qdrant_client(timeout: int = 30):
         timeout=timeout
     )
 
+def get_sparse_embedding(model_name: str = "Qdrant/bm25"):
+    """Sparse embedding model used for hybrid retrieval."""
+    if sparse_embedding_factory is not None:
+        return sparse_embedding_factory(model_name)
+    return FastEmbedSparse(model_name=model_name)
+
 async def initialize_vector_store(
     client: QdrantClient,
     collection_name: str,
@@ -30,7 +77,7 @@ async def initialize_vector_store(
     Args:
         client: Initialized Qdrant client
         collection_name: Name of the collection to use
-        embedding_model: Gemini embedding model instance
+        embedding_model: Dense embedding model instance
         sparse_model: Name of the sparse embedding model
         
     Returns:
@@ -42,7 +89,7 @@ async def initialize_vector_store(
             client=client,
             collection_name=collection_name,
             embedding=embedding_model,
-            sparse_embedding=FastEmbedSparse(model_name=sparse_model),
+            sparse_embedding=get_sparse_embedding(sparse_model),
             sparse_vector_name = "default",
             retrieval_mode=RetrievalMode.HYBRID
         )
@@ -52,18 +99,180 @@ async def initialize_vector_store(
         logger.error(f"Failed to initialize vector store: {str(e)}")
         return None
 
+def _settings_point_id(collection_name: str) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"jetkart/collections/{collection_name}"))
+
+
+def get_collection_settings(client: QdrantClient, collection_name: str) -> Dict[str, Any]:
+    """Settings recorded for a physical collection, or an empty dict. Blocking; see `load_collection_settings`."""
+    if not client.collection_exists(COLLECTION_SETTINGS_COLLECTION):
+        return {}
+    points = client.retrieve(COLLECTION_SETTINGS_COLLECTION, ids=[_settings_point_id(collection_name)], with_payload=True)
+    return dict(points[0].payload or {}) if points else {}
+
+
+def put_collection_settings(client: QdrantClient, collection_name: str, **settings) -> Dict[str, Any]:
+    """
+    Merge `settings` into the record of a physical collection, creating the settings
+    collection on first use. Blocking; see `save_collection_settings`.
+    
+    Returns:
+        Dict[str, Any]: The collection's settings after the update
+    """
+    if not client.collection_exists(COLLECTION_SETTINGS_COLLECTION):
+        try:
+            client.create_collection(COLLECTION_SETTINGS_COLLECTION, vectors_config={})
+        except Exception:
+            # Another worker created it in the meantime
+            if not client.collection_exists(COLLECTION_SETTINGS_COLLECTION):
+                raise
+    merged = {**get_collection_settings(client, collection_name), **settings, "collection_name": collection_name}
+    client.upsert(
+        collection_name=COLLECTION_SETTINGS_COLLECTION,
+        points=[PointStruct(id=_settings_point_id(collection_name), vector={}, payload=merged)],
+        wait=True
+    )
+    return merged
+
+
+async def load_collection_settings(client: QdrantClient, collection_name: str) -> Dict[str, Any]:
+    """Settings recorded for a physical collection, or an empty dict."""
+    return await asyncio.to_thread(get_collection_settings, client, collection_name)
+
+
+async def save_collection_settings(client: QdrantClient, collection_name: str, **settings) -> Dict[str, Any]:
+    """Merge `settings` into the record of a physical collection; see `put_collection_settings`."""
+    return await asyncio.to_thread(lambda: put_collection_settings(client, collection_name, **settings))
+
+
+async def delete_collection_settings(client: QdrantClient, collection_name: str) -> None:
+    """Forget the settings of a physical collection that was deleted."""
+    _indexed_collections.discard(collection_name)
+    if await asyncio.to_thread(client.collection_exists, COLLECTION_SETTINGS_COLLECTION):
+        await asyncio.to_thread(
+            client.delete, collection_name=COLLECTION_SETTINGS_COLLECTION, points_selector=[_settings_point_id(collection_name)]
+        )
+
+
+def build_collection_config(
+    vector_size: int,
+    hnsw_m: Optional[int] = None,
+    hnsw_ef_construct: Optional[int] = None,
+    quantization: str = "none",
+    quantization_always_ram: bool = True,
+    on_disk_vectors: bool = False,
+    on_disk_payload: bool = False,
+    indexing_threshold: Optional[int] = None,
+    memmap_threshold: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Build the keyword arguments of `QdrantClient.create_collection` for the given storage options.
+    
+    Args:
+        vector_size: Size of the dense vectors
+        hnsw_m: Edges per node in the HNSW graph (Qdrant default 16)
+        hnsw_ef_construct: Neighbours considered while building the graph (Qdrant default 100)
+        quantization: "none", "scalar" (int8) or "binary"
+        quantization_always_ram: Keep quantized vectors in RAM even when originals are on disk
+        on_disk_vectors: Store original vectors on disk (memmap) instead of RAM
+        on_disk_payload: Store payloads on disk instead of RAM
+        indexing_threshold: Segment size in KB above which the HNSW index is built
+        memmap_threshold: Segment size in KB above which segments are memmapped
+        
+    Returns:
+        Dict[str, Any]: vectors, sparse vectors, HNSW, optimizer and quantization configs
+    """
+    if quantization == "scalar":
+        quantization_config = ScalarQuantization(
+            scalar=ScalarQuantizationConfig(
+                type=ScalarType.INT8,
+                quantile=0.99,
+                always_ram=quantization_always_ram
+            )
+        )
+    elif quantization == "binary":
+        quantization_config = BinaryQuantization(
+            binary=BinaryQuantizationConfig(always_ram=quantization_always_ram)
+        )
+    elif quantization == "none":
+        quantization_config = None
+    else:
+        raise ValueError(f"Unsupported quantization: {quantization}")
+    
+    hnsw_config = None
+    if hnsw_m is not None or hnsw_ef_construct is not None:
+        hnsw_config = HnswConfigDiff(m=hnsw_m, ef_construct=hnsw_ef_construct)
+    
+    optimizers_config = None
+    if indexing_threshold is not None or memmap_threshold is not None:
+        optimizers_config = OptimizersConfigDiff(
+            indexing_threshold=indexing_threshold,
+            memmap_threshold=memmap_threshold
+        )
+    
+    return {
+        "vectors_config": VectorParams(
+            size=vector_size,
+            distance=Distance.COSINE,
+            on_disk=on_disk_vectors or None
+        ),
+        "sparse_vectors_config": {
+            "default": SparseVectorParams()
+        },
+        "on_disk_payload": on_disk_payload or None,
+        "hnsw_config": hnsw_config,
+        "optimizers_config": optimizers_config,
+        "quantization_config": quantization_config,
+    }
+
+
+def build_search_params(
+    hnsw_ef: Optional[int] = None,
+    oversampling: Optional[float] = None,
+    rescore: Optional[bool] = None,
+    exact: bool = False
+) -> Optional[SearchParams]:
+    """
+    Build per-request search parameters, or None to use the collection defaults.
+    
+    Args:
+        hnsw_ef: Size of the HNSW candidate list at query time
+        oversampling: Fetch `oversampling * k` candidates with quantized vectors before rescoring
+        rescore: Rescore quantized candidates with the original vectors
+        exact: Bypass the index and do an exact search
+    """
+    quantization = None
+    if oversampling is not None or rescore is not None:
+        quantization = QuantizationSearchParams(oversampling=oversampling, rescore=rescore)
+    
+    if hnsw_ef is None and quantization is None and not exact:
+        return None
+    return SearchParams(hnsw_ef=hnsw_ef, exact=exact, quantization=quantization)
+
+
 async def create_qdrant_collection(
     collection_name: str,
     client: QdrantClient,
     vector_size: int,
+    bulk_load: bool = False,
+    **storage_options
 ) -> None:
     """
-    Create a new collection in Qdrant. If collection exists, it will be deleted and recreated.
+    Create one physical version of a collection in Qdrant. This is a `{name}_v{n}`
+    collection, numbered by `create_collection` one above the newest existing version,
+    so the live version behind the alias is never touched. Pointing the alias at it is
+    left to `create_collection` and `promote_collection_version`. A leftover collection
+    with the same name, e.g. from a failed earlier create, is deleted first together
+    with its collection settings.
     
     Args:
-        collection_name: Name of the collection to create
+        collection_name: Physical name of the version to create, e.g. `flights_v3`
         client: Initialized Qdrant client
         vector_size: Size of the vectors
+        bulk_load: Create the collection with HNSW indexing disabled and without payload
+            indexes; both are built by `finish_bulk_load` once the data is in. The requested
+            `indexing_threshold` is recorded in the collection settings and restored then.
+        storage_options: HNSW, quantization and on-disk options, see `build_collection_config`
     """
     try:
         collections = await asyncio.to_thread(client.get_collections)
@@ -72,22 +281,29 @@ async def create_qdrant_collection(
         if any(collection.name == collection_name for collection in collections.collections):
             await asyncio.to_thread(client.delete_collection, collection_name)
             logger.info(f"Deleted existing collection: {collection_name}")
+        await delete_collection_settings(client, collection_name)
+        
+        requested_threshold = storage_options.get("indexing_threshold")
+        if bulk_load:
+            storage_options["indexing_threshold"] = 0
         
         await asyncio.to_thread(
             client.create_collection,
             collection_name=collection_name,
-            vectors_config=VectorParams(
-                size=vector_size,
-                distance=Distance.COSINE
-            ),
-            sparse_vectors_config={
-                "default": SparseVectorParams()
-            }
+            **build_collection_config(vector_size, **storage_options)
         )
         logger.info(f"Successfully created collection: {collection_name}")
         
-        # Create payload indexes for filtering
-        await create_filter_indexes(client, collection_name)
+        if bulk_load:
+            await save_collection_settings(
+                client,
+                collection_name,
+                bulk_loading=True,
+                indexing_threshold=requested_threshold if requested_threshold is not None else DEFAULT_INDEXING_THRESHOLD
+            )
+        else:
+            # Create payload indexes for filtering
+            await create_filter_indexes(client, collection_name)
         
     except Exception as e:
         logger.error(f"Error in collection creation: {str(e)}")
@@ -97,40 +313,30 @@ async def create_qdrant_collection(
 async def create_filter_indexes(client: QdrantClient, collection_name: str) -> None:
     """
     Create payload indexes for fields that will be used in filtering.
+    The indexes are requested concurrently; Qdrant builds them in parallel.
     
     Args:
         client: Initialized Qdrant client
         collection_name: Name of the collection
     """
+    async def create_index(field_name: str, field_type: str) -> None:
+        try:
+            await asyncio.to_thread(
+                client.create_payload_index,
+                collection_name=collection_name,
+                field_name=payload_key(field_name),
+                field_schema=field_type
+            )
+            logger.info(f"Created index for field: {field_name} ({field_type})")
+        except Exception as e:
+            logger.warning(f"Failed to create index for field {field_name}: {str(e)}")
+            # Continue with other fields even if one fails
+    
     try:
-        # Define the fields we want to index for filtering
-        filter_fields = [
-            ("document_type", "keyword"),
-            ("airline", "keyword"),
-            ("alliance", "keyword"),
-            ("from_country", "keyword"),
-            ("to_country", "keyword"),
-            ("travel_class", "keyword"),
-            ("price_usd", "integer"),
-            ("refundable", "bool"),
-            ("baggage_included", "bool"),
-            ("wifi_available", "bool"),
-            ("meal_service", "keyword"),
-            ("aircraft_type", "keyword"),
-        ]
-        
-        for field_name, field_type in filter_fields:
-            try:
-                await asyncio.to_thread(
-                    client.create_payload_index,
-                    collection_name=collection_name,
-                    field_name=field_name,
-                    field_schema=field_type
-                )
-                logger.info(f"Created index for field: {field_name} ({field_type})")
-            except Exception as e:
-                logger.warning(f"Failed to create index for field {field_name}: {str(e)}")
-                # Continue with other fields even if one fails
+        await asyncio.gather(*(
+            create_index(field_name, field_type) for field_name, field_type in FLIGHT_INDEX_FIELDS
+        ))
+        _indexed_collections.add(collection_name)
         
         logger.info(f"Successfully created filter indexes for collection: {collection_name}")
         
@@ -142,23 +348,240 @@ async def ensure_filter_indexes(client: QdrantClient, collection_name: str) -> N
     """
     Ensure that payload indexes exist for fields that will be used in filtering.
     This function can be called for existing collections that may not have the necessary indexes.
+    Each physical collection is only indexed once per process, and collections that are
+    still bulk loading are left alone: `finish_bulk_load` indexes them.
     
     Args:
         client: Initialized Qdrant client
         collection_name: Name of the collection
     """
     try:
-        # Check if collection exists
-        collections = await asyncio.to_thread(client.get_collections)
-        collection_exists = any(collection.name == collection_name for collection in collections.collections)
+        # Check if collection exists, looking through aliases
+        physical_name = await resolve_collection(client, collection_name)
         
-        if not collection_exists:
+        if physical_name is None:
             logger.warning(f"Collection {collection_name} does not exist, cannot create indexes")
             return
+        if physical_name in _indexed_collections:
+            return
+        if (await load_collection_settings(client, physical_name)).get("bulk_loading"):
+            logger.info(f"Collection {physical_name} is bulk loading, its indexes are created when it finishes")
+            return
         
         # Create indexes for the collection
-        await create_filter_indexes(client, collection_name)
+        await create_filter_indexes(client, physical_name)
         
     except Exception as e:
         logger.error(f"Error ensuring filter indexes: {str(e)}")
         raise
+
+
+def versioned_collection_name(collection_name: str, version: int) -> str:
+    """Name of the physical collection holding `version` of a logical collection."""
+    return f"{collection_name}_v{version}"
+
+
+async def list_collection_versions(client: QdrantClient, collection_name: str) -> List[int]:
+    """
+    List the versions of a logical collection, i.e. physical collections named `{collection_name}_v{n}`.
+    
+    Returns:
+        List[int]: Version numbers in ascending order
+    """
+    pattern = re.compile(rf"^{re.escape(collection_name)}_v(\d+)$")
+    collections = await asyncio.to_thread(client.get_collections)
+    return sorted(
+        int(match.group(1))
+        for match in (pattern.match(collection.name) for collection in collections.collections)
+        if match
+    )
+
+
+async def get_alias_target(client: QdrantClient, alias_name: str) -> Optional[str]:
+    """Return the physical collection an alias points to, or None if there is no such alias."""
+    aliases = await asyncio.to_thread(client.get_aliases)
+    for alias in aliases.aliases:
+        if alias.alias_name == alias_name:
+            return alias.collection_name
+    return None
+
+
+def physical_collection(client: QdrantClient, collection_name: str) -> Optional[str]:
+    """Blocking `resolve_collection`, for callers on worker threads."""
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == collection_name:
+            return alias.collection_name
+    return collection_name if client.collection_exists(collection_name) else None
+
+
+async def resolve_collection(client: QdrantClient, collection_name: str) -> Optional[str]:
+    """
+    Resolve a collection name through the aliases.
+    
+    Returns:
+        Optional[str]: The alias target, the name itself for a plain collection, or None if neither exists
+    """
+    return await asyncio.to_thread(physical_collection, client, collection_name)
+
+
+async def swap_collection_alias(client: QdrantClient, collection_name: str, physical_name: str) -> Optional[str]:
+    """
+    Atomically point the alias `collection_name` at `physical_name`.
+    
+    A plain (pre-alias) collection named `collection_name` has to be dropped first because an alias
+    cannot shadow a collection; that one-off migration is the only non-atomic step.
+    
+    Returns:
+        Optional[str]: The physical collection the alias pointed to before, if any
+    """
+    previous = await get_alias_target(client, collection_name)
+    operations = []
+    if previous:
+        operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=collection_name)))
+    else:
+        collections = await asyncio.to_thread(client.get_collections)
+        if any(collection.name == collection_name for collection in collections.collections):
+            logger.warning(f"Dropping legacy collection '{collection_name}' so it can become an alias")
+            await asyncio.to_thread(client.delete_collection, collection_name)
+    
+    operations.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=physical_name, alias_name=collection_name)))
+    await asyncio.to_thread(client.update_collection_aliases, change_aliases_operations=operations)
+    logger.info(f"Alias '{collection_name}' now points to '{physical_name}' (was '{previous}')")
+    return previous
+
+
+async def garbage_collect_versions(client: QdrantClient, collection_name: str, keep_previous: int = 0) -> List[str]:
+    """
+    Delete old versions of a logical collection that the alias no longer points to.
+    
+    Versions newer than the live one are kept because they may still be loading.
+    
+    Args:
+        client: Initialized Qdrant client
+        collection_name: Logical collection (alias) name
+        keep_previous: Number of versions older than the live one to keep for rollback
+        
+    Returns:
+        List[str]: Names of the deleted physical collections
+    """
+    live = await get_alias_target(client, collection_name)
+    versions = await list_collection_versions(client, collection_name)
+    live_version = next((v for v in versions if versioned_collection_name(collection_name, v) == live), None)
+    if live_version is None:
+        return []
+    
+    older = [v for v in versions if v < live_version]
+    doomed = older[:len(older) - keep_previous] if keep_previous else older
+    deleted = []
+    for version in doomed:
+        physical_name = versioned_collection_name(collection_name, version)
+        await asyncio.to_thread(client.delete_collection, physical_name)
+        await delete_collection_settings(client, physical_name)
+        deleted.append(physical_name)
+        logger.info(f"Garbage-collected old collection version: {physical_name}")
+    return deleted
+
+
+async def is_live_collection(client: QdrantClient, collection_name: str) -> bool:
+    """
+    Whether searches may be reading `collection_name`: it is an alias, an alias points at it,
+    or it is a plain collection from before aliases existed.
+    """
+    aliases = await asyncio.to_thread(client.get_aliases)
+    if any(collection_name in (alias.alias_name, alias.collection_name) for alias in aliases.aliases):
+        return True
+    return re.search(r"_v\d+$", collection_name) is None and await resolve_collection(client, collection_name) is not None
+
+
+async def begin_bulk_load(client: QdrantClient, collection_name: str) -> int:
+    """
+    Turn HNSW indexing off for the duration of a bulk load. The threshold to restore is
+    recorded in the collection settings first, so any later job or a promotion can restore it.
+    
+    Returns:
+        int: The indexing threshold to restore afterwards
+    """
+    settings = await load_collection_settings(client, collection_name)
+    if settings.get("bulk_loading"):
+        # Created for a bulk load, or left so by an interrupted job: indexing is already off
+        return settings.get("indexing_threshold", DEFAULT_INDEXING_THRESHOLD)
+    info = await asyncio.to_thread(client.get_collection, collection_name)
+    threshold = info.config.optimizer_config.indexing_threshold or DEFAULT_INDEXING_THRESHOLD
+    await save_collection_settings(client, collection_name, bulk_loading=True, indexing_threshold=threshold)
+    await asyncio.to_thread(
+        client.update_collection,
+        collection_name=collection_name,
+        optimizers_config=OptimizersConfigDiff(indexing_threshold=0)
+    )
+    logger.info(f"Disabled indexing on '{collection_name}' for bulk load (threshold was {threshold})")
+    return threshold
+
+
+async def restore_indexing(client: QdrantClient, collection_name: str, indexing_threshold: Optional[int] = None) -> int:
+    """
+    Turn HNSW indexing back on after a bulk load, without waiting for the optimizer.
+    
+    Args:
+        client: Initialized Qdrant client
+        collection_name: Name of the bulk-loaded collection
+        indexing_threshold: Indexing threshold (KB) to restore; defaults to the one recorded
+            by `begin_bulk_load` or at creation
+    
+    Returns:
+        int: The restored indexing threshold
+    """
+    if indexing_threshold is None:
+        settings = await load_collection_settings(client, collection_name)
+        indexing_threshold = settings.get("indexing_threshold", DEFAULT_INDEXING_THRESHOLD)
+    await asyncio.to_thread(
+        client.update_collection,
+        collection_name=collection_name,
+        optimizers_config=OptimizersConfigDiff(indexing_threshold=indexing_threshold)
+    )
+    await save_collection_settings(client, collection_name, bulk_loading=False)
+    logger.info(f"Re-enabled indexing on '{collection_name}' (threshold {indexing_threshold})")
+    return indexing_threshold
+
+
+async def wait_for_collection_green(
+    client: QdrantClient,
+    collection_name: str,
+    timeout: float = 1800,
+    poll_interval: float = 2
+) -> None:
+    """
+    Wait until the optimizer has finished and the collection status is green.
+    
+    Raises:
+        TimeoutError: If the collection is not green within `timeout` seconds
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        info = await asyncio.to_thread(client.get_collection, collection_name)
+        if info.status == CollectionStatus.GREEN:
+            return
+        if info.status == CollectionStatus.RED:
+            raise RuntimeError(f"Collection '{collection_name}' optimizer failed: {info.optimizer_status}")
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Collection '{collection_name}' still {info.status.value} after {timeout:.0f}s")
+        await asyncio.sleep(poll_interval)
+
+
+async def finish_bulk_load(
+    client: QdrantClient,
+    collection_name: str,
+    indexing_threshold: Optional[int] = None
+) -> None:
+    """
+    Build payload indexes concurrently, turn HNSW indexing back on and wait for the optimizer.
+    
+    Args:
+        client: Initialized Qdrant client
+        collection_name: Name of the bulk-loaded collection
+        indexing_threshold: Indexing threshold (KB) to restore; defaults to the recorded one
+    """
+    await create_filter_indexes(client, collection_name)
+    await restore_indexing(client, collection_name, indexing_threshold)
+    logger.info(f"Waiting for the optimizer of '{collection_name}'")
+    await wait_for_collection_green(client, collection_name)
+    logger.info(f"Collection '{collection_name}' is indexed and ready")
@@ -0,0 +1,104 @@
+"""
+Per-request deadlines for the search graph.
+
+Every search gets a deadline in GraphState. Nodes await upstream calls through
+`with_deadline`, keeping back the time later steps need, and degrade instead of
+waiting past it:
+- filter generation falls back to rule-based filters;
+- reranking is skipped and documents keep their retrieval order;
+- the answer is written from fewer documents, or replaced by a list of the best matches.
+
+Each degradation is recorded in the state's `degraded` list and noted in the answer.
+Steps that fell back after an error are recorded the same way, so no fallback answer
+is ever stored in the shared answer cache.
+Calls running in worker threads can't be interrupted; a timed-out call finishes in the
+background and its result is discarded.
+"""
+import os
+import math
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Default budget of a search, end to end
+SEARCH_TIMEOUT_SECONDS = float(os.getenv("SEARCH_TIMEOUT_SECONDS", "30"))
+
+# Time kept back for answer generation while the earlier steps run
+ANSWER_RESERVE_SECONDS = float(os.getenv("ANSWER_RESERVE_SECONDS", "6"))
+
+# Time kept back for retrieval while classification and filter generation run
+RETRIEVAL_RESERVE_SECONDS = float(os.getenv("RETRIEVAL_RESERVE_SECONDS", "2"))
+
+# Least time left beyond the reserves to still call the LLM for classification or filters
+LLM_STEP_MIN_SECONDS = float(os.getenv("LLM_STEP_MIN_SECONDS", "1.5"))
+
+# Least time left beyond the answer reserve to still rerank
+RERANK_MIN_SECONDS = float(os.getenv("RERANK_MIN_SECONDS", "3"))
+
+# With less time than this left, the answer is written from SHORT_CONTEXT_DOCUMENTS documents
+SHORT_CONTEXT_SECONDS = float(os.getenv("SHORT_CONTEXT_SECONDS", "8"))
+SHORT_CONTEXT_DOCUMENTS = 3
+
+# Grace period past the deadline before the whole graph run is abandoned
+HARD_TIMEOUT_GRACE_SECONDS = 2.0
+
+DEGRADATION_NOTES = {
+    "classification": "the query type was not classified",
+    "filters": "filters were derived without the LLM",
+    "retrieval": "the search for documents failed or ran out of time",
+    "embeddings": "documents were matched by keywords only while the embedding service is failing",
+    "reranking": "results are in search order instead of reranked",
+    "context": "the answer was written from fewer documents",
+    "answer": "the answer model failed, did not reply in time or is unavailable",
+}
+
+
+def new_deadline(timeout: Optional[float] = None) -> float:
+    """Deadline, as a time.time() value, of a search starting now."""
+    return time.time() + (timeout or SEARCH_TIMEOUT_SECONDS)
+
+
+def budget(state: Dict[str, Any], reserve: float = 0.0) -> float:
+    """Seconds left before the state's deadline minus `reserve`; infinite without a deadline."""
+    deadline = state.get("deadline")
+    if not deadline:
+        return math.inf
+    return deadline - time.time() - reserve
+
+
+def reserve_for(state: Dict[str, Any], seconds: float) -> float:
+    """`seconds` to keep back for later steps, but at most half the time left, so a short budget still gets its own turn."""
+    return min(seconds, budget(state) / 2)
+
+
+async def with_deadline(state: Dict[str, Any], awaitable: Awaitable, reserve: float = 0.0) -> Any:
+    """
+    Await `awaitable` until only `reserve` seconds are left before the deadline.
+
+    Raises:
+        asyncio.TimeoutError: When that time has passed, including before it starts
+    """
+    timeout = budget(state, reserve)
+    if timeout == math.inf:
+        return await awaitable
+    if timeout <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise asyncio.TimeoutError()
+    return await asyncio.wait_for(awaitable, timeout)
+
+
+def add_degradations(left: Optional[List[str]], right: Optional[List[str]]) -> List[str]:
+    """GraphState reducer for `degraded`; like `timings`, the empty list of a run's input starts over."""
+    if not right:
+        return []
+    return (left or []) + [step for step in right if step not in (left or [])]
+
+
+def degradation_note(degraded: List[str]) -> str:
+    """Sentence appended to a degraded answer."""
+    reasons = "; ".join(DEGRADATION_NOTES.get(step, step) for step in degraded)
+    return f"(Answered with fallbacks: {reasons}.)"
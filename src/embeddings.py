@@ -1,38 +1,423 @@
 import os
+import json
+import time
+import queue
+import asyncio
 import logging
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from langchain_core.embeddings import Embeddings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from src.metrics import QUERY_EMBEDDING_BATCH_SIZE
+from src.resilience import call_upstream_sync
+from src.client_qdrant import get_qdrant_client, physical_collection, get_collection_settings, put_collection_settings
+from src import shared_cache
 
 logger = logging.getLogger(__name__)
 
-def get_embedding_model(model_name: str = "text-embedding-004"):
+# Backend and model of new collections; the model defaults to the backend's default model
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "gemini")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL") or None
+
+# FastEmbed downloads models into this directory; pre-populate it and set HF_HUB_OFFLINE=1 on air-gapped hosts
+FASTEMBED_CACHE_DIR = os.getenv("FASTEMBED_CACHE_DIR") or None
+FASTEMBED_THREADS = int(os.getenv("FASTEMBED_THREADS", "0")) or None
+
+# Concurrent query embeddings are sent to the model together, up to this many per call ...
+QUERY_EMBEDDING_MAX_BATCH = int(os.getenv("QUERY_EMBEDDING_MAX_BATCH", "32"))
+# ... waiting at most this long for more queries to join (0: only batch queries that are already waiting)
+QUERY_EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("QUERY_EMBEDDING_BATCH_WINDOW_MS", "0"))
+
+# Former per-host record of collection embeddings; its entries are moved into the Qdrant
+# collection settings the first time each collection is looked up
+COLLECTION_EMBEDDINGS_FILE = os.getenv("COLLECTION_EMBEDDINGS_FILE", os.path.join("data", "collection_embeddings.json"))
+
+# Embedding model constructor override, e.g. an offline stand-in in the benchmarks
+embedding_model_factory: Optional[Callable[[str], Any]] = None
+
+
+class FastEmbedDenseEmbeddings(Embeddings):
+    """Dense embeddings computed in-process by a FastEmbed (ONNX Runtime) model on the CPU."""
+
+    def __init__(self, model_name: str, cache_dir: Optional[str] = None, threads: Optional[int] = None):
+        from fastembed import TextEmbedding
+
+        self.model_name = model_name
+        self._model = TextEmbedding(model_name=model_name, cache_dir=cache_dir, threads=threads)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [vector.tolist() for vector in self._model.passage_embed(texts)]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return [vector.tolist() for vector in self._model.query_embed(texts)]
+
+
+def _gemini_embeddings(model_name: str) -> Embeddings:
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    if not google_api_key:
+        raise ValueError("GOOGLE_API_KEY not found in environment variables")
+
+    # Map model names to proper Gemini model identifiers
+    model_mapping = {
+        "text-embedding-004": "models/text-embedding-004",
+        "embedding-001": "models/embedding-001"
+    }
+
+    return GoogleGenerativeAIEmbeddings(
+        model=model_mapping.get(model_name, f"models/{model_name}"),
+        google_api_key=google_api_key
+    )
+
+
+def _fastembed_embeddings(model_name: str) -> Embeddings:
+    return FastEmbedDenseEmbeddings(model_name, cache_dir=FASTEMBED_CACHE_DIR, threads=FASTEMBED_THREADS)
+
+
+@dataclass
+class EmbeddingBackend:
+    factory: Callable[[str], Embeddings]
+    default_model: str
+    # Served over the network: query embeddings go through the embeddings circuit breaker and are hedged
+    remote: bool = True
+
+
+EMBEDDING_BACKENDS: Dict[str, EmbeddingBackend] = {
+    "gemini": EmbeddingBackend(_gemini_embeddings, "text-embedding-004"),
+    "fastembed": EmbeddingBackend(_fastembed_embeddings, "BAAI/bge-small-en-v1.5", remote=False),
+}
+
+
+def truncate_vectors(vectors: Sequence[Sequence[float]], dimensions: int, renormalize: bool = True) -> List[List[float]]:
+    """
+    Keep the leading `dimensions` components of each vector (Matryoshka truncation).
+
+    Args:
+        vectors: Full-size vectors of one model
+        dimensions: Number of leading components to keep
+        renormalize: Scale the truncated vectors back to unit length
+
+    Returns:
+        List[List[float]]: The truncated vectors
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.shape[1] < dimensions:
+        raise ValueError(f"Cannot truncate {matrix.shape[1]}-dimensional embeddings to {dimensions} dimensions")
+    matrix = matrix[:, :dimensions]
+    if renormalize:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = matrix / norms
+    return matrix.tolist()
+
+
+class TruncatedEmbeddings(Embeddings):
+    """
+    Serves another model's embeddings truncated to their leading `dimensions` components.
+    Models trained with Matryoshka representation learning (Gemini text-embedding-004,
+    nomic-embed, ...) front-load the information, so short prefixes keep most of the recall.
+    """
+
+    def __init__(self, model: Embeddings, dimensions: int, renormalize: bool = True):
+        self.model = model
+        self.dimensions = dimensions
+        self.renormalize = renormalize
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return truncate_vectors(self.model.embed_documents(texts), self.dimensions, self.renormalize)
+
+    def embed_query(self, text: str) -> List[float]:
+        return truncate_vectors([self.model.embed_query(text)], self.dimensions, self.renormalize)[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return truncate_vectors(embed_queries(self.model, texts), self.dimensions, self.renormalize)
+
+
+def register_embedding_backend(name: str, factory: Callable[[str], Embeddings], default_model: str, remote: bool = True):
+    """Make an embedding backend available to `get_embedding_model` and collection creation."""
+    EMBEDDING_BACKENDS[name] = EmbeddingBackend(factory, default_model, remote)
+
+
+def resolve_embedding(model_name: Optional[str] = None, backend: Optional[str] = None) -> Tuple[str, str]:
+    """Backend and model name, filling in EMBEDDING_BACKEND / EMBEDDING_MODEL and the backend's default."""
+    backend = backend or EMBEDDING_BACKEND
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {', '.join(EMBEDDING_BACKENDS)}")
+    if model_name is None and backend == EMBEDDING_BACKEND:
+        model_name = EMBEDDING_MODEL
+    return backend, model_name or EMBEDDING_BACKENDS[backend].default_model
+
+
+def get_embedding_model(
+    model_name: Optional[str] = None,
+    backend: Optional[str] = None,
+    dimensions: Optional[int] = None,
+    renormalize: bool = True
+):
     """
-    Initialize Gemini embeddings with the specified model.
-    
+    Initialize an embedding model of the given backend.
+
     Args:
-        model_name: Name of the Gemini embedding model
-        
+        model_name: Name of the embedding model; defaults to EMBEDDING_MODEL or the backend's default
+        backend: Embedding backend, one of EMBEDDING_BACKENDS; defaults to EMBEDDING_BACKEND
+        dimensions: Truncate the model's vectors to this many leading components; None keeps them whole
+        renormalize: Scale truncated vectors back to unit length
+
     Returns:
-        GoogleGenerativeAIEmbeddings: Initialized embedding model
+        Embeddings: Initialized embedding model
     """
+    backend, model_name = resolve_embedding(model_name, backend)
     try:
-        google_api_key = os.getenv("GOOGLE_API_KEY")
-        if not google_api_key:
-            raise ValueError("GOOGLE_API_KEY not found in environment variables")
-        
-        # Map model names to proper Gemini model identifiers
-        model_mapping = {
-            "text-embedding-004": "models/text-embedding-004",
-            "embedding-001": "models/embedding-001"
-        }
-        
-        full_model_name = model_mapping.get(model_name, f"models/{model_name}")
-        
-        embeddings = GoogleGenerativeAIEmbeddings(
-            model=full_model_name,
-            google_api_key=google_api_key
-        )
-        logger.info(f"Successfully initialized Gemini embeddings with model: {full_model_name}")
-        return embeddings
+        if embedding_model_factory is not None:
+            embeddings = embedding_model_factory(model_name)
+        else:
+            embeddings = EMBEDDING_BACKENDS[backend].factory(model_name)
+            logger.info(f"Successfully initialized {backend} embeddings with model: {model_name}")
     except Exception as e:
-        logger.error(f"Failed to initialize Gemini embeddings: {str(e)}")
-        raise
\ No newline at end of file
+        logger.error(f"Failed to initialize {backend} embeddings: {str(e)}")
+        raise
+    if dimensions is not None:
+        embeddings = TruncatedEmbeddings(embeddings, dimensions, renormalize)
+    return embeddings
+
+
+def embedding_dimension(model: Embeddings) -> int:
+    """Size of the vectors the model produces."""
+    return len(model.embed_query("dimension probe"))
+
+
+def embed_queries(model: Embeddings, texts: List[str]) -> List[List[float]]:
+    """Embed several queries with one model call where the backend supports it."""
+    if hasattr(model, "embed_queries"):
+        return model.embed_queries(texts)
+    if isinstance(model, GoogleGenerativeAIEmbeddings):
+        return model.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+    return [model.embed_query(text) for text in texts]
+
+
+class QueryEmbeddingBatcher(Embeddings):
+    """
+    Wraps an embedding model so that concurrent `embed_query` calls share model calls.
+
+    Queries are queued and embedded by a background thread, up to `max_batch` at a time.
+    While one batch is with the model the next one fills up, so under load a query
+    waits for at most one batch ahead of it. Documents are passed straight through.
+    With a `cache_id`, query vectors are also kept in the shared cache of all workers.
+    A `remote` model is called through the embeddings circuit breaker, with hedged requests.
+    """
+
+    def __init__(
+        self,
+        model: Embeddings,
+        max_batch: int = QUERY_EMBEDDING_MAX_BATCH,
+        window_ms: float = QUERY_EMBEDDING_BATCH_WINDOW_MS,
+        cache_id: Optional[Any] = None,
+        remote: bool = False
+    ):
+        self.model = model
+        self.remote = remote
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self.cache_id = cache_id
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        cached = self._cached(text)
+        if cached is not None:
+            return cached
+        if self.max_batch <= 1:
+            vector = self._embed([text])[0]
+            self._store({text: vector})
+            return vector
+        return self._submit(text).result()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        if self.max_batch <= 1 or self.cache_id is not None:
+            return await asyncio.to_thread(self.embed_query, text)
+        return await asyncio.wrap_future(self._submit(text))
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        if not self.remote:
+            return embed_queries(self.model, texts)
+        return call_upstream_sync("embeddings", "embed_queries", lambda: embed_queries(self.model, texts), hedge=True)
+
+    def _cache_key(self, text: str) -> str:
+        return shared_cache.cache_key(self.cache_id, text)
+
+    def _cached(self, text: str) -> Optional[List[float]]:
+        if self.cache_id is None:
+            return None
+        value = shared_cache.get("embeddings", self._cache_key(text))
+        return np.frombuffer(value, dtype=np.float32).tolist() if value is not None else None
+
+    def _store(self, vectors: Dict[str, List[float]]):
+        if self.cache_id is not None:
+            shared_cache.put_many("embeddings", {
+                self._cache_key(text): np.asarray(vector, dtype=np.float32).tobytes() for text, vector in vectors.items()
+            })
+
+    def _submit(self, text: str) -> Future:
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="query-embedding-batcher", daemon=True)
+                    self._worker.start()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _next_batch(self) -> List[Tuple[str, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        # Callers that gave up in the meantime are dropped
+        return [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = dict(zip(texts, self._embed(texts)))
+            except Exception as e:
+                logger.error(f"Failed to embed {len(texts)} queries: {str(e)}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            QUERY_EMBEDDING_BATCH_SIZE.observe(len(texts))
+            for text, future in batch:
+                future.set_result(vectors[text])
+            self._store(vectors)
+
+
+@dataclass
+class CollectionEmbedding:
+    backend: str
+    model: str
+    vector_size: int
+    # Matryoshka truncation of the model's vectors to `vector_size`; None stores them whole
+    dimensions: Optional[int] = None
+    renormalize: bool = True
+
+
+# Collections created before embeddings were recorded per collection
+LEGACY_COLLECTION_EMBEDDING = CollectionEmbedding("gemini", "text-embedding-004", 768)
+
+# Looked-up embeddings by collection or alias name, with the data generation they were read at
+_collection_embeddings: Dict[str, Tuple[CollectionEmbedding, int]] = {}
+_registry_lock = threading.RLock()
+
+_models: Dict[Tuple[str, str, Optional[int], bool], QueryEmbeddingBatcher] = {}
+_models_lock = threading.Lock()
+
+
+def _legacy_file_entry(collection_name: str) -> Optional[CollectionEmbedding]:
+    if not COLLECTION_EMBEDDINGS_FILE or not os.path.exists(COLLECTION_EMBEDDINGS_FILE):
+        return None
+    with open(COLLECTION_EMBEDDINGS_FILE, encoding="utf-8") as f:
+        entry = json.load(f).get(collection_name)
+    return CollectionEmbedding(**entry) if entry else None
+
+
+def _read_collection_embedding(collection_name: str) -> CollectionEmbedding:
+    """The embedding recorded with the collection in Qdrant, checked against its vector size."""
+    client = get_qdrant_client()
+    physical_name = physical_collection(client, collection_name)
+    if physical_name is None:
+        raise ValueError(f"Collection '{collection_name}' does not exist")
+
+    recorded = get_collection_settings(client, physical_name).get("embedding")
+    if recorded:
+        embedding = CollectionEmbedding(**recorded)
+    else:
+        embedding = _legacy_file_entry(physical_name) or _legacy_file_entry(collection_name)
+        if embedding is not None:
+            put_collection_settings(client, physical_name, embedding=asdict(embedding))
+            logger.info(f"Moved the embedding record of '{physical_name}' into the collection settings")
+        else:
+            embedding = LEGACY_COLLECTION_EMBEDDING
+
+    vector_size = client.get_collection(physical_name).config.params.vectors.size
+    if vector_size != embedding.vector_size:
+        raise ValueError(
+            f"Collection '{physical_name}' has {vector_size}-dimensional vectors but its embedding is "
+            f"{'recorded as' if recorded else 'unrecorded and assumed to be'} {embedding.backend}/{embedding.model} "
+            f"with {embedding.vector_size} dimensions"
+        )
+    return embedding
+
+
+def get_collection_embedding(collection_name: str) -> CollectionEmbedding:
+    """
+    Embedding backend, model and vector size a collection (or alias) was created with.
+
+    The record is stored with the collection in Qdrant, so every host reads the same one;
+    lookups are cached until the shared data generation moves on (e.g. a promotion).
+
+    Raises:
+        ValueError: If the collection doesn't exist or its vectors don't match the record
+    """
+    generation = shared_cache.data_generation()
+    with _registry_lock:
+        cached = _collection_embeddings.get(collection_name)
+        if cached is not None and cached[1] == generation:
+            return cached[0]
+    embedding = _read_collection_embedding(collection_name)
+    with _registry_lock:
+        _collection_embeddings[collection_name] = (embedding, generation)
+    return embedding
+
+
+def record_collection_embedding(collection_name: str, embedding: CollectionEmbedding):
+    """Record the embedding of a physical collection with it in Qdrant. Blocking."""
+    put_collection_settings(get_qdrant_client(), collection_name, embedding=asdict(embedding))
+    with _registry_lock:
+        _collection_embeddings[collection_name] = (embedding, shared_cache.data_generation())
+
+
+def register_embedding_alias(alias: str, collection_name: str):
+    """Serve the alias with the embedding model of the collection it points at."""
+    with _registry_lock:
+        _collection_embeddings[alias] = (get_collection_embedding(collection_name), shared_cache.data_generation())
+
+
+def drop_collection_embedding(collection_name: str):
+    with _registry_lock:
+        _collection_embeddings.pop(collection_name, None)
+
+
+def collection_embedding_model(collection_name: str) -> QueryEmbeddingBatcher:
+    """Shared embedding model of a collection, with batched query embeddings."""
+    embedding = get_collection_embedding(collection_name)
+    key = (embedding.backend, embedding.model, embedding.dimensions, embedding.renormalize)
+    with _models_lock:
+        if key not in _models:
+            _models[key] = QueryEmbeddingBatcher(
+                get_embedding_model(embedding.model, embedding.backend, embedding.dimensions, embedding.renormalize),
+                cache_id=key,
+                remote=EMBEDDING_BACKENDS[embedding.backend].remote
+            )
+        return _models[key]
+
+
+def clear_embedding_models():
+    """Forget the shared models, e.g. after `embedding_model_factory` changed."""
+    with _models_lock:
+        _models.clear()
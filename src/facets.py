@@ -0,0 +1,315 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from qdrant_client import QdrantClient
+from qdrant_client.models import Filter, FieldCondition, MatchValue
+from src.client_qdrant import get_qdrant_client
+from src.filters import EXACT_MATCH_FILTERS
+from src.metrics import record_cache
+from src import shared_cache
+from src.payloads import FLIGHT_DOCUMENT, METADATA_PAYLOAD_KEY, is_flight_record, payload_key
+
+logger = logging.getLogger(__name__)
+
+# Fields whose distinct values (with counts) are offered as filter options
+VALUE_FACETS = list(EXACT_MATCH_FILTERS)
+
+# Fields whose min/max are tracked
+RANGE_FACETS = ["price_usd", "flight_duration_hours"]
+
+# Price buckets suggested to the filter generator, clipped to the actual price range
+SUGGESTED_PRICE_RANGES = [
+    (0, 500, "Budget"),
+    (500, 1000, "Economy"),
+    (1000, 2000, "Mid-range"),
+    (2000, 5000, "Premium"),
+    (5000, None, "Luxury"),
+]
+
+# Cities and airports counted per country, so a query naming a city can be matched to its country
+PLACE_FIELDS = {"from_country": ("from", "from_airport"), "to_country": ("to", "to_airport")}
+
+LOAD_BATCH_SIZE = 1024
+
+
+def _places_key(field: str) -> str:
+    return f"{field}.places"
+
+
+class FacetCatalog:
+    """
+    Distinct values with counts and numeric ranges of the flights in one collection.
+
+    Each point's contribution is remembered by point ID, so re-ingesting a file (which
+    reuses the same deterministic IDs) replaces counts instead of doubling them.
+    `version` increases on every change; derived views are cached per version.
+    `generation` is the shared data generation the catalog is known to be current for.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.generation = 0
+        self.ready = False
+        self._points: Dict[str, Tuple[Tuple[str, Any], ...]] = {}
+        self._counts: Dict[str, Counter] = {
+            field: Counter() for field in VALUE_FACETS + RANGE_FACETS + [_places_key(f) for f in PLACE_FIELDS]
+        }
+        self._cache: Dict[str, Any] = {}
+        self._cache_version = -1
+
+    @property
+    def total(self) -> int:
+        return len(self._points)
+
+    def upsert(self, point_ids: Sequence[str], records: Sequence[Dict[str, Any]]) -> int:
+        """
+        Count the facet values of flight records, replacing earlier counts for the same points.
+
+        Args:
+            point_ids: Qdrant point IDs of the records
+            records: Document metadata; records that are not flights are ignored
+
+        Returns:
+            int: Number of flights counted
+        """
+        changed = 0
+        for point_id, record in zip(point_ids, records):
+            if not record or not is_flight_record(record):
+                continue
+            entry = tuple(
+                (field, record[field]) for field in VALUE_FACETS + RANGE_FACETS
+                if record.get(field) is not None
+            ) + tuple(
+                (_places_key(field), (record[field], record.get(city), record.get(airport)))
+                for field, (city, airport) in PLACE_FIELDS.items()
+                if record.get(field) is not None
+            )
+            point_id = str(point_id)
+            previous = self._points.get(point_id)
+            if previous == entry:
+                continue
+            for field, value in previous or ():
+                self._counts[field][value] -= 1
+                if self._counts[field][value] <= 0:
+                    del self._counts[field][value]
+            for field, value in entry:
+                self._counts[field][value] += 1
+            self._points[point_id] = entry
+            changed += 1
+
+        if changed:
+            self.version += 1
+        return changed
+
+    def snapshot(self) -> List[Any]:
+        """The counted entry of every point, enough to restore the catalog in another process."""
+        return [[point_id, [list(pair) for pair in entry]] for point_id, entry in self._points.items()]
+
+    @classmethod
+    def from_snapshot(cls, points: List[Any], generation: int) -> "FacetCatalog":
+        catalog = cls()
+        for point_id, entry in points:
+            # JSON turned the (country, city, airport) place tuples into lists
+            entry = tuple((field, tuple(value) if isinstance(value, list) else value) for field, value in entry)
+            catalog._points[point_id] = entry
+            for field, value in entry:
+                catalog._counts[field][value] += 1
+        catalog.version = 1
+        catalog.generation = generation
+        catalog.ready = True
+        return catalog
+
+    def cached(self, name: str, build):
+        """Value of `build()`, computed once per catalog version."""
+        if self._cache_version != self.version:
+            self._cache = {}
+            self._cache_version = self.version
+        if name not in self._cache:
+            self._cache[name] = build()
+        return self._cache[name]
+
+    def values(self, field: str) -> List[Any]:
+        return sorted(self._counts[field], key=str)
+
+    def places(self, field: str) -> Dict[Any, List[str]]:
+        """City and airport names seen for each value of a country field."""
+        def build():
+            names: Dict[Any, set] = {}
+            for country, city, airport in self._counts[_places_key(field)]:
+                names.setdefault(country, set()).update(name for name in (city, airport) if name)
+            return {country: sorted(values) for country, values in names.items()}
+        return self.cached(f"places:{field}", build)
+
+    def value_range(self, field: str) -> Optional[Dict[str, float]]:
+        counts = self._counts[field]
+        return {"min": min(counts), "max": max(counts)} if counts else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Values with counts and ranges, as served by `/collections/{name}/facets`."""
+        def build():
+            return {
+                "version": self.version,
+                "total": self.total,
+                "values": {
+                    field: [{"value": value, "count": self._counts[field][value]} for value in self.values(field)]
+                    for field in VALUE_FACETS
+                },
+                "ranges": {
+                    field: value_range for field in RANGE_FACETS
+                    if (value_range := self.value_range(field)) is not None
+                },
+            }
+        return self.cached("dict", build)
+
+    def filter_options(self) -> Dict[str, Any]:
+        """Filter options for the filter-generation prompt, in the shape previously hard-coded in graph.py."""
+        def build():
+            options: Dict[str, Any] = {field: self.values(field) for field in VALUE_FACETS if self._counts[field]}
+            prices = self.value_range("price_usd")
+            if prices:
+                suggested = []
+                for low, high, label in SUGGESTED_PRICE_RANGES:
+                    suffix = f"{low}+ USD" if high is None else f"{low}-{high} USD"
+                    high = prices["max"] if high is None else high
+                    if low <= prices["max"] and high >= prices["min"]:
+                        suggested.append({"min": low, "max": high, "label": f"{label} ({suffix})"})
+                options["price_ranges"] = {**prices, "suggested_ranges": suggested}
+            return options
+        return self.cached("filter_options", build)
+
+
+# Catalogs by physical collection name, and alias -> physical collection as seen by this process
+_catalogs: Dict[str, FacetCatalog] = {}
+_aliases: Dict[str, str] = {}
+_loading: Dict[str, asyncio.Future] = {}
+
+
+def _key(collection_name: str) -> str:
+    return _aliases.get(collection_name, collection_name)
+
+
+def reset_facet_catalog(collection_name: str):
+    """Start an empty, ready catalog for a collection that was just created."""
+    catalog = FacetCatalog()
+    catalog.generation = shared_cache.data_generation()
+    catalog.ready = True
+    _catalogs[_key(collection_name)] = catalog
+
+
+def update_facets(collection_name: str, point_ids: Sequence[str], records: Sequence[Dict[str, Any]]):
+    """
+    Count freshly upserted records into the collection's catalog, if one is held.
+    Collections whose catalog was never built are left alone; it is loaded on first use.
+    """
+    catalog = _catalogs.get(_key(collection_name))
+    if catalog is not None:
+        catalog.upsert(point_ids, records)
+
+
+def register_facet_alias(alias: str, collection_name: str):
+    """Record that `alias` now serves `collection_name` and drop whatever it served before."""
+    previous = _aliases.get(alias, alias)
+    if previous != collection_name:
+        _catalogs.pop(previous, None)
+    _aliases[alias] = collection_name
+
+
+def drop_facet_catalog(collection_name: str):
+    _catalogs.pop(_key(collection_name), None)
+
+
+def publish_facet_catalog(collection_name: str, generation: int):
+    """
+    Share this process's catalog of a collection with the other workers as current for
+    `generation`, e.g. right after ingesting into it and bumping the data generation.
+    """
+    catalog = _catalogs.get(_key(collection_name))
+    if catalog is None or not catalog.ready:
+        return
+    catalog.generation = generation
+    if shared_cache.enabled("facets"):
+        shared_cache.put_json("facets", collection_name, {"generation": generation, "points": catalog.snapshot()})
+
+
+async def _build_facet_catalog(client: QdrantClient, collection_name: str, key: str) -> FacetCatalog:
+    generation = shared_cache.data_generation()
+    if shared_cache.enabled("facets"):
+        shared = await asyncio.to_thread(shared_cache.get_json, "facets", collection_name)
+        if shared is not None and shared["generation"] == generation:
+            catalog = FacetCatalog.from_snapshot(shared["points"], generation)
+            _catalogs[key] = catalog
+            _loading.pop(key, None)
+            logger.info(f"Loaded facet catalog for '{collection_name}' from the shared cache ({catalog.total} flights)")
+            return catalog
+
+    catalog = FacetCatalog()
+    catalog.generation = generation
+    _catalogs[key] = catalog
+    try:
+        offset = None
+        flight_filter = Filter(must=[
+            FieldCondition(key=payload_key("document_type"), match=MatchValue(value=FLIGHT_DOCUMENT))
+        ])
+        place_fields = [name for names in PLACE_FIELDS.values() for name in names]
+        fields = [payload_key(field) for field in ["flight_id"] + VALUE_FACETS + RANGE_FACETS + place_fields]
+        while True:
+            points, offset = await asyncio.to_thread(
+                client.scroll,
+                collection_name=collection_name,
+                scroll_filter=flight_filter,
+                limit=LOAD_BATCH_SIZE,
+                offset=offset,
+                with_payload=fields,
+                with_vectors=False,
+            )
+            catalog.upsert(
+                [str(point.id) for point in points],
+                [(point.payload or {}).get(METADATA_PAYLOAD_KEY, {}) for point in points]
+            )
+            if offset is None:
+                break
+    except Exception as e:
+        logger.error(f"Failed to build facet catalog for {collection_name}: {str(e)}")
+        _catalogs.pop(key, None)
+        raise
+    finally:
+        _loading.pop(key, None)
+
+    catalog.ready = True
+    logger.info(f"Built facet catalog for '{collection_name}' from {catalog.total} flights")
+    if shared_cache.enabled("facets"):
+        await asyncio.to_thread(
+            shared_cache.put_json, "facets", collection_name, {"generation": generation, "points": catalog.snapshot()}
+        )
+    return catalog
+
+
+async def load_facet_catalog(collection_name: str, client: Optional[QdrantClient] = None) -> FacetCatalog:
+    """
+    Get the facet catalog of a collection, building it from a scroll if needed.
+
+    The catalog is registered before the scroll starts so ingestion batches committed
+    meanwhile are counted too; concurrent callers share one build. A catalog older than
+    the shared data generation (another worker ingested or promoted since) is reloaded,
+    from the shared cache when a worker already published a current one.
+
+    Args:
+        collection_name: Collection or alias name
+        client: Qdrant client, created from the environment when a build is needed and none is given
+
+    Returns:
+        FacetCatalog: The ready catalog
+    """
+    key = _key(collection_name)
+    catalog = _catalogs.get(key)
+    if catalog is not None and catalog.ready and catalog.generation < shared_cache.data_generation():
+        _catalogs.pop(key, None)
+        catalog = None
+    record_cache("facet_catalog", catalog is not None and catalog.ready)
+    if catalog is not None and catalog.ready:
+        return catalog
+
+    if key not in _loading:
+        _loading[key] = asyncio.ensure_future(_build_facet_catalog(client or get_qdrant_client(), collection_name, key))
+    return await asyncio.shield(_loading[key])
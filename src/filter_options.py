@@ -0,0 +1,243 @@
+import os
+import re
+import difflib
+import logging
+from typing import Any, Dict, List, Set, Tuple
+from src.facets import FacetCatalog, PLACE_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Only show the filter generator the option values the query plausibly refers to
+FILTER_OPTIONS_PRUNING = os.getenv("FILTER_OPTIONS_PRUNING", "true").lower() == "true"
+
+# Fields with at most this many values are always listed in full; they cost a few tokens
+SMALL_FIELD_MAX_VALUES = 8
+
+# Minimum similarity for a misspelt query word to match a value word ("Lufthanza" -> "lufthansa")
+FUZZY_CUTOFF = 0.85
+
+# Words too common in option values to identify one on their own
+GENERIC_WORDS = {"air", "airline", "airlines", "airways", "international"}
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Query phrases setting a boolean filter when filters are derived without the LLM;
+# preceded by "non", "no" or "without" they set it to false
+BOOLEAN_PHRASES = {
+    "refundable": ["refundable"],
+    "baggage_included": ["baggage included", "with baggage", "checked baggage", "free baggage"],
+    "wifi_available": ["wifi", "wi fi", "internet"],
+}
+
+PRICE_PATTERNS = {
+    "max_price": re.compile(r"(?:under|below|less than|cheaper than|up to|at most)\s*\$?\s*(\d[\d,]*)"),
+    "min_price": re.compile(r"(?:over|above|more than|at least)\s*\$?\s*(\d[\d,]*)"),
+}
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(str(text).lower())
+
+
+def _is_distinctive(word: str) -> bool:
+    return word not in GENERIC_WORDS and (len(word) >= 4 or any(char.isdigit() for char in word))
+
+
+class _ValueMatcher:
+    """Inverted index from value words to option values of one field."""
+
+    def __init__(self, names: Dict[Any, List[str]]):
+        self.phrases: List[Tuple[str, Any]] = []
+        self.words: Dict[str, Set[Any]] = {}
+        for value, value_names in names.items():
+            for name in value_names:
+                name_words = _words(name)
+                if name_words:
+                    self.phrases.append((" ".join(name_words), value))
+                for word in name_words:
+                    if _is_distinctive(word):
+                        self.words.setdefault(word, set()).add(value)
+        self.vocabulary = list(self.words)
+
+    def match(self, query_words: List[str]) -> Set[Any]:
+        query_text = f" {' '.join(query_words)} "
+        matched = {value for phrase, value in self.phrases if f" {phrase} " in query_text}
+        for word in query_words:
+            if not _is_distinctive(word):
+                continue
+            if word in self.words:
+                matched |= self.words[word]
+                continue
+            for close in difflib.get_close_matches(word, self.vocabulary, n=3, cutoff=FUZZY_CUTOFF):
+                matched |= self.words[close]
+        return matched
+
+
+def _matchers(catalog: FacetCatalog) -> Dict[str, _ValueMatcher]:
+    """Matchers for the fields too large to list in full, cached per catalog version."""
+    def build():
+        options = catalog.filter_options()
+        matchers = {}
+        for field, values in options.items():
+            if not isinstance(values, list) or len(values) <= SMALL_FIELD_MAX_VALUES:
+                continue
+            places = catalog.places(field) if field in PLACE_FIELDS else {}
+            matchers[field] = _ValueMatcher({value: [str(value)] + places.get(value, []) for value in values})
+        return matchers
+    return catalog.cached("option_matchers", build)
+
+
+def select_filter_options(catalog: FacetCatalog, query: str) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Keep the filter options that matter for a query.
+
+    Small fields are kept whole. Values of large fields (airlines, countries, aircraft)
+    are kept when the query names them, one of their distinctive words, a close
+    misspelling of it, or (for countries) one of their cities or airports.
+
+    Args:
+        catalog: Facet catalog of the collection
+        query: User query
+
+    Returns:
+        Tuple[Dict[str, Any], List[str]]: The kept options, and the fields dropped
+        because the query mentions none of their values
+    """
+    options = catalog.filter_options()
+    if not FILTER_OPTIONS_PRUNING:
+        return options, []
+
+    query_words = _words(query)
+    matchers = _matchers(catalog)
+    selected: Dict[str, Any] = {}
+    omitted: List[str] = []
+    for field, values in options.items():
+        matcher = matchers.get(field)
+        if matcher is None:
+            selected[field] = values
+            continue
+        matched = matcher.match(query_words)
+        if matched:
+            selected[field] = [value for value in values if value in matched]
+        else:
+            omitted.append(field)
+    return selected, omitted
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def format_filter_options(options: Dict[str, Any], omitted: List[str]) -> str:
+    """
+    One line per field instead of indented JSON:
+
+        travel_class: business | economy | first | premium_economy
+        price_usd (use min_price/max_price): 300-12430; ranges: Budget 0-500, ..., Luxury 5000-12430
+        not mentioned (leave null): airline, aircraft_type
+    """
+    lines = []
+    for field, values in options.items():
+        if field == "price_ranges":
+            ranges = ", ".join(
+                f"{option['label'].split(' (')[0]} {option['min']}-{option['max']}"
+                for option in values.get("suggested_ranges", [])
+            )
+            lines.append(f"price_usd (use min_price/max_price): {values['min']}-{values['max']}; ranges: {ranges}")
+        else:
+            lines.append(f"{field}: {' | '.join(_format_value(value) for value in values)}")
+    if omitted:
+        lines.append(f"not mentioned (leave null): {', '.join(omitted)}")
+    return "\n".join(lines)
+
+
+def relevant_filter_options(catalog: FacetCatalog, query: str) -> str:
+    """Compact text of the filter options relevant to a query, for the filter-generation prompt."""
+    options, omitted = select_filter_options(catalog, query)
+    return format_filter_options(options, omitted)
+
+
+def _single_value(matcher: _ValueMatcher, query_words: List[str], full_names_only: bool = False) -> Any:
+    """
+    The one value the words name, preferring the longest full name ("premium economy"
+    over "economy"); None when there is no such value or it is ambiguous.
+    """
+    query_text = f" {' '.join(query_words)} "
+    named = sorted(
+        ((len(phrase), value) for phrase, value in matcher.phrases if f" {phrase} " in query_text),
+        key=lambda item: item[0], reverse=True
+    )
+    if named and (len(named) == 1 or named[0][0] > named[1][0]):
+        return named[0][1]
+    if full_names_only:
+        return None
+    matched = matcher.match(query_words)
+    return next(iter(matched)) if len(matched) == 1 else None
+
+
+def _words_after(query_words: List[str], marker: str) -> List[str]:
+    """Words following each occurrence of `marker`, up to the next direction word."""
+    following = []
+    for position, word in enumerate(query_words):
+        if word != marker:
+            continue
+        for next_word in query_words[position + 1:position + 5]:
+            if next_word in ("from", "to"):
+                break
+            following.append(next_word)
+    return following
+
+
+def rule_based_filters(catalog: FacetCatalog, query: str) -> Dict[str, Any]:
+    """
+    Filters derived from the query without the LLM, for when there is no time to ask it.
+
+    A field is only set when the query names exactly one of its values by its full name.
+    Countries must follow "from" or "to" and may also be named by a distinctive word, a
+    close misspelling, a city or an airport. Booleans are set by the phrases in
+    BOOLEAN_PHRASES and price bounds by "under $900" / "over 500".
+
+    Args:
+        catalog: Facet catalog of the collection
+        query: User query
+
+    Returns:
+        Dict[str, Any]: Filters in the format produced by filter generation
+    """
+    def build():
+        matchers = {}
+        for field, values in catalog.filter_options().items():
+            if not isinstance(values, list) or field in BOOLEAN_PHRASES:
+                continue
+            places = catalog.places(field) if field in PLACE_FIELDS else {}
+            matchers[field] = _ValueMatcher({value: [str(value)] + places.get(value, []) for value in values})
+        return matchers
+
+    query_words = _words(query)
+    query_text = f" {' '.join(query_words)} "
+    filters: Dict[str, Any] = {}
+    for field, matcher in catalog.cached("rule_matchers", build).items():
+        if field in PLACE_FIELDS:
+            value = _single_value(matcher, _words_after(query_words, PLACE_FIELDS[field][0]))
+        else:
+            value = _single_value(matcher, query_words, full_names_only=True)
+        if value is not None:
+            filters[field] = value
+
+    for field, phrases in BOOLEAN_PHRASES.items():
+        for phrase in phrases:
+            if any(f" {negation} {phrase} " in query_text for negation in ("non", "no", "not", "without")):
+                filters[field] = False
+                break
+            if f" {phrase} " in query_text:
+                filters[field] = True
+                break
+
+    for field, pattern in PRICE_PATTERNS.items():
+        match = pattern.search(query.lower())
+        if match:
+            filters[field] = int(match.group(1).replace(",", ""))
+
+    return filters
@@ -0,0 +1,86 @@
+from typing import Any, Dict, List
+from qdrant_client.models import FieldCondition, MatchValue, Range
+from src.payloads import payload_key
+
+# Filter names that match a metadata field of the same name exactly
+EXACT_MATCH_FILTERS = [
+    "airline",
+    "alliance",
+    "from_country",
+    "to_country",
+    "travel_class",
+    "refundable",
+    "baggage_included",
+    "wifi_available",
+    "meal_service",
+    "aircraft_type",
+]
+
+
+def build_filter_conditions(filters: Dict[str, Any]) -> List[FieldCondition]:
+    """
+    Translate flight filters into Qdrant field conditions on the metadata payload.
+
+    Supported filters are the exact-match fields in EXACT_MATCH_FILTERS plus
+    `min_price` / `max_price`, which become a range on `price_usd`. Filters with a
+    None value and unknown filter names are ignored.
+
+    Args:
+        filters: Filter name to value, as produced by filter generation or the API
+
+    Returns:
+        List[FieldCondition]: One condition per applied filter
+    """
+    conditions = []
+
+    for name in EXACT_MATCH_FILTERS:
+        if filters.get(name) is not None:
+            conditions.append(
+                FieldCondition(
+                    key=payload_key(name),
+                    match=MatchValue(value=filters[name])
+                )
+            )
+
+    if filters.get("max_price") is not None:
+        conditions.append(
+            FieldCondition(
+                key=payload_key("price_usd"),
+                range=Range(lte=filters["max_price"])
+            )
+        )
+
+    if filters.get("min_price") is not None:
+        conditions.append(
+            FieldCondition(
+                key=payload_key("price_usd"),
+                range=Range(gte=filters["min_price"])
+            )
+        )
+
+    return conditions
+
+
+def matches_filters(metadata: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """
+    Whether a document's metadata satisfies all the filters, evaluated in process. This
+    is the same as requiring every condition of `build_filter_conditions` to hold.
+
+    Args:
+        metadata: Document metadata, e.g. of a retrieved flight
+        filters: Filter name to value
+
+    Returns:
+        bool: True when every applied filter matches
+    """
+    for name in EXACT_MATCH_FILTERS:
+        if filters.get(name) is not None and metadata.get(name) != filters[name]:
+            return False
+
+    price = metadata.get("price_usd")
+    if filters.get("max_price") is not None and (price is None or price > filters["max_price"]):
+        return False
+    if filters.get("min_price") is not None and (price is None or price < filters["min_price"]):
+        return False
+
+    return True
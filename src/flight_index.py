@@ -0,0 +1,354 @@
+import os
+import asyncio
+import logging
+import numpy as np
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from qdrant_client import QdrantClient
+from qdrant_client.models import Filter, FieldCondition, MatchValue
+from src.filters import EXACT_MATCH_FILTERS
+from src.metrics import record_cache
+from src import shared_cache
+from src.payloads import FLIGHT_DOCUMENT, FLIGHT_FIELDS, METADATA_PAYLOAD_KEY, is_flight_record, payload_key
+
+logger = logging.getLogger(__name__)
+
+# The index is opt-in. Writes made by other workers are picked up through the shared data
+# generation, so with several workers it needs the shared cache (SHARED_CACHE_PATH)
+FLIGHT_INDEX_ENABLED = os.getenv("FLIGHT_INDEX_ENABLED", "false").lower() == "true"
+
+# Fields answered from per-value bitmaps: the exact-match filters
+CATEGORICAL_FIELDS = list(EXACT_MATCH_FILTERS)
+
+# Fields stored as float64 columns (NaN when missing) for ranges and sorting;
+# dates are stored as UTC epoch seconds
+NUMERIC_FIELDS = ["price_usd", "flight_duration_hours", "departure_date"]
+
+# Largest candidate set the graph hands to Qdrant as an ID filter; bigger sets use field conditions
+FLIGHT_INDEX_PREFILTER_LIMIT = int(os.getenv("FLIGHT_INDEX_PREFILTER_LIMIT", "4096"))
+
+INITIAL_CAPACITY = 1024
+LOAD_BATCH_SIZE = 1024
+
+
+def numeric_value(field: str, value: Any) -> float:
+    """Column value of a payload value: floats as-is, dates as UTC epoch seconds, NaN when missing."""
+    if value is None or value == "":
+        return np.nan
+    if field.endswith("_date"):
+        parsed = datetime.fromisoformat(value) if isinstance(value, str) else value
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    return float(value)
+
+
+class FlightIndex:
+    """
+    Columnar in-memory copy of the flight records of one collection.
+
+    Each numeric field is a NumPy column and each categorical field is dictionary-encoded
+    with one boolean bitmap per distinct value, so filters are a few vectorised AND/OR
+    operations over the catalogue. Rows are keyed by Qdrant point ID and upserted in
+    place, which keeps incremental refreshes idempotent. `generation` is the shared data
+    generation the index is known to be current for.
+    """
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self.size = 0
+        self.ready = False
+        self.generation = 0
+        self._capacity = capacity
+        self._rows: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self._records: List[Dict[str, Any]] = []
+        self._numeric = {field: np.full(capacity, np.nan) for field in NUMERIC_FIELDS}
+        self._codes = {field: np.full(capacity, -1, dtype=np.int32) for field in CATEGORICAL_FIELDS}
+        self._dictionary: Dict[str, Dict[Any, int]] = {field: {} for field in CATEGORICAL_FIELDS}
+        self._bitmaps: Dict[str, List[np.ndarray]] = {field: [] for field in CATEGORICAL_FIELDS}
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _grow(self, needed: int):
+        if needed <= self._capacity:
+            return
+        capacity = max(needed, self._capacity * 2)
+        for field, column in self._numeric.items():
+            grown = np.full(capacity, np.nan)
+            grown[:self.size] = column[:self.size]
+            self._numeric[field] = grown
+        for field, column in self._codes.items():
+            grown = np.full(capacity, -1, dtype=np.int32)
+            grown[:self.size] = column[:self.size]
+            self._codes[field] = grown
+        for bitmaps in self._bitmaps.values():
+            for code, bitmap in enumerate(bitmaps):
+                grown = np.zeros(capacity, dtype=bool)
+                grown[:self.size] = bitmap[:self.size]
+                bitmaps[code] = grown
+        self._capacity = capacity
+
+    def _encode(self, field: str, value: Any) -> int:
+        dictionary = self._dictionary[field]
+        if value not in dictionary:
+            dictionary[value] = len(dictionary)
+            self._bitmaps[field].append(np.zeros(self._capacity, dtype=bool))
+        return dictionary[value]
+
+    def upsert(self, point_ids: Sequence[str], records: Sequence[Dict[str, Any]]) -> int:
+        """
+        Add or replace flight rows. Records that are not flights are skipped.
+
+        Args:
+            point_ids: Qdrant point IDs of the records
+            records: Flight metadata, as stored under the `metadata` payload key
+
+        Returns:
+            int: Number of rows added or replaced
+        """
+        flights = [
+            (str(point_id), record) for point_id, record in zip(point_ids, records)
+            if record and is_flight_record(record)
+        ]
+        self._grow(self.size + len(flights))
+
+        for point_id, record in flights:
+            row = self._rows.get(point_id)
+            if row is None:
+                row = self.size
+                self._rows[point_id] = row
+                self._ids.append(point_id)
+                self._records.append({})
+                self.size += 1
+
+            self._records[row] = {key: record[key] for key in FLIGHT_FIELDS if key in record}
+            for field in NUMERIC_FIELDS:
+                self._numeric[field][row] = numeric_value(field, record.get(field))
+            for field in CATEGORICAL_FIELDS:
+                previous = self._codes[field][row]
+                if previous >= 0:
+                    self._bitmaps[field][previous][row] = False
+                value = record.get(field)
+                code = self._encode(field, value) if value is not None else -1
+                self._codes[field][row] = code
+                if code >= 0:
+                    self._bitmaps[field][code][row] = True
+
+        return len(flights)
+
+    def condition_masks(self, filters: Dict[str, Any]) -> List[np.ndarray]:
+        """One row mask per applied filter, in the order of `build_filter_conditions`."""
+        masks = []
+        for field in CATEGORICAL_FIELDS:
+            value = filters.get(field)
+            if value is None:
+                continue
+            code = self._dictionary[field].get(value)
+            if code is None:
+                masks.append(np.zeros(self.size, dtype=bool))
+            else:
+                masks.append(self._bitmaps[field][code][:self.size])
+
+        prices = self._numeric["price_usd"][:self.size]
+        if filters.get("max_price") is not None:
+            masks.append(prices <= filters["max_price"])
+        if filters.get("min_price") is not None:
+            masks.append(prices >= filters["min_price"])
+        return masks
+
+    def mask(self, filters: Dict[str, Any], match_any: bool = False) -> np.ndarray:
+        """
+        Rows matching the filters.
+
+        Args:
+            filters: Filters as accepted by `build_filter_conditions`
+            match_any: OR the conditions together instead of AND
+
+        Returns:
+            np.ndarray: Boolean mask over the rows
+        """
+        masks = self.condition_masks(filters)
+        if not masks:
+            return np.ones(self.size, dtype=bool)
+        combine = np.logical_or if match_any else np.logical_and
+        return combine.reduce(masks)
+
+    def matching_ids(self, filters: Dict[str, Any], match_any: bool = False) -> List[str]:
+        return [self._ids[row] for row in np.flatnonzero(self.mask(filters, match_any))]
+
+    def count(self, filters: Dict[str, Any], match_any: bool = False) -> int:
+        return int(np.count_nonzero(self.mask(filters, match_any)))
+
+    def range_counts(
+        self,
+        filters: Dict[str, Any],
+        field: str,
+        ranges: Sequence[Tuple[float, float]]
+    ) -> List[int]:
+        """Number of matching rows whose `field` lies in each half-open [low, high) range."""
+        values = self._numeric[field][:self.size][self.mask(filters)]
+        return [int(np.count_nonzero((values >= low) & (values < high))) for low, high in ranges]
+
+    def sorted_rows(self, filters: Dict[str, Any], sort_by: Optional[str], descending: bool = False) -> np.ndarray:
+        """
+        Matching rows ordered by `sort_by`, ties broken by point ID. Rows without a
+        value for the sort field are left out, as Qdrant's order_by does.
+        Without `sort_by`, rows are ordered by point ID like a plain scroll.
+        """
+        rows = np.flatnonzero(self.mask(filters))
+        ids = np.array([self._ids[row] for row in rows], dtype=str)
+        if sort_by is None:
+            return rows[np.argsort(ids, kind="stable")]
+
+        values = self._numeric[sort_by][rows]
+        present = ~np.isnan(values)
+        rows, ids, values = rows[present], ids[present], values[present]
+        order = np.lexsort((ids, -values if descending else values))
+        return rows[order]
+
+    def top_n(self, filters: Dict[str, Any], sort_by: str, n: int, descending: bool = False) -> List[str]:
+        """Point IDs of the first `n` matching rows by `sort_by`."""
+        return [self._ids[row] for row in self.sorted_rows(filters, sort_by, descending)[:n]]
+
+    def point_id(self, row: int) -> str:
+        return self._ids[row]
+
+    def record(self, row: int) -> Dict[str, Any]:
+        return self._records[row]
+
+    def sort_value(self, row: int, field: str) -> float:
+        return float(self._numeric[field][row])
+
+
+# Indexes by physical collection name, and alias -> physical collection as seen by this process
+_indexes: Dict[str, FlightIndex] = {}
+_aliases: Dict[str, str] = {}
+_loading: Dict[str, asyncio.Future] = {}
+
+
+def _key(collection_name: str) -> str:
+    return _aliases.get(collection_name, collection_name)
+
+
+def get_flight_index(collection_name: str) -> Optional[FlightIndex]:
+    """The fully loaded index of a collection or alias, or None."""
+    if not FLIGHT_INDEX_ENABLED:
+        return None
+    index = _indexes.get(_key(collection_name))
+    return index if index is not None and index.ready else None
+
+
+def reset_flight_index(collection_name: str):
+    """Start an empty, ready index for a collection that was just created."""
+    if not FLIGHT_INDEX_ENABLED:
+        return
+    index = FlightIndex()
+    index.generation = shared_cache.data_generation()
+    index.ready = True
+    _indexes[_key(collection_name)] = index
+
+
+def update_flight_index(collection_name: str, point_ids: Sequence[str], records: Sequence[Dict[str, Any]]):
+    """
+    Apply freshly upserted records to the collection's index, if one is held.
+    Collections whose index was never built are left alone; it is loaded on first use.
+    """
+    if not FLIGHT_INDEX_ENABLED:
+        return
+    index = _indexes.get(_key(collection_name))
+    if index is not None:
+        index.upsert(point_ids, records)
+
+
+def register_alias(alias: str, collection_name: str):
+    """Record that `alias` now serves `collection_name` and drop whatever it served before."""
+    previous = _aliases.get(alias, alias)
+    if previous != collection_name:
+        _indexes.pop(previous, None)
+    _aliases[alias] = collection_name
+
+
+def drop_flight_index(collection_name: str):
+    _indexes.pop(_key(collection_name), None)
+
+
+def mark_flight_index_current(collection_name: str, generation: int):
+    """
+    Record that this process's index of a collection is current for `generation`, e.g. right
+    after ingesting into it and bumping the data generation, so it isn't rebuilt for its own write.
+    """
+    index = _indexes.get(_key(collection_name))
+    if index is not None and index.ready:
+        index.generation = generation
+
+
+async def _build_flight_index(client: QdrantClient, collection_name: str, key: str) -> FlightIndex:
+    index = FlightIndex()
+    index.generation = shared_cache.data_generation()
+    _indexes[key] = index
+    try:
+        offset = None
+        flight_filter = Filter(must=[
+            FieldCondition(key=payload_key("document_type"), match=MatchValue(value=FLIGHT_DOCUMENT))
+        ])
+        while True:
+            points, offset = await asyncio.to_thread(
+                client.scroll,
+                collection_name=collection_name,
+                scroll_filter=flight_filter,
+                limit=LOAD_BATCH_SIZE,
+                offset=offset,
+                with_payload=[METADATA_PAYLOAD_KEY],
+                with_vectors=False,
+            )
+            index.upsert(
+                [str(point.id) for point in points],
+                [(point.payload or {}).get(METADATA_PAYLOAD_KEY, {}) for point in points]
+            )
+            if offset is None:
+                break
+    except Exception as e:
+        logger.error(f"Failed to build flight index for {collection_name}: {str(e)}")
+        _indexes.pop(key, None)
+        raise
+    finally:
+        _loading.pop(key, None)
+
+    index.ready = True
+    logger.info(f"Built flight index for '{collection_name}' with {len(index)} flights")
+    return index
+
+
+async def load_flight_index(client: QdrantClient, collection_name: str) -> FlightIndex:
+    """
+    Get the index of a collection, building it from a scroll over its flight points if needed.
+
+    The index is registered before the scroll starts so ingestion batches committed
+    meanwhile are applied to it too; it is only served once the scroll has finished.
+    Concurrent callers share one build. An index older than the shared data generation
+    (another worker ingested or promoted since) is rebuilt, and an alias is resolved by
+    Qdrant again instead of through the mapping this process last saw.
+
+    Args:
+        client: Qdrant client
+        collection_name: Collection or alias name
+
+    Returns:
+        FlightIndex: The ready index
+    """
+    key = _key(collection_name)
+    index = _indexes.get(key)
+    if index is not None and index.ready and index.generation < shared_cache.data_generation():
+        logger.info(f"Flight index for '{collection_name}' is older than the shared data, rebuilding it")
+        _indexes.pop(key, None)
+        if _aliases.pop(collection_name, None) is not None:
+            key = collection_name
+        index = None
+    record_cache("flight_index", index is not None and index.ready)
+    if index is not None and index.ready:
+        return index
+
+    if key not in _loading:
+        _loading[key] = asyncio.ensure_future(_build_flight_index(client, collection_name, key))
+    return await asyncio.shield(_loading[key])
@@ -0,0 +1,211 @@
+import json
+import base64
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    Filter, FieldCondition, MatchValue, HasIdCondition, OrderBy, Direction, PayloadSelectorInclude
+)
+from src.client_qdrant import get_qdrant_client
+from src.filters import build_filter_conditions
+from src.flight_index import FLIGHT_INDEX_ENABLED, FlightIndex, load_flight_index, numeric_value
+from src.payloads import FLIGHT_DOCUMENT, FLIGHT_FIELDS, METADATA_PAYLOAD_KEY, payload_key
+
+logger = logging.getLogger(__name__)
+
+# Payload fields flights can be sorted by; each has a range-capable payload index
+SORT_FIELDS = ("price_usd", "flight_duration_hours", "departure_date")
+
+client: Optional[QdrantClient] = None
+
+
+def get_client() -> QdrantClient:
+    global client
+    if client is None:
+        client = get_qdrant_client()
+    return client
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _order_start(sort_by: str, value: Any) -> Any:
+    """Convert a payload value into an OrderBy start_from value."""
+    if sort_by == "departure_date":
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _project(metadata: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    if not fields:
+        return {key: value for key, value in metadata.items() if key in FLIGHT_FIELDS}
+    return {key: metadata[key] for key in fields if key in metadata}
+
+
+def _scroll(
+    collection_name: str,
+    scroll_filter: Filter,
+    limit: int,
+    order_by: Optional[OrderBy],
+    offset: Any,
+    with_payload: Any
+) -> Tuple[list, Any]:
+    return get_client().scroll(
+        collection_name=collection_name,
+        scroll_filter=scroll_filter,
+        limit=limit,
+        order_by=order_by,
+        offset=offset,
+        with_payload=with_payload,
+        with_vectors=False,
+    )
+
+
+def _next_sorted_cursor(cursor_state: Dict[str, Any], sort_by: str, page: List[Tuple[str, Dict[str, Any]]]) -> str:
+    """Cursor after a full sorted page of (point ID, metadata) pairs."""
+    last_value = page[-1][1][sort_by]
+    tied_ids = [point_id for point_id, metadata in page if metadata[sort_by] == last_value]
+    # A tie spanning several pages keeps accumulating the IDs already returned
+    if cursor_state.get("value") == last_value:
+        tied_ids = cursor_state.get("ids", []) + tied_ids
+    return encode_cursor({"value": last_value, "ids": tied_ids})
+
+
+def _search_index(
+    index: FlightIndex,
+    filters: Dict[str, Any],
+    sort_by: Optional[str],
+    order: str,
+    limit: int,
+    cursor_state: Dict[str, Any]
+) -> Tuple[List[Tuple[str, Dict[str, Any]]], Optional[str]]:
+    """
+    A page of the Qdrant scroll answered from the in-process flight index, with the same
+    flights, page sizes and cursor format. Flights with equal sort values come in point
+    ID order, which Qdrant doesn't guarantee, so their order within a tie can differ
+    from a Qdrant scroll. Cursors of either path never skip or repeat a flight.
+    """
+    descending = order == "desc"
+    rows = index.sorted_rows(filters, sort_by, descending)
+
+    if sort_by and "value" in cursor_state:
+        start = numeric_value(sort_by, cursor_state["value"])
+        seen = set(cursor_state.get("ids", []))
+        rows = [
+            row for row in rows
+            if (index.sort_value(row, sort_by) < start if descending else index.sort_value(row, sort_by) > start)
+            or (index.sort_value(row, sort_by) == start and index.point_id(row) not in seen)
+        ]
+    elif not sort_by and "offset" in cursor_state:
+        rows = [row for row in rows if index.point_id(row) >= cursor_state["offset"]]
+
+    page = [(index.point_id(row), index.record(row)) for row in rows[:limit]]
+    next_cursor = None
+    if sort_by and len(page) == limit:
+        next_cursor = _next_sorted_cursor(cursor_state, sort_by, page)
+    elif not sort_by and len(rows) > limit:
+        next_cursor = encode_cursor({"offset": index.point_id(rows[limit])})
+    return page, next_cursor
+
+
+async def search_flights(
+    collection_name: str,
+    filters: Dict[str, Any],
+    sort_by: Optional[str] = None,
+    order: str = "asc",
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Structured flight search answered by a single Qdrant scroll over indexed payloads.
+    No embedding, LLM or reranker calls are made. When the in-process flight index is
+    enabled the page is computed from it without any Qdrant request.
+
+    Sorted pages are paginated by value: the cursor stores the last sort value and the
+    IDs already returned with that value, so ties that span pages are neither skipped
+    nor repeated. Unsorted pages use Qdrant's own scroll offset.
+
+    Args:
+        collection_name: Collection (or alias) to search
+        filters: Filters as accepted by `build_filter_conditions`
+        sort_by: One of SORT_FIELDS, or None for storage order
+        order: "asc" or "desc"
+        limit: Page size
+        cursor: Cursor returned by the previous page
+        fields: Flight fields to return; all flight fields when omitted
+
+    Returns:
+        Dict[str, Any]: `flights` for this page and `next_cursor` (None on the last page)
+    """
+    if sort_by is not None and sort_by not in SORT_FIELDS:
+        raise ValueError(f"Cannot sort by '{sort_by}', expected one of {', '.join(SORT_FIELDS)}")
+    unknown_fields = [field for field in fields or [] if field not in FLIGHT_FIELDS]
+    if unknown_fields:
+        raise ValueError(f"Unknown flight fields: {', '.join(unknown_fields)}")
+
+    cursor_state = decode_cursor(cursor) if cursor else {}
+
+    if FLIGHT_INDEX_ENABLED:
+        try:
+            index = await load_flight_index(get_client(), collection_name)
+            page, next_cursor = _search_index(index, filters, sort_by, order, limit, cursor_state)
+            return {"flights": [_project(metadata, fields) for _, metadata in page], "next_cursor": next_cursor}
+        except Exception as e:
+            logger.warning(f"Flight index unavailable, searching Qdrant: {e}")
+
+    must = [FieldCondition(key=payload_key("document_type"), match=MatchValue(value=FLIGHT_DOCUMENT))]
+    must.extend(build_filter_conditions(filters))
+    must_not = []
+
+    projected = list(dict.fromkeys((fields or []) + ([sort_by] if sort_by else [])))
+    with_payload = (
+        PayloadSelectorInclude(include=[payload_key(field) for field in projected])
+        if fields else [METADATA_PAYLOAD_KEY]
+    )
+
+    order_by = None
+    offset = None
+    if sort_by:
+        start_from = None
+        if "value" in cursor_state:
+            start_from = _order_start(sort_by, cursor_state["value"])
+            must_not.append(HasIdCondition(has_id=cursor_state.get("ids", [])))
+        order_by = OrderBy(
+            key=payload_key(sort_by),
+            direction=Direction.DESC if order == "desc" else Direction.ASC,
+            start_from=start_from
+        )
+    else:
+        offset = cursor_state.get("offset")
+
+    points, next_offset = await asyncio.to_thread(
+        _scroll,
+        collection_name,
+        Filter(must=must, must_not=must_not or None),
+        limit,
+        order_by,
+        offset,
+        with_payload
+    )
+
+    page = [(str(point.id), (point.payload or {}).get(METADATA_PAYLOAD_KEY, {})) for point in points]
+    flights = [_project(metadata, fields) for _, metadata in page]
+
+    next_cursor = None
+    if sort_by and len(page) == limit:
+        next_cursor = _next_sorted_cursor(cursor_state, sort_by, page)
+    elif not sort_by and next_offset is not None:
+        next_cursor = encode_cursor({"offset": str(next_offset)})
+
+    return {"flights": flights, "next_cursor": next_cursor}
@@ -1,8 +1,9 @@
 import os
+import json
+import time
 import logging
 import asyncio
-import json
-from typing import TypedDict, List, Dict, Any, Optional, Literal
+from typing import TypedDict, Annotated, List, Dict, Any, Optional, Literal, Callable, Tuple
 from langgraph.graph import StateGraph, START, END
 from langgraph.types import Command
 from langchain_core.messages import HumanMessage, SystemMessage
@@ -10,16 +11,30 @@ from langchain_qdrant import QdrantVectorStore, RetrievalMode
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.document_compressors.rankllm_rerank import RankLLMRerank
 from langchain_core.documents import Document
-from qdrant_client.models import Filter, FieldCondition, MatchAny, MatchValue, Range
-from src.client_qdrant import get_qdrant_client, ensure_filter_indexes
-from src.embeddings import get_embedding_model
+from qdrant_client.models import Filter, HasIdCondition
+from src.client_qdrant import get_qdrant_client, ensure_filter_indexes, build_search_params, get_sparse_embedding
+from src.embeddings import collection_embedding_model
+from src.filters import build_filter_conditions
+from src.facets import load_facet_catalog
+from src.filter_options import FILTER_OPTIONS_PRUNING, relevant_filter_options, rule_based_filters
+from src.prompt_cache import prompt_messages
+from src.tracing import set_span_attributes
+from src.logging_config import document_log_level, log_documents
+from src.timings import timed_node, track_upstream, record_usage, record_request, merge_timings
+from src.flight_index import FLIGHT_INDEX_ENABLED, FLIGHT_INDEX_PREFILTER_LIMIT, load_flight_index
+from src.sessions import get_session_checkpointer, active_session, session_history, refined_candidates, session_record
+from src.metrics import record_cache
+from src.deadlines import (
+    ANSWER_RESERVE_SECONDS, RETRIEVAL_RESERVE_SECONDS, LLM_STEP_MIN_SECONDS, RERANK_MIN_SECONDS,
+    SHORT_CONTEXT_SECONDS, SHORT_CONTEXT_DOCUMENTS, HARD_TIMEOUT_GRACE_SECONDS,
+    new_deadline, budget, reserve_for, with_deadline, add_degradations, degradation_note
+)
+from src.resilience import CircuitOpenError, call_upstream, upstream_available
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.prompts import ChatPromptTemplate
 
 logger = logging.getLogger(__name__)
 
-embeddings = None
 client = None
 
 def start_event_loop_sync():
@@ -30,20 +45,24 @@ def start_event_loop_sync():
         asyncio.set_event_loop(asyncio.new_event_loop())
 
 async def initialize_components():
-    """Initialize embeddings and client asynchronously."""
-    global embeddings, client
-    if embeddings is None:
-        # Start event loop in thread before initializing embeddings
-        await asyncio.to_thread(start_event_loop_sync)
-        embeddings = await asyncio.to_thread(get_embedding_model, "text-embedding-004")
+    """Initialize the Qdrant client asynchronously."""
+    global client
     if client is None:
+        # Start event loop in thread before the embedding models are initialized
+        await asyncio.to_thread(start_event_loop_sync)
         client = await asyncio.to_thread(get_qdrant_client)
 
 llm = None
 
+# Model constructor overrides, e.g. offline stand-ins in the benchmarks
+chat_model_factory: Optional[Callable[[], Any]] = None
+reranker_factory: Optional[Callable[[int], Any]] = None
+
 async def get_gemini_llm():
     """Get Gemini LLM instance for answer generation."""
     global llm
+    if llm is None and chat_model_factory is not None:
+        llm = chat_model_factory()
     if llm is None:
         try:
             google_api_key = os.getenv("GOOGLE_API_KEY")
@@ -65,6 +84,113 @@ async def get_gemini_llm():
             return None
     return llm
 
+async def warm_up(collection_names: List[str]):
+    """
+    Load the Qdrant client, the chat model, and the embedding model and facet catalog of
+    each collection, so a worker's first requests don't pay for it.
+    """
+    await initialize_components()
+    await get_gemini_llm()
+    for collection_name in collection_names:
+        await asyncio.to_thread(collection_embedding_model, collection_name)
+        await load_facet_catalog(collection_name, client)
+    logger.info(f"Warmed up models for collections: {', '.join(collection_names) or '(none)'}")
+
+# Retrieval depth, rerank cut-offs, retrieval mode and reranker backend; overridable per request
+RETRIEVAL_DEFAULTS = {
+    "flight_k": 20,       # candidates fetched by apply_hard_filters
+    "info_k": 10,         # candidates fetched by hybrid_retrieval
+    "flight_top_n": 10,   # documents kept by llm_reranker
+    "info_top_n": 10,     # documents kept when reranking info-only results
+    "merged_top_n": 15,   # documents kept when reranking flight + info results
+    "retrieval_mode": "dense",  # dense, sparse or hybrid (RRF fusion of both)
+    "reranker": "rankllm",      # rankllm, or none to keep the retrieval order
+}
+
+RETRIEVAL_MODES = {
+    "dense": RetrievalMode.DENSE,
+    "sparse": RetrievalMode.SPARSE,
+    "hybrid": RetrievalMode.HYBRID,
+}
+
+def get_reranker(top_n: int):
+    """Listwise LLM reranker keeping the `top_n` best documents."""
+    if reranker_factory is not None:
+        return reranker_factory(top_n)
+    return RankLLMRerank(model="gpt", gpt_model="gpt-4o-mini", top_n=top_n)
+
+def retrieval_settings(state: Dict[str, Any]) -> Dict[str, Any]:
+    """The request's retrieval overrides on top of RETRIEVAL_DEFAULTS."""
+    return {**RETRIEVAL_DEFAULTS, **(state.get("retrieval") or {})}
+
+async def build_vector_store(collection_name: str, retrieval_mode: str) -> QdrantVectorStore:
+    """
+    Vector store over the collection searching with the given retrieval mode, embedding
+    queries with the model the collection was created with.
+    """
+    mode = RETRIEVAL_MODES[retrieval_mode]
+    embeddings = await asyncio.to_thread(collection_embedding_model, collection_name)
+    sparse_kwargs = {}
+    if mode != RetrievalMode.DENSE:
+        sparse_kwargs = {"sparse_embedding": await asyncio.to_thread(get_sparse_embedding), "sparse_vector_name": "default"}
+    return await asyncio.to_thread(
+        lambda: QdrantVectorStore(
+            client=client,
+            collection_name=collection_name,
+            embedding=embeddings,
+            retrieval_mode=mode,
+            # The vector size is recorded per collection; validating would embed a probe text on every request
+            validate_collection_config=False,
+            **sparse_kwargs
+        )
+    )
+
+async def rerank_documents(documents: List[Document], query: str, top_n: int, backend: str) -> List[Document]:
+    """Keep the `top_n` best documents according to the reranker backend."""
+    if backend == "none":
+        return documents[:top_n]
+    compressor = await asyncio.to_thread(get_reranker, min(top_n, len(documents)))
+    with track_upstream("reranker"):
+        return list(await call_upstream(
+            "reranker", "rerank", lambda: compressor.compress_documents(documents=documents, query=query)
+        ))
+
+async def rerank_in_budget(
+    state: Dict[str, Any], documents: List[Document], query: str, top_n: int, backend: str
+) -> Tuple[List[Document], List[str]]:
+    """
+    Rerank like `rerank_documents` unless the deadline leaves no time for it or the reranker
+    fails; the documents then keep their retrieval order. Also returns the degradations this caused.
+    """
+    if backend == "none":
+        return documents[:top_n], []
+    if budget(state, ANSWER_RESERVE_SECONDS) < RERANK_MIN_SECONDS:
+        logger.warning("Not enough time left to rerank, keeping the retrieval order")
+        return documents[:top_n], ["reranking"]
+    try:
+        return await with_deadline(
+            state, rerank_documents(documents, query, top_n, backend), reserve=ANSWER_RESERVE_SECONDS
+        ), []
+    except asyncio.TimeoutError:
+        logger.warning("Reranking ran out of time, keeping the retrieval order")
+        return documents[:top_n], ["reranking"]
+    except CircuitOpenError:
+        logger.warning("Reranker circuit is open, keeping the retrieval order")
+        return documents[:top_n], ["reranking"]
+    except Exception as e:
+        logger.error(f"Reranking failed, keeping the retrieval order: {e}")
+        return documents[:top_n], ["reranking"]
+
+def available_retrieval_mode(mode: str) -> Tuple[str, List[str]]:
+    """
+    The retrieval mode to search with: sparse only while the embeddings circuit is open,
+    since BM25 query vectors are computed locally. Also returns the degradations this caused.
+    """
+    if mode != "sparse" and not upstream_available("embeddings"):
+        logger.warning(f"Embeddings circuit is open, searching with sparse vectors instead of {mode}")
+        return "sparse", ["embeddings"]
+    return mode, []
+
 class GraphState(TypedDict):
     """
     Represents the state of our minimal search and answer generation graph.
@@ -73,13 +199,77 @@ class GraphState(TypedDict):
     collection_name: str
     query_type: str  # "flight_only", "info_only", "both"
     filters: Dict[str, Any]
-    filter_options: Dict[str, Any]
+    search_params: Dict[str, Any]  # hnsw_ef / oversampling / rescore / exact for Qdrant
+    retrieval: Dict[str, Any]  # overrides of RETRIEVAL_DEFAULTS
     filtered_docs: List[Document]
     info_docs: List[Document]  # Documents from hybrid retrieval
     reranked_docs: List[Document]
     answer: str
+    timings: Annotated[Dict[str, Any], merge_timings]  # per node: wall_ms, upstream_ms, tokens, cost_usd
+    session: Dict[str, Any]  # previous turn of a search session, kept by the checkpointer (src/sessions.py)
+    refined: bool  # flight candidates were narrowed from the previous turn rather than searched
+    filters_applied: bool  # flight candidates match the filters, rather than coming from the unfiltered fallback search
+    candidates_complete: bool  # flight candidates are every match of the filters, not cut off at flight_k
+    deadline: float  # time.time() by which the answer is due (src/deadlines.py)
+    degraded: Annotated[List[str], add_degradations]  # steps cut short to meet the deadline
+
+
+def session_context(state: GraphState, include_filters: bool = False) -> str:
+    """Earlier queries of the search session (and their filters) to put before a follow-up query."""
+    history = session_history(state)
+    if not history:
+        return ""
+    context = "Earlier queries in this conversation:\n" + "\n".join(f"- {previous}" for previous in history)
+    if include_filters:
+        context += f"\nFilters of the previous query: {json.dumps(active_session(state)['filters'])}"
+        context += "\nIf the query refines the previous one, keep those filters and add to them; if it starts a new search, ignore them."
+    return context + "\n\n"
+
+
+CLASSIFICATION_SYSTEM_PROMPT = """You are a query classifier for a flight booking and travel information system. 
+Analyze the user's query and classify it into one of three categories:
 
+1. "flight_only" - Query is specifically about flight booking, searching, or flight details (e.g., "flights from NYC to London", "business class flights under $2000", "Emirates flights to Dubai")
+
+2. "info_only" - Query is about travel information, policies, rules, or general travel advice (e.g., "visa requirements for India", "refund policies", "baggage rules", "travel tips")
 
+3. "both" - Query contains both flight-specific requests and general information requests (e.g., "flights to Japan and visa requirements", "Emirates flights to Dubai and their baggage policy")
+
+Return only the classification string: "flight_only", "info_only", or "both\""""
+
+FILTER_SYSTEM_PROMPT = """You are a filter generation assistant for a flight booking system. Based on the user's query and available filter options, generate appropriate filters to narrow down the search results.
+
+Instructions:
+1. Analyze the user's query to identify relevant filters
+2. For layover queries (e.g., "flights to X with layover in Y"), focus on the destination country (X) and consider the layover country (Y) as additional context
+3. Select specific values from the available options that match the query intent
+4. Only include filters that are explicitly mentioned or strongly implied in the query
+5. Return a JSON object with the selected filters
+6. Use null for filters that are not applicable
+
+IMPORTANT: For queries about flights to a specific country, always set the "to_country" filter to that country.
+
+Example output format:
+{
+    "airline": null,
+    "from_country": null, 
+    "to_country": "Turkey",
+    "travel_class": null,
+    "max_price": null,
+    "refundable": null,
+    "baggage_included": null,
+    "wifi_available": null,
+    "meal_service": null,
+    "aircraft_type": null
+}
+
+Examples:
+- Query: "flights to Turkey with layover in London" → {"to_country": "Turkey"}
+- Query: "Emirates flights to Dubai" → {"airline": "Emirates", "to_country": "UAE"}
+- Query: "business class flights under $2000" → {"travel_class": "business", "max_price": 2000}"""
+
+
+@timed_node("classify_query")
 async def classify_query(state: GraphState) -> Command[Literal["generate_filters", "hybrid_retrieval"]]:
     """
     Classify the query to determine if it's flight-related, info-related, or both.
@@ -88,31 +278,26 @@ async def classify_query(state: GraphState) -> Command[Literal["generate_filters
     try:
         query = state["query"]
         
-        classification_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a query classifier for a flight booking and travel information system. 
-Analyze the user's query and classify it into one of three categories:
-
-1. "flight_only" - Query is specifically about flight booking, searching, or flight details (e.g., "flights from NYC to London", "business class flights under $2000", "Emirates flights to Dubai")
-
-2. "info_only" - Query is about travel information, policies, rules, or general travel advice (e.g., "visa requirements for India", "refund policies", "baggage rules", "travel tips")
-
-3. "both" - Query contains both flight-specific requests and general information requests (e.g., "flights to Japan and visa requirements", "Emirates flights to Dubai and their baggage policy")
-
-Return only the classification string: "flight_only", "info_only", or "both"
-
-User Query: {query}"""),
-            ("human", "Classify this query.")
-        ])
+        if budget(state, ANSWER_RESERVE_SECONDS + RETRIEVAL_RESERVE_SECONDS) < LLM_STEP_MIN_SECONDS:
+            logger.warning("Not enough time left to classify the query, defaulting to 'both'")
+            return Command(goto="generate_filters", update={"query_type": "both", "degraded": ["classification"]})
         
         llm_instance = await get_gemini_llm()
         if llm_instance:
             try:
-                response = await asyncio.to_thread(
-                    lambda: llm_instance.invoke([
-                        SystemMessage(content=classification_prompt.format(query=query)),
-                        HumanMessage(content="Classify this query.")
-                    ])
+                messages, llm_kwargs = await prompt_messages(
+                    "classify_query",
+                    CLASSIFICATION_SYSTEM_PROMPT,
+                    f"{session_context(state)}User Query: {query}\n\nClassify this query.",
+                    llm_instance.model
                 )
+                with track_upstream("gemini"):
+                    response = await with_deadline(
+                        state,
+                        call_upstream("gemini", "classify_query", lambda: llm_instance.invoke(messages, **llm_kwargs), hedge=True),
+                        reserve=ANSWER_RESERVE_SECONDS + RETRIEVAL_RESERVE_SECONDS
+                    )
+                record_usage(llm_instance.model, response)
                 query_type = response.content.strip().lower()
                 
                 if query_type not in ["flight_only", "info_only", "both"]:
@@ -126,101 +311,90 @@ User Query: {query}"""),
                 else:
                     return Command(goto="hybrid_retrieval", update={"query_type": query_type})
                 
+            except (asyncio.TimeoutError, CircuitOpenError) as e:
+                logger.warning(f"No classification from the LLM ({type(e).__name__}), defaulting to 'both'")
+                return Command(goto="generate_filters", update={"query_type": "both", "degraded": ["classification"]})
             except Exception as e:
                 logger.error(f"Error classifying query with LLM: {e}")
-                return Command(goto="generate_filters", update={"query_type": "both"})
+                return Command(goto="generate_filters", update={"query_type": "both", "degraded": ["classification"]})
         else:
             logger.warning("LLM not available for query classification, defaulting to 'both'")
             return Command(goto="generate_filters", update={"query_type": "both"})
             
     except Exception as e:
         logger.error(f"Error in classify_query: {e}", exc_info=True)
-        return Command(goto="generate_filters", update={"query_type": "both"})
+        return Command(goto="generate_filters", update={"query_type": "both", "degraded": ["classification"]})
 
 
+@timed_node("generate_filters")
 async def generate_filters(state: GraphState) -> Command[Literal["apply_hard_filters"]]:
     """
-    Generate filters dynamically using LLM based on the query and available filter options.
+    Generate filters dynamically using LLM based on the query and the filter options
+    in the collection's facet catalog.
     """
     logger.info("Starting dynamic filter generation")
     try:
         await initialize_components()
         
         query = state["query"]
-        filter_options = state.get("filter_options", get_filter_options())
+        with track_upstream("qdrant"):
+            catalog = await load_facet_catalog(state["collection_name"], client)
+        filter_options = relevant_filter_options(catalog, query)
+        context = session_context(state, include_filters=True)
         
         logger.info(f"Generating filters for query: {query}")
         
-        filter_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a filter generation assistant for a flight booking system. Based on the user's query and available filter options, generate appropriate filters to narrow down the search results.
-
-Available filter options:
-{filter_options}
-
-Instructions:
-1. Analyze the user's query to identify relevant filters
-2. For layover queries (e.g., "flights to X with layover in Y"), focus on the destination country (X) and consider the layover country (Y) as additional context
-3. Select specific values from the available options that match the query intent
-4. Only include filters that are explicitly mentioned or strongly implied in the query
-5. Return a JSON object with the selected filters
-6. Use null for filters that are not applicable
-
-IMPORTANT: For queries about flights to a specific country, always set the "to_country" filter to that country.
-
-Example output format:
-{{
-    "airline": null,
-    "from_country": null, 
-    "to_country": "Turkey",
-    "travel_class": null,
-    "max_price": null,
-    "refundable": null,
-    "baggage_included": null,
-    "wifi_available": null,
-    "meal_service": null,
-    "aircraft_type": null
-}}
-
-Examples:
-- Query: "flights to Turkey with layover in London" → {{"to_country": "Turkey"}}
-- Query: "Emirates flights to Dubai" → {{"airline": "Emirates", "to_country": "UAE"}}
-- Query: "business class flights under $2000" → {{"travel_class": "business", "max_price": 2000}}
-
-User Query: {query}"""),
-            ("human", "Generate filters for this query.")
-        ])
-        
-        json_parser = JsonOutputParser()
+        if budget(state, ANSWER_RESERVE_SECONDS + RETRIEVAL_RESERVE_SECONDS) < LLM_STEP_MIN_SECONDS:
+            filters = rule_based_filters(catalog, query)
+            logger.warning(f"Not enough time left to generate filters, using rule-based filters: {filters}")
+            return Command(goto="apply_hard_filters", update={"filters": filters, "degraded": ["filters"]})
         
         llm_instance = await get_gemini_llm()
         if llm_instance:
             try:
-                chain = filter_prompt | llm_instance | json_parser
+                if FILTER_OPTIONS_PRUNING:
+                    # Options depend on the query, so they travel with it in the per-request suffix
+                    system_prompt = FILTER_SYSTEM_PROMPT
+                    user_prompt = f"Available filter options:\n{filter_options}\n\n{context}User Query: {query}\n\nGenerate filters for this query."
+                else:
+                    # All options are static per catalog version and belong to the cached prefix
+                    system_prompt = f"{FILTER_SYSTEM_PROMPT}\n\nAvailable filter options:\n{filter_options}"
+                    user_prompt = f"{context}User Query: {query}\n\nGenerate filters for this query."
                 
-                filters = await asyncio.to_thread(
-                    lambda: chain.invoke({
-                        "query": query,
-                        "filter_options": json.dumps(filter_options, indent=2)
-                    })
+                messages, llm_kwargs = await prompt_messages(
+                    "generate_filters", system_prompt, user_prompt, llm_instance.model
                 )
+                with track_upstream("gemini"):
+                    response = await with_deadline(
+                        state,
+                        call_upstream("gemini", "generate_filters", lambda: llm_instance.invoke(messages, **llm_kwargs), hedge=True),
+                        reserve=ANSWER_RESERVE_SECONDS + RETRIEVAL_RESERVE_SECONDS
+                    )
+                record_usage(llm_instance.model, response)
+                filters = JsonOutputParser().parse(response.content)
                 
                 cleaned_filters = {k: v for k, v in filters.items() if v is not None}
                 
                 logger.info(f"Generated filters: {cleaned_filters}")
                 return Command(goto="apply_hard_filters", update={"filters": cleaned_filters})
                 
+            except (asyncio.TimeoutError, CircuitOpenError) as e:
+                filters = rule_based_filters(catalog, query)
+                logger.warning(f"No filters from the LLM ({type(e).__name__}), using rule-based filters: {filters}")
+                return Command(goto="apply_hard_filters", update={"filters": filters, "degraded": ["filters"]})
             except Exception as e:
                 logger.error(f"Error generating filters with LLM: {e}")
-                return Command(goto="apply_hard_filters", update={"filters": {}})
+                return Command(goto="apply_hard_filters", update={"filters": {}, "degraded": ["filters"]})
         else:
             logger.warning("LLM not available for filter generation")
             return Command(goto="apply_hard_filters", update={"filters": {}})
             
     except Exception as e:
         logger.error(f"Error in generate_filters: {e}", exc_info=True)
-        return Command(goto="apply_hard_filters", update={"filters": {}})
+        return Command(goto="apply_hard_filters", update={"filters": {}, "degraded": ["filters"]})
 
 
+@timed_node("apply_hard_filters")
 async def apply_hard_filters(state: GraphState) -> Command[Literal["llm_reranker"]]:
     """
     Apply hard filters to the collection based on metadata.
@@ -236,179 +410,117 @@ async def apply_hard_filters(state: GraphState) -> Command[Literal["llm_reranker
         
         logger.info(f"Applying filters: {filters} to collection: {collection_name}")
         
+        # A follow-up that only narrows the previous turn's filters is answered from its candidates
+        if active_session(state):
+            candidates = refined_candidates(state, filters)
+            record_cache("session_candidates", candidates is not None)
+            if candidates is not None:
+                logger.info(f"Narrowed the session's previous candidates to {len(candidates)} documents")
+                return Command(goto="llm_reranker", update={"filtered_docs": candidates, "refined": True, "filters_applied": True, "candidates_complete": True})
+        
         try:
-            await ensure_filter_indexes(client, collection_name)
+            with track_upstream("qdrant"):
+                await ensure_filter_indexes(client, collection_name)
             logger.info("Ensured filter indexes exist")
         except Exception as e:
             logger.warning(f"Could not ensure filter indexes: {e}")
         
-        try:
-            sample_points, _ = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: client.scroll(
-                    collection_name=collection_name,
-                    limit=1,
-                    with_payload=True,
-                    with_vectors=False,
-                )
-            )
-            if sample_points:
-                sample_metadata = sample_points[0].payload
-                logger.info(f"Sample document metadata keys: {list(sample_metadata.keys())}")
-                logger.info(f"Sample document metadata: {sample_metadata}")
-        except Exception as e:
-            logger.warning(f"Could not get sample document: {e}")
-        
-        filter_conditions = []
-        
-        if "airline" in filters:
-            filter_conditions.append(
-                FieldCondition(
-                    key="airline",
-                    match=MatchValue(value=filters["airline"])
-                )
-            )
-        
-        if "alliance" in filters:
-            filter_conditions.append(
-                FieldCondition(
-                    key="alliance",
-                    match=MatchValue(value=filters["alliance"])
-                )
-            )
-        
-        if "from_country" in filters:
-            filter_conditions.append(
-                FieldCondition(
-                    key="from_country",
-                    match=MatchValue(value=filters["from_country"])
-                )
-            )
-        
-        if "to_country" in filters:
-            filter_conditions.append(
-                FieldCondition(
-                    key="to_country",
-                    match=MatchValue(value=filters["to_country"])
-                )
-            )
-        
-        if "travel_class" in filters:
-            filter_conditions.append(
-                FieldCondition(
-                    key="travel_class",
-                    match=MatchValue(value=filters["travel_class"])
-                )
-            )
-        
-        if "max_price" in filters:
-            filter_conditions.append(
-                FieldCondition(
-                    key="price_usd",
-                    range=Range(lte=filters["max_price"])
-                )
-            )
-        
-        if "min_price" in filters:
-            filter_conditions.append(
-                FieldCondition(
-                    key="price_usd",
-                    range=Range(gte=filters["min_price"])
-                )
-            )
-        
-        if "refundable" in filters:
-            filter_conditions.append(
-                FieldCondition(
-                    key="refundable",
-                    match=MatchValue(value=filters["refundable"])
-                )
-            )
-        
-        if "baggage_included" in filters:
-            filter_conditions.append(
-                FieldCondition(
-                    key="baggage_included",
-                    match=MatchValue(value=filters["baggage_included"])
-                )
-            )
-        
-        if "wifi_available" in filters:
-            filter_conditions.append(
-                FieldCondition(
-                    key="wifi_available",
-                    match=MatchValue(value=filters["wifi_available"])
-                )
-            )
-        
-        if "meal_service" in filters:
-            filter_conditions.append(
-                FieldCondition(
-                    key="meal_service",
-                    match=MatchValue(value=filters["meal_service"])
-                )
-            )
+        # A sample payload is only fetched when it would be logged: it costs a Qdrant round trip
+        sample_log_level = document_log_level(logger)
+        if sample_log_level is not None:
+            try:
+                with track_upstream("qdrant"):
+                    sample_points, _ = await asyncio.get_event_loop().run_in_executor(
+                        None,
+                        lambda: client.scroll(
+                            collection_name=collection_name,
+                            limit=1,
+                            with_payload=True,
+                            with_vectors=False,
+                        )
+                    )
+                if sample_points:
+                    logger.log(sample_log_level, "Sample document payload", extra={"payload": sample_points[0].payload})
+            except Exception as e:
+                logger.warning(f"Could not get sample document: {e}")
         
-        if "aircraft_type" in filters:
-            filter_conditions.append(
-                FieldCondition(
-                    key="aircraft_type",
-                    match=MatchValue(value=filters["aircraft_type"])
-                )
-            )
+        filter_conditions = build_filter_conditions(filters)
         
+        # Every filter must hold, as in /flights/search and session refinement
         if filter_conditions:
-            if len(filter_conditions) > 1:
-                filter_obj = Filter(should=filter_conditions)
-            else:
-                filter_obj = Filter(must=filter_conditions)
+            filter_obj = Filter(must=filter_conditions)
             logger.info(f"Created filter with {len(filter_conditions)} conditions: {filter_conditions}")
         else:
             filter_obj = None
             logger.info("No filter conditions created, will search without filters")
         
-        original_store = await asyncio.to_thread(
-            lambda: QdrantVectorStore(
-                client=client,
-                collection_name=collection_name,
-                embedding=embeddings,
-                retrieval_mode=RetrievalMode.DENSE,
-            )
-        )
+        # Resolve the filters in-process and hand Qdrant the candidate IDs instead
+        candidate_ids = None
+        if FLIGHT_INDEX_ENABLED and filter_conditions:
+            try:
+                with track_upstream("qdrant"):
+                    flight_index = await load_flight_index(client, collection_name)
+                candidate_ids = flight_index.matching_ids(filters)
+                logger.info(f"Flight index matched {len(candidate_ids)} candidates")
+                if len(candidate_ids) <= FLIGHT_INDEX_PREFILTER_LIMIT:
+                    filter_obj = Filter(must=[HasIdCondition(has_id=candidate_ids)])
+            except Exception as e:
+                logger.warning(f"Flight index unavailable, filtering in Qdrant: {e}")
+        
+        settings = retrieval_settings(state)
+        k = settings["flight_k"]
+        retrieval_mode, degraded = available_retrieval_mode(settings["retrieval_mode"])
+        original_store = await build_vector_store(collection_name, retrieval_mode)
+        
+        search_params = build_search_params(**state.get("search_params", {}))
+        
+        set_span_attributes(k=k, prefiltered_candidates=len(candidate_ids) if candidate_ids is not None else None)
         
         # First try with filters
         retriever = original_store.as_retriever(
-            search_kwargs={"k": 20, "filter": filter_obj}
+            search_kwargs={"k": k, "filter": filter_obj, "search_params": search_params}
         )
         
-        logger.info(f"Searching with query: '{query}' and filter: {filter_obj}")
-        filtered_docs = await retriever.ainvoke(query)
-        
-        if not filtered_docs:
-            logger.warning(f"No documents found with filters: {filters}, trying without filters")
-            retriever = original_store.as_retriever(search_kwargs={"k": 20})
-            filtered_docs = await retriever.ainvoke(query)
-            logger.info(f"Retrieved {len(filtered_docs)} documents without filters")
-        else:
-            logger.info(f"Retrieved {len(filtered_docs)} documents with filters")
+        filters_applied = filter_obj is not None
+        try:
+            if candidate_ids == []:
+                filtered_docs = []
+            else:
+                logger.info(f"Searching with query: '{query}' and filter: {filter_obj}")
+                with track_upstream("retrieval"):
+                    filtered_docs = await with_deadline(state, retriever.ainvoke(query), reserve=reserve_for(state, ANSWER_RESERVE_SECONDS))
+            
+            if not filtered_docs:
+                logger.warning(f"No documents found with filters: {filters}, trying without filters")
+                filters_applied = False
+                retriever = original_store.as_retriever(search_kwargs={"k": k, "search_params": search_params})
+                with track_upstream("retrieval"):
+                    filtered_docs = await with_deadline(state, retriever.ainvoke(query), reserve=reserve_for(state, ANSWER_RESERVE_SECONDS))
+                logger.info(f"Retrieved {len(filtered_docs)} documents without filters")
+            else:
+                logger.info(f"Retrieved {len(filtered_docs)} documents with filters")
+        except asyncio.TimeoutError:
+            logger.warning("Flight retrieval ran out of time")
+            return Command(goto="llm_reranker", update={"filtered_docs": [], "degraded": degraded + ["retrieval"]})
         
         logger.info(f"Total documents retrieved: {len(filtered_docs)}")
         
         # Log the first few documents to debug ordering
-        if filtered_docs:
-            logger.info("First 3 documents retrieved:")
-            for i, doc in enumerate(filtered_docs[:3]):
-                logger.info(f"  Doc {i+1}: {doc.page_content[:100]}...")
-                if hasattr(doc, 'metadata') and doc.metadata:
-                    logger.info(f"    Metadata: {doc.metadata}")
+        log_documents(logger, "First documents retrieved", filtered_docs, limit=3)
         
-        return Command(goto="llm_reranker", update={"filtered_docs": filtered_docs})
+        # Fewer results than k (or at most k matches in the flight index) means none were cut off
+        complete = len(candidate_ids) <= k if candidate_ids is not None else len(filtered_docs) < k
+        update = {"filtered_docs": filtered_docs, "filters_applied": filters_applied, "candidates_complete": filters_applied and complete}
+        if degraded:
+            update["degraded"] = degraded
+        return Command(goto="llm_reranker", update=update)
         
     except Exception as e:
         logger.error(f"Error in apply_hard_filters: {e}", exc_info=True)
-        return Command(goto="llm_reranker", update={"filtered_docs": []})
+        return Command(goto="llm_reranker", update={"filtered_docs": [], "degraded": ["retrieval"]})
 
 
+@timed_node("llm_reranker")
 async def llm_reranker(state: GraphState) -> Command[Literal["merge_documents"]]:
     """
     Rerank the filtered documents using LLM reranker.
@@ -425,42 +537,40 @@ async def llm_reranker(state: GraphState) -> Command[Literal["merge_documents"]]
         logger.info(f"Reranking {len(filtered_docs)} flight documents")
         
         # Log the original order of documents
-        logger.info("Original document order:")
-        for i, doc in enumerate(filtered_docs[:5]):  # Log first 5 documents
-            logger.info(f"  Original {i+1}: {doc.page_content[:100]}...")
-            if hasattr(doc, 'metadata') and doc.metadata:
-                logger.info(f"    Metadata: {doc.metadata}")
-        
-        
-        compressor = await asyncio.to_thread(
-            lambda: RankLLMRerank(
-                model="gpt", 
-                gpt_model="gpt-4o-mini", 
-                top_n=min(10, len(filtered_docs))
-            )
-        )
+        log_documents(logger, "Original document order", filtered_docs, limit=5)
         
-        reranked_docs = await compressor.acompress_documents(
-            documents=filtered_docs,
-            query=query
-        )
+        settings = retrieval_settings(state)
+        # Narrowed candidates keep the previous turn's ranking
+        reranker = "none" if state.get("refined") else settings["reranker"]
+        reranked_docs, degraded = await rerank_in_budget(state, filtered_docs, query, settings["flight_top_n"], reranker)
         
         # Log the reranked order of documents
-        logger.info("Reranked document order:")
-        for i, doc in enumerate(reranked_docs[:5]):  # Log first 5 documents
-            logger.info(f"  Reranked {i+1}: {doc.page_content[:100]}...")
-            if hasattr(doc, 'metadata') and doc.metadata:
-                logger.info(f"    Metadata: {doc.metadata}")
+        log_documents(logger, "Reranked document order", reranked_docs, limit=5)
         
         logger.info(f"Reranked flight documents to {len(reranked_docs)} documents")
         
-        return Command(goto="merge_documents", update={"reranked_docs": reranked_docs})
+        update = {"reranked_docs": reranked_docs}
+        if degraded:
+            update["degraded"] = degraded
+        return Command(goto="merge_documents", update=update)
         
     except Exception as e:
         logger.error(f"Error in llm_reranker: {e}", exc_info=True)
-        return Command(goto="merge_documents", update={"reranked_docs": []})
+        return Command(goto="merge_documents", update={"reranked_docs": [], "degraded": ["retrieval"]})
+
+
+def finish_answer(state: GraphState, answer: str, degraded: Optional[List[str]] = None) -> Command:
+    """End the run with `answer`, noting in it every step cut short to meet the deadline."""
+    all_degraded = add_degradations(state.get("degraded"), degraded) if degraded else list(state.get("degraded") or [])
+    if all_degraded:
+        answer = f"{answer}\n\n{degradation_note(all_degraded)}"
+    update = {"answer": answer, "session": session_record(state)}
+    if degraded:
+        update["degraded"] = degraded
+    return Command(goto=END, update=update)
 
 
+@timed_node("generate_answer")
 async def generate_answer(state: GraphState) -> Command[Literal[END]]:
     """
     Generate an answer based on the reranked documents and query.
@@ -472,7 +582,14 @@ async def generate_answer(state: GraphState) -> Command[Literal[END]]:
         
         if not reranked_docs:
             logger.warning("No documents available for answer generation")
-            return Command(goto=END, update={"answer": "I couldn't find any relevant information to answer your query."})
+            return finish_answer(state, "I couldn't find any relevant information to answer your query.")
+        
+        degraded = []
+        # A shorter prompt is read faster by the model
+        if budget(state) < SHORT_CONTEXT_SECONDS and len(reranked_docs) > SHORT_CONTEXT_DOCUMENTS:
+            logger.warning(f"Little time left, answering from the first {SHORT_CONTEXT_DOCUMENTS} documents")
+            reranked_docs = reranked_docs[:SHORT_CONTEXT_DOCUMENTS]
+            degraded.append("context")
         
         context = "\n\n".join([doc.page_content for doc in reranked_docs])
         
@@ -483,33 +600,44 @@ Context:
 
 Please answer the following question based on the context above. If the context doesn't contain enough information to answer the question, say so. Be concise and accurate.
 
-Question: {query}"""
+{session_context(state)}Question: {query}"""
         
         llm_instance = await get_gemini_llm()
         if llm_instance:
             try:
-                response = await asyncio.to_thread(
-                    lambda: llm_instance.invoke([
-                        SystemMessage(content=system_message),
-                        HumanMessage(content=query)
-                    ])
-                )
+                with track_upstream("gemini"):
+                    response = await with_deadline(state, call_upstream(
+                        "gemini", "generate_answer",
+                        lambda: llm_instance.invoke([
+                            SystemMessage(content=system_message),
+                            HumanMessage(content=query)
+                        ])
+                    ))
+                record_usage(llm_instance.model, response)
                 answer = response.content
+            except (asyncio.TimeoutError, CircuitOpenError) as e:
+                logger.warning(f"No answer from the LLM ({type(e).__name__}), listing the best matches")
+                best_matches = "\n".join(f"- {doc.page_content[:200]}" for doc in reranked_docs[:SHORT_CONTEXT_DOCUMENTS])
+                answer = f"A full answer could not be written. The best matches were:\n{best_matches}"
+                degraded.append("answer")
             except Exception as e:
                 logger.error(f"Error calling LLM: {e}")
                 answer = f"Based on the {len(reranked_docs)} relevant documents found, here's what I can tell you about '{query}': [LLM generation failed]"
+                degraded.append("answer")
         else:
             answer = f"Based on the {len(reranked_docs)} relevant documents found, here's what I can tell you about '{query}': [LLM not available]"
+            degraded.append("answer")
         
         logger.info("Answer generation complete")
         
-        return Command(goto=END, update={"answer": answer})
+        return finish_answer(state, answer, degraded)
         
     except Exception as e:
         logger.error(f"Error in generate_answer: {e}", exc_info=True)
-        return Command(goto=END, update={"answer": "Sorry, I encountered an error while generating the answer."})
+        return Command(goto=END, update={"answer": "Sorry, I encountered an error while generating the answer.", "degraded": ["answer"]})
 
 
+@timed_node("hybrid_retrieval")
 async def hybrid_retrieval(state: GraphState) -> Command[Literal["merge_documents"]]:
     """
     Perform hybrid retrieval without hard filters for info-only queries.
@@ -523,27 +651,33 @@ async def hybrid_retrieval(state: GraphState) -> Command[Literal["merge_document
         
         logger.info(f"Performing hybrid retrieval for query: '{query}'")
         
-        original_store = await asyncio.to_thread(
-            lambda: QdrantVectorStore(
-                client=client,
-                collection_name=collection_name,
-                embedding=embeddings,
-                retrieval_mode=RetrievalMode.DENSE,
-            )
-        )
+        settings = retrieval_settings(state)
+        retrieval_mode, degraded = available_retrieval_mode(settings["retrieval_mode"])
+        original_store = await build_vector_store(collection_name, retrieval_mode)
         
-        retriever = original_store.as_retriever(search_kwargs={"k": 10})
-        info_docs = await retriever.ainvoke(query)
+        search_params = build_search_params(**state.get("search_params", {}))
+        retriever = original_store.as_retriever(search_kwargs={"k": settings["info_k"], "search_params": search_params})
+        set_span_attributes(k=settings["info_k"])
+        try:
+            with track_upstream("retrieval"):
+                info_docs = await with_deadline(state, retriever.ainvoke(query), reserve=reserve_for(state, ANSWER_RESERVE_SECONDS))
+        except asyncio.TimeoutError:
+            logger.warning("Info retrieval ran out of time")
+            return Command(goto="merge_documents", update={"info_docs": [], "degraded": degraded + ["retrieval"]})
         
         logger.info(f"Retrieved {len(info_docs)} documents from hybrid retrieval")
         
-        return Command(goto="merge_documents", update={"info_docs": info_docs})
+        update = {"info_docs": info_docs}
+        if degraded:
+            update["degraded"] = degraded
+        return Command(goto="merge_documents", update=update)
         
     except Exception as e:
         logger.error(f"Error in hybrid_retrieval: {e}", exc_info=True)
-        return Command(goto="merge_documents", update={"info_docs": []})
+        return Command(goto="merge_documents", update={"info_docs": [], "degraded": ["retrieval"]})
 
 
+@timed_node("merge_documents")
 async def merge_documents(state: GraphState) -> Command[Literal["generate_answer"]]:
     """
     Merge documents from both flight and info retrieval paths and rerank if needed.
@@ -554,6 +688,9 @@ async def merge_documents(state: GraphState) -> Command[Literal["generate_answer
         info_docs = state.get("info_docs", [])
         query_type = state.get("query_type", "both")
         query = state["query"]
+        settings = retrieval_settings(state)
+        reranker = "none" if state.get("refined") else settings["reranker"]
+        degraded = []
         
         if query_type == "flight_only":
             merged_docs = filtered_docs
@@ -561,17 +698,7 @@ async def merge_documents(state: GraphState) -> Command[Literal["generate_answer
         elif query_type == "info_only":
             if info_docs:
                 logger.info(f"Reranking {len(info_docs)} info documents")
-                compressor = await asyncio.to_thread(
-                    lambda: RankLLMRerank(
-                        model="gpt", 
-                        gpt_model="gpt-4o-mini", 
-                        top_n=min(10, len(info_docs))
-                    )
-                )
-                merged_docs = await compressor.acompress_documents(
-                    documents=info_docs,
-                    query=query
-                )
+                merged_docs, degraded = await rerank_in_budget(state, info_docs, query, settings["info_top_n"], reranker)
                 logger.info(f"Reranked info documents to {len(merged_docs)} documents")
             else:
                 merged_docs = []
@@ -580,27 +707,20 @@ async def merge_documents(state: GraphState) -> Command[Literal["generate_answer
             all_docs = filtered_docs + info_docs
             if all_docs:
                 logger.info(f"Reranking combined {len(all_docs)} documents (flight + info)")
-                compressor = await asyncio.to_thread(
-                    lambda: RankLLMRerank(
-                        model="gpt", 
-                        gpt_model="gpt-4o-mini", 
-                        top_n=min(15, len(all_docs))
-                    )
-                )
-                merged_docs = await compressor.acompress_documents(
-                    documents=all_docs,
-                    query=query
-                )
+                merged_docs, degraded = await rerank_in_budget(state, all_docs, query, settings["merged_top_n"], reranker)
                 logger.info(f"Reranked combined documents to {len(merged_docs)} documents")
             else:
                 merged_docs = []
                 logger.info("No documents to rerank")
         
-        return Command(goto="generate_answer", update={"reranked_docs": merged_docs})
+        update = {"reranked_docs": merged_docs}
+        if degraded:
+            update["degraded"] = degraded
+        return Command(goto="generate_answer", update=update)
         
     except Exception as e:
         logger.error(f"Error in merge_documents: {e}", exc_info=True)
-        return Command(goto="generate_answer", update={"reranked_docs": []})
+        return Command(goto="generate_answer", update={"reranked_docs": [], "degraded": ["retrieval"]})
 
 
 workflow = StateGraph(GraphState)
@@ -617,55 +737,23 @@ workflow.add_edge(START, "classify_query")
 
 app = workflow.compile()
 
-def get_filter_options():
-    """Get available filter options for dynamic filter generation."""
-    return {
-        "airline": [
-            "Aeromexico", "Air Canada", "Air France", "Alitalia", "All Nippon Airways",
-            "American Airlines", "British Airways", "Cathay Pacific", "China Eastern",
-            "Delta Air Lines", "Emirates", "Etihad Airways", "Finnair", "Iberia",
-            "Japan Airlines", "JetBlue Airways", "KLM", "Korean Air", "Lufthansa",
-            "Norwegian Air", "Qantas", "Qatar Airways", "Ryanair", "Singapore Airlines",
-            "Southwest Airlines", "Spirit Airlines", "Swiss International", "Thai Airways",
-            "Turkish Airlines", "United Airlines", "Vietnam Airlines", "Virgin Atlantic"
-        ],
-        "alliance": ["Non-Alliance", "OneWorld", "SkyTeam", "Star Alliance"],
-        "from_country": [
-            "Australia", "Canada", "Egypt", "France", "Germany", "Hong Kong", "India",
-            "Italy", "Japan", "Netherlands", "Qatar", "Singapore", "South Korea",
-            "Spain", "Thailand", "Turkey", "UAE", "UK", "USA"
-        ],
-        "to_country": [
-            "Australia", "Canada", "Egypt", "France", "Germany", "Hong Kong", "India",
-            "Italy", "Japan", "Netherlands", "Qatar", "Singapore", "South Korea",
-            "Spain", "Thailand", "Turkey", "UAE", "UK", "USA"
-        ],
-        "travel_class": ["business", "economy", "first", "premium_economy"],
-        "refundable": [False, True],
-        "baggage_included": [False, True],
-        "wifi_available": [False, True],
-        "meal_service": ["meal", "none", "premium_meal", "snack"],
-        "aircraft_type": [
-            "Airbus A320", "Airbus A330", "Airbus A350", "Airbus A380",
-            "Boeing 737", "Boeing 777", "Boeing 787"
-        ],
-        "price_ranges": {
-            "min": 300,
-            "max": 12430,
-            "suggested_ranges": [
-                {"min": 0, "max": 500, "label": "Budget (0-500 USD)"},
-                {"min": 500, "max": 1000, "label": "Economy (500-1000 USD)"},
-                {"min": 1000, "max": 2000, "label": "Mid-range (1000-2000 USD)"},
-                {"min": 2000, "max": 5000, "label": "Premium (2000-5000 USD)"},
-                {"min": 5000, "max": 12430, "label": "Luxury (5000+ USD)"}
-            ]
-        }
-    }
+# The same graph with per-session state, compiled once the checkpointer exists
+_session_app = None
 
+async def get_session_app():
+    """The workflow compiled with the session checkpointer; invoke it with the session ID as thread_id."""
+    global _session_app
+    if _session_app is None:
+        _session_app = workflow.compile(checkpointer=await get_session_checkpointer())
+    return _session_app
 
 async def run_search_and_answer(
     query: str,
-    collection_name: str
+    collection_name: str,
+    search_params: Optional[Dict[str, Any]] = None,
+    retrieval: Optional[Dict[str, Any]] = None,
+    session_id: Optional[str] = None,
+    timeout: Optional[float] = None
 ) -> Dict[str, Any]:
     """
     Run the complete search and answer generation workflow with dynamic filter generation.
@@ -673,6 +761,10 @@ async def run_search_and_answer(
     Args:
         query: The search query
         collection_name: Name of the Qdrant collection
+        search_params: Optional per-request Qdrant search parameters (hnsw_ef, oversampling, rescore, exact)
+        retrieval: Optional overrides of RETRIEVAL_DEFAULTS (k, rerank cut-offs, retrieval mode, reranker)
+        session_id: Optional search session; follow-ups narrow the previous turn's results
+        timeout: Seconds the answer is due in (default SEARCH_TIMEOUT_SECONDS); steps degrade to meet it
         
     Returns:
         Dictionary containing the answer and intermediate results
@@ -683,15 +775,32 @@ async def run_search_and_answer(
         "collection_name": collection_name,
         "query_type": "both", # Default to "both"
         "filters": {},
-        "filter_options": get_filter_options(),
+        "search_params": {k: v for k, v in (search_params or {}).items() if v is not None},
+        "retrieval": {k: v for k, v in (retrieval or {}).items() if v is not None},
         "filtered_docs": [],
         "info_docs": [], # Initialize info_docs
         "reranked_docs": [],
-        "answer": ""
+        "answer": "",
+        "refined": False,
+        "filters_applied": False,
+        "candidates_complete": False,
+        "deadline": new_deadline(timeout),
+        "degraded": [],
+        "timings": {}
     }
+    # Degradation keeps runs within the deadline; this only stops calls that ignore it
+    hard_timeout = initial_state["deadline"] - time.time() + HARD_TIMEOUT_GRACE_SECONDS
     
     try:
-        result = await app.ainvoke(initial_state)
+        if session_id:
+            # `session` is left out of the input so the checkpointed previous turn stays visible
+            session_app = await get_session_app()
+            result = await asyncio.wait_for(session_app.ainvoke(
+                initial_state, {"configurable": {"thread_id": session_id}}, durability="exit"
+            ), hard_timeout)
+        else:
+            result = await asyncio.wait_for(app.ainvoke(initial_state), hard_timeout)
+        record_request(result.get("timings", {}))
         
         # Check if the result contains an error
         if "error" in result:
@@ -704,15 +813,23 @@ async def run_search_and_answer(
             "query_type": result.get("query_type", "unknown"),
             "filters": result.get("filters", {}),
             "documents_used": len(result.get("reranked_docs", [])),
-            "reranked_docs": result.get("reranked_docs", [])
+            "reranked_docs": result.get("reranked_docs", []),
+            "retrieved_docs": result.get("filtered_docs", []) + result.get("info_docs", []),
+            "degraded": result.get("degraded", []),
+            "timings": result.get("timings", {})
         }
+    except asyncio.TimeoutError:
+        logger.error(f"Search and answer did not finish within {hard_timeout:.1f}s")
+        return {"success": False, "error": "Search timed out", "timed_out": True}
     except Exception as e:
         logger.error(f"Error in run_search_and_answer: {e}", exc_info=True)
         return {"success": False, "error": str(e)}
 
 
-png_data = app.get_graph().draw_mermaid_png()
-output_path = "graph.png"   
+if __name__ == "__main__":
+    # Regenerate the architecture diagram: python -m src.graph
+    png_data = app.get_graph().draw_mermaid_png()
+    output_path = "graph.png"
 
-with open(output_path, "wb") as f:
-    f.write(png_data)
\ No newline at end of file
+    with open(output_path, "wb") as f:
+        f.write(png_data)
\ No newline at end of file
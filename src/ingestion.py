@@ -1,15 +1,48 @@
 import os
 import json
+import glob
+import time
+import uuid
+import asyncio
 import logging
-from typing import List, Optional
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Callable, Awaitable, Tuple
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from src.client_qdrant import get_qdrant_client, initialize_vector_store, create_qdrant_collection
+from langchain_qdrant import QdrantVectorStore
+from qdrant_client.models import PointStruct, SparseVector
+from src.client_qdrant import (
+    get_qdrant_client, initialize_vector_store, create_qdrant_collection, list_collection_versions,
+    versioned_collection_name, get_alias_target, resolve_collection, swap_collection_alias, garbage_collect_versions,
+    wait_for_collection_green, load_collection_settings, delete_collection_settings, finish_bulk_load
+)
 from src.models import FileType
-from src.embeddings import get_embedding_model
+from src.embeddings import (
+    CollectionEmbedding, get_embedding_model, resolve_embedding, embedding_dimension, collection_embedding_model,
+    record_collection_embedding, register_embedding_alias, drop_collection_embedding
+)
+from src.rendering import DEFAULT_RENDER_STYLE, render_record
+from src.facets import update_facets, reset_facet_catalog, drop_facet_catalog, register_facet_alias, publish_facet_catalog
+from src.flight_index import update_flight_index, reset_flight_index, register_alias, drop_flight_index, mark_flight_index_current
+from src.metrics import INGESTED_DOCUMENTS, INGESTION_BATCH_DURATION
+from src import shared_cache
+from src.payloads import MARKDOWN_DOCUMENT, TEXT_DOCUMENT, is_flight_record, build_flight_metadata, build_json_metadata, build_chunk_metadata
 
 logger = logging.getLogger(__name__)
 
+# Number of documents embedded and upserted together; also the checkpoint granularity of ingestion jobs
+INGESTION_BATCH_SIZE = 64
+
+FILE_TYPE_EXTENSIONS = {
+    FileType.JSON: ['.json'],
+    FileType.MARKDOWN: ['.md', '.markdown'],
+    FileType.TEXT: ['.txt'],
+}
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
 text_splitter = RecursiveCharacterTextSplitter(
     chunk_size=1000,
     chunk_overlap=200,
@@ -18,60 +51,108 @@ text_splitter = RecursiveCharacterTextSplitter(
 )
 
 
-async def process_json_file(file_path: str) -> List[Document]:
+def _json_item_metadata(item: dict, file_path: str, item_index: int) -> dict:
+    if is_flight_record(item):
+        return build_flight_metadata(item, file_path, item_index)
+    return build_json_metadata(item, file_path, item_index)
+
+
+def _parse_json_file(file_path: str, render_style: str = DEFAULT_RENDER_STYLE) -> List[Document]:
+    """Parse a JSON file into one document per object (runs in the process pool)."""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+    
+    documents = []
+    
+    if isinstance(data, list):
+        for i, item in enumerate(data):
+            if isinstance(item, dict):
+                content = render_record(item, render_style)
+                
+                doc = Document(
+                    page_content=content,
+                    metadata=_json_item_metadata(item, file_path, i)
+                )
+                documents.append(doc)
+                
+    elif isinstance(data, dict):
+        content = render_record(data, render_style)
+        
+        doc = Document(
+            page_content=content,
+            metadata=_json_item_metadata(data, file_path, 0)
+        )
+        documents.append(doc)
+    else:
+        raise ValueError(f"Unsupported JSON structure in {file_path}")
+    
+    return documents
+
+
+def _chunk_text_file(file_path: str, document_type: str) -> List[Document]:
+    """Read a markdown or text file and split it into chunk documents (runs in the process pool)."""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        content = file.read()
+    
+    chunks = text_splitter.split_text(content)
+    
+    documents = []
+    for i, chunk in enumerate(chunks):
+        doc = Document(
+            page_content=chunk,
+            metadata=build_chunk_metadata(document_type, file_path, i)
+        )
+        documents.append(doc)
+    
+    return documents
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Get the process pool used for file reading and chunking, creating it on first use.
+    
+    Workers are spawned rather than forked so they don't inherit the server's threads
+    and open connections. Pool size defaults to the CPU count (INGESTION_WORKERS overrides).
+    """
+    global _process_pool
+    if _process_pool is None:
+        max_workers = int(os.getenv("INGESTION_WORKERS", "0")) or os.cpu_count()
+        _process_pool = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        logger.info(f"Started ingestion process pool with {max_workers} workers")
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    """Stop the chunking workers, if they were started."""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+        _process_pool = None
+
+
+async def _run_in_process_pool(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), func, *args)
+
+
+async def process_json_file(file_path: str, render_style: str = DEFAULT_RENDER_STYLE) -> List[Document]:
     """
     Process a JSON file by iterating through each JSON object and creating documents.
-    Each JSON object becomes a document with the JSON content as both content and metadata.
+    Each JSON object becomes a document whose content is a compact text rendering of the
+    object (see src/rendering.py) and whose metadata holds the full object.
     
     Args:
         file_path: Path to the JSON file
+        render_style: How objects are rendered into the embedded text
         
     Returns:
         List[Document]: List of documents created from JSON objects
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-        
-        documents = []
-        
-        if isinstance(data, list):
-            for i, item in enumerate(data):
-                if isinstance(item, dict):
-                    content = json.dumps(item, indent=2)
-                    
-                    metadata = item.copy()
-                    metadata.update({
-                        "source": file_path,
-                        "document_type": "json",
-                        "item_index": i,
-                        "total_items": len(data)
-                    })
-                    
-                    doc = Document(
-                        page_content=content,
-                        metadata=metadata
-                    )
-                    documents.append(doc)
-                    
-        elif isinstance(data, dict):
-            content = json.dumps(data, indent=2)
-            metadata = data.copy()
-            metadata.update({
-                "source": file_path,
-                "document_type": "json",
-                "item_index": 0,
-                "total_items": 1
-            })
-            
-            doc = Document(
-                page_content=content,
-                metadata=metadata
-            )
-            documents.append(doc)
-        else:
-            raise ValueError(f"Unsupported JSON structure in {file_path}")
-            
+        documents = await _run_in_process_pool(_parse_json_file, file_path, render_style)
         logger.info(f"Successfully processed {len(documents)} JSON objects from {file_path}")
         return documents
         
@@ -94,52 +175,7 @@ async def process_markdown_file(file_path: str) -> List[Document]:
         List[Document]: List of chunked documents from the markdown file
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-        
-        chunks = text_splitter.split_text(content)
-        
-        documents = []
-        for i, chunk in enumerate(chunks):
-            metadata = {
-                "source": file_path,
-                "document_type": "markdown",
-                "chunk_index": i,
-                "total_chunks": len(chunks),
-                "filename": os.path.basename(file_path),
-                "flight_id": "",
-                "airline": "",
-                "alliance": "",
-                "from": "",
-                "from_airport": "",
-                "from_country": "",
-                "to": "",
-                "to_airport": "",
-                "to_country": "",
-                "departure_date": "",
-                "return_date": "",
-                "travel_class": "",
-                "layovers": [],
-                "layover_duration_hours": 0,
-                "price_usd": 0,
-                "refundable": False,
-                "cancellation_fee_percent": 0,
-                "baggage_included": False,
-                "wifi_available": False,
-                "meal_service": "",
-                "flight_duration_hours": 0,
-                "aircraft_type": "",
-                "availability": 0,
-                "item_index": i,
-                "total_items": len(chunks)
-            }
-            
-            doc = Document(
-                page_content=chunk,
-                metadata=metadata
-            )
-            documents.append(doc)
-        
+        documents = await _run_in_process_pool(_chunk_text_file, file_path, MARKDOWN_DOCUMENT)
         logger.info(f"Successfully processed markdown file {file_path} into {len(documents)} chunks")
         return documents
         
@@ -159,52 +195,7 @@ async def process_text_file(file_path: str) -> List[Document]:
         List[Document]: List of chunked documents from the text file
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-        
-        chunks = text_splitter.split_text(content)
-        
-        documents = []
-        for i, chunk in enumerate(chunks):
-            metadata = {
-                "source": file_path,
-                "document_type": "text",
-                "chunk_index": i,
-                "total_chunks": len(chunks),
-                "filename": os.path.basename(file_path),
-                "flight_id": "",
-                "airline": "",
-                "alliance": "",
-                "from": "",
-                "from_airport": "",
-                "from_country": "",
-                "to": "",
-                "to_airport": "",
-                "to_country": "",
-                "departure_date": "",
-                "return_date": "",
-                "travel_class": "",
-                "layovers": [],
-                "layover_duration_hours": 0,
-                "price_usd": 0,
-                "refundable": False,
-                "cancellation_fee_percent": 0,
-                "baggage_included": False,
-                "wifi_available": False,
-                "meal_service": "",
-                "flight_duration_hours": 0,
-                "aircraft_type": "",
-                "availability": 0,
-                "item_index": i,
-                "total_items": len(chunks)
-            }
-            
-            doc = Document(
-                page_content=chunk,
-                metadata=metadata
-            )
-            documents.append(doc)
-        
+        documents = await _run_in_process_pool(_chunk_text_file, file_path, TEXT_DOCUMENT)
         logger.info(f"Successfully processed text file {file_path} into {len(documents)} chunks")
         return documents
         
@@ -213,11 +204,286 @@ async def process_text_file(file_path: str) -> List[Document]:
         raise
 
 
-async def ingest_data_to_qdrant(
+def infer_file_type(file_path: str) -> Optional[FileType]:
+    """Infer the file type from the file extension, or None if it isn't supported."""
+    file_extension = os.path.splitext(file_path)[1].lower()
+    for file_type, extensions in FILE_TYPE_EXTENSIONS.items():
+        if file_extension in extensions:
+            return file_type
+    return None
+
+
+def resolve_ingestion_sources(
+    project_root: str,
+    filenames: Optional[List[str]] = None,
+    directory: Optional[str] = None,
+    pattern: Optional[str] = None,
+    recursive: bool = False,
+    file_type: Optional[FileType] = None
+) -> List[Tuple[str, FileType]]:
+    """
+    Expand explicit filenames, a directory and/or a glob pattern into a sorted list of files.
+    
+    Relative paths are resolved against the project root. A glob pattern is resolved against
+    `directory` when one is given. When `file_type` is set, directory and glob matches of
+    other types are skipped; otherwise each file's type is inferred from its extension.
+    
+    Args:
+        project_root: Directory all files must live under
+        filenames: Explicit files to ingest
+        directory: Directory to ingest
+        pattern: Glob pattern such as "data/policies/*.md"
+        recursive: Whether to descend into subdirectories (and let "**" match them)
+        file_type: Type to enforce or filter by
+        
+    Returns:
+        List[Tuple[str, FileType]]: Absolute file paths and their types, without duplicates
+    """
+    def absolute(path: str) -> str:
+        path = path if os.path.isabs(path) else os.path.join(project_root, path)
+        path = os.path.abspath(path)
+        if os.path.commonpath([path, project_root]) != project_root:
+            raise ValueError("File path must be within the project directory")
+        return path
+    
+    sources = {}
+    
+    for filename in filenames or []:
+        file_path = absolute(filename)
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"File not found: {filename}")
+        declared_type = file_type or infer_file_type(file_path)
+        if declared_type is None:
+            raise ValueError(f"Cannot infer file type of {filename}; pass file_type")
+        if os.path.splitext(file_path)[1].lower() not in FILE_TYPE_EXTENSIONS[declared_type]:
+            raise ValueError(f"File extension {os.path.splitext(file_path)[1].lower()} doesn't match declared type {declared_type}")
+        sources[file_path] = declared_type
+    
+    matches = []
+    if directory or pattern:
+        base = absolute(directory) if directory else project_root
+        if directory and not os.path.isdir(base):
+            raise FileNotFoundError(f"Directory not found: {directory}")
+        if pattern:
+            matches = glob.glob(os.path.join(base, pattern), recursive=recursive)
+        elif recursive:
+            matches = [os.path.join(dirpath, name) for dirpath, _, names in os.walk(base) for name in names]
+        else:
+            matches = [os.path.join(base, name) for name in os.listdir(base)]
+    
+    for match in matches:
+        file_path = absolute(match)
+        if not os.path.isfile(file_path):
+            continue
+        inferred_type = infer_file_type(file_path)
+        if inferred_type is None or (file_type and inferred_type != file_type):
+            continue
+        sources.setdefault(file_path, inferred_type)
+    
+    return sorted(sources.items())
+
+
+async def load_documents(
     file_path: str,
     file_type: FileType,
+    render_style: str = DEFAULT_RENDER_STYLE
+) -> List[Document]:
+    """
+    Validate a file against its declared type and turn it into documents.
+    
+    Args:
+        file_path: Path to the file to load
+        file_type: Type of file (json, markdown or text)
+        render_style: How JSON objects are rendered into the embedded text
+        
+    Returns:
+        List[Document]: Documents generated from the file
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+    
+    file_extension = os.path.splitext(file_path)[1].lower()
+    if file_extension not in FILE_TYPE_EXTENSIONS.get(file_type, []):
+        raise ValueError(f"File extension {file_extension} doesn't match declared type {file_type}")
+    
+    if file_type == FileType.JSON:
+        return await process_json_file(file_path, render_style)
+    elif file_type == FileType.MARKDOWN:
+        return await process_markdown_file(file_path)
+    elif file_type == FileType.TEXT:
+        return await process_text_file(file_path)
+    else:
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+
+def document_point_id(source: str, index: int) -> str:
+    """
+    Build a deterministic Qdrant point ID for the document at `index` of `source`.
+    
+    Re-ingesting the same file overwrites the same points, which is what makes
+    resuming a half-finished batch safe.
+    """
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source}#{index}"))
+
+
+@dataclass
+class IngestionProgress:
+    """Counters updated by `ingest_documents` as batches move through the pipeline."""
+    files_read: int = 0
+    docs_read: int = 0
+    docs_embedded: int = 0
+    docs_upserted: int = 0
+    total_batches: int = 0
+    committed_batches: int = 0
+
+
+async def load_sources(
+    sources: List[Tuple[str, FileType]],
+    progress: Optional[IngestionProgress] = None,
+    render_style: str = DEFAULT_RENDER_STYLE
+) -> Tuple[List[Document], List[str]]:
+    """
+    Read and chunk many files concurrently in the process pool.
+    
+    Documents are returned in the order of `sources`, so batch boundaries are the
+    same every time the same source list is loaded.
+    
+    Args:
+        sources: File paths and their types
+        progress: Optional counters updated as files finish
+        render_style: How JSON objects are rendered into the embedded text
+        
+    Returns:
+        Tuple[List[Document], List[str]]: All documents and their point IDs
+    """
+    progress = progress or IngestionProgress()
+    
+    async def load(file_path: str, file_type: FileType) -> List[Document]:
+        documents = await load_documents(file_path, file_type, render_style)
+        progress.files_read += 1
+        progress.docs_read += len(documents)
+        INGESTED_DOCUMENTS.labels("read").inc(len(documents))
+        return documents
+    
+    results = await asyncio.gather(*(load(file_path, file_type) for file_path, file_type in sources))
+    
+    documents, ids = [], []
+    for (file_path, _), file_documents in zip(sources, results):
+        documents.extend(file_documents)
+        ids.extend(document_point_id(file_path, i) for i in range(len(file_documents)))
+    return documents, ids
+
+
+def embed_texts(vector_store: QdrantVectorStore, texts: List[str]) -> List[dict]:
+    """Compute the dense and sparse vectors for a batch of texts (blocking)."""
+    dense_vectors = vector_store.embeddings.embed_documents(texts)
+    sparse_vectors = vector_store.sparse_embeddings.embed_documents(texts)
+    return [
+        {
+            vector_store.vector_name: dense_vector,
+            vector_store.sparse_vector_name: SparseVector(
+                indices=sparse_vector.indices,
+                values=sparse_vector.values
+            ),
+        }
+        for dense_vector, sparse_vector in zip(dense_vectors, sparse_vectors)
+    ]
+
+
+async def ingest_documents(
+    documents: List[Document],
+    ids: List[str],
     collection_name: str,
-    embedding_model_name: str = "text-embedding-004"
+    batch_size: int = INGESTION_BATCH_SIZE,
+    start_batch: int = 0,
+    progress: Optional[IngestionProgress] = None,
+    on_batch_committed: Optional[Callable[[int], Awaitable[None]]] = None
+) -> int:
+    """
+    Embed and upsert documents into Qdrant batch by batch, with the embedding model
+    the collection was created with.
+    
+    Args:
+        documents: Documents to ingest
+        ids: Point IDs, one per document
+        collection_name: Name of the Qdrant collection
+        batch_size: Number of documents embedded and upserted together
+        start_batch: Index of the first batch to process; earlier batches are skipped
+        progress: Optional counters updated as batches are embedded and upserted
+        on_batch_committed: Optional coroutine called with the batch index once it is upserted
+        
+    Returns:
+        int: Number of documents upserted by this call
+    """
+    progress = progress or IngestionProgress()
+    progress.total_batches = (len(documents) + batch_size - 1) // batch_size
+    
+    client = get_qdrant_client()
+    embedding_model = await asyncio.to_thread(collection_embedding_model, collection_name)
+    vector_store = await initialize_vector_store(
+        client=client,
+        collection_name=collection_name,
+        embedding_model=embedding_model
+    )
+    
+    if not vector_store:
+        raise RuntimeError("Failed to initialize vector store")
+    
+    upserted = 0
+    try:
+        for batch_index in range(start_batch, progress.total_batches):
+            batch = documents[batch_index * batch_size:(batch_index + 1) * batch_size]
+            batch_ids = ids[batch_index * batch_size:(batch_index + 1) * batch_size]
+            texts = [doc.page_content for doc in batch]
+            batch_start = time.perf_counter()
+            
+            vectors = await asyncio.to_thread(embed_texts, vector_store, texts)
+            progress.docs_embedded += len(batch)
+            INGESTED_DOCUMENTS.labels("embedded").inc(len(batch))
+            
+            points = [
+                PointStruct(
+                    id=point_id,
+                    vector=vector,
+                    payload={
+                        vector_store.content_payload_key: doc.page_content,
+                        vector_store.metadata_payload_key: doc.metadata,
+                    }
+                )
+                for point_id, vector, doc in zip(batch_ids, vectors, batch)
+            ]
+            await asyncio.to_thread(
+                client.upsert,
+                collection_name=collection_name,
+                points=points,
+                wait=True
+            )
+            batch_metadata = [doc.metadata for doc in batch]
+            update_flight_index(collection_name, batch_ids, batch_metadata)
+            update_facets(collection_name, batch_ids, batch_metadata)
+            progress.docs_upserted += len(batch)
+            progress.committed_batches = batch_index + 1
+            INGESTED_DOCUMENTS.labels("upserted").inc(len(batch))
+            INGESTION_BATCH_DURATION.observe(time.perf_counter() - batch_start)
+            upserted += len(batch)
+            
+            logger.info(f"Committed batch {batch_index + 1}/{progress.total_batches} ({len(batch)} documents) to '{collection_name}'")
+            if on_batch_committed:
+                await on_batch_committed(batch_index)
+    finally:
+        if upserted:
+            # Cached answers and other workers' facet catalogs and flight indexes no longer reflect the collection
+            generation = await asyncio.to_thread(shared_cache.bump_data_generation)
+            publish_facet_catalog(collection_name, generation)
+            mark_flight_index_current(collection_name, generation)
+    
+    return upserted
+
+
+async def ingest_data_to_qdrant(
+    file_path: str,
+    file_type: FileType,
+    collection_name: str
 ) -> int:
     """
     Ingest data from a file into Qdrant vector store.
@@ -226,49 +492,24 @@ async def ingest_data_to_qdrant(
         file_path: Path to the file to ingest
         file_type: Type of file (json or markdown)
         collection_name: Name of the Qdrant collection
-        embedding_model: Name of the embedding model to use
         
     Returns:
         int: Number of documents processed and ingested
     """
     try:
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"File not found: {file_path}")
-        
-        file_extension = os.path.splitext(file_path)[1].lower()
-        if file_type == FileType.JSON and file_extension != '.json':
-            raise ValueError(f"File extension {file_extension} doesn't match declared type {file_type}")
-        if file_type == FileType.MARKDOWN and file_extension not in ['.md', '.markdown']:
-            raise ValueError(f"File extension {file_extension} doesn't match declared type {file_type}")
-        if file_type == FileType.TEXT and file_extension != '.txt':
-            raise ValueError(f"File extension {file_extension} doesn't match declared type {file_type}")
-        
-        if file_type == FileType.JSON:
-            documents = await process_json_file(file_path)
-        elif file_type == FileType.MARKDOWN:
-            documents = await process_markdown_file(file_path)
-        elif file_type == FileType.TEXT:
-            documents = await process_text_file(file_path)
-        else:
-            raise ValueError(f"Unsupported file type: {file_type}")
+        documents = await load_documents(file_path, file_type)
         
         if not documents:
             logger.warning(f"No documents generated from file: {file_path}")
             return 0
         
-        client = get_qdrant_client()
-        embedding_model = get_embedding_model(embedding_model_name)
-        vector_store = await initialize_vector_store(
-            client=client,
-            collection_name=collection_name,
-            embedding_model=embedding_model
+        ids = [document_point_id(file_path, i) for i in range(len(documents))]
+        await ingest_documents(
+            documents=documents,
+            ids=ids,
+            collection_name=collection_name
         )
         
-        if not vector_store:
-            raise RuntimeError("Failed to initialize vector store")
-        
-        await vector_store.aadd_documents(documents=documents)
-        
         logger.info(f"Successfully ingested {len(documents)} documents to collection '{collection_name}'")
         return len(documents)
         
@@ -278,68 +519,184 @@ async def ingest_data_to_qdrant(
 
 
 async def create_collection(
-    collection_name: str
+    collection_name: str,
+    promote: Optional[bool] = None,
+    embedding_backend: Optional[str] = None,
+    embedding_model: Optional[str] = None,
+    embedding_dimensions: Optional[int] = None,
+    renormalize_embeddings: bool = True,
+    **storage_options
 ) -> dict:
     """
-    Create a new Qdrant collection with vector store initialization.
-    Uses Gemini text-embedding-004 model with 768 dimensions.
+    Create a new version of a Qdrant collection with vector store initialization.
+    The vector size is taken from the embedding model (or `embedding_dimensions`), and
+    the backend, model and size are recorded for the collection so ingestion and search
+    embed with them.
+    
+    `collection_name` is a logical name served through a Qdrant alias. Every call creates
+    the physical collection `{collection_name}_v{n+1}`. The first version is made live
+    straight away; later versions, and versions created for a bulk load, are staged so
+    they can be loaded while searches keep hitting the live one, then made live with
+    `promote_collection_version`.
     
     Args:
-        collection_name: Name of the collection to create
+        collection_name: Logical name of the collection to create
+        promote: Point the alias at the new version immediately. Defaults to True only
+            when nothing is served under `collection_name` yet.
+        embedding_backend: Embedding backend (see src/embeddings.py), defaults to EMBEDDING_BACKEND
+        embedding_model: Embedding model of that backend, defaults to the backend's default
+        embedding_dimensions: Keep only this many leading components of the model's vectors
+            (Matryoshka truncation); None stores full vectors
+        renormalize_embeddings: Scale truncated vectors back to unit length
+        storage_options: HNSW, quantization and on-disk options, see `build_collection_config`,
+            plus `bulk_load` to create the collection with indexing deferred
         
     Returns:
         dict: Response indicating success or failure with details
     """
+    physical_name = collection_name
     try:
-        embedding_model_name = "text-embedding-004"
-        logger.info(f"Creating collection: {collection_name} with Gemini model: {embedding_model_name}")
+        embedding_backend, embedding_model_name = resolve_embedding(embedding_model, embedding_backend)
+        logger.info(f"Creating collection: {collection_name} with {embedding_backend} model: {embedding_model_name}")
         
-        vector_size = 768
+        dense_model = await asyncio.to_thread(
+            get_embedding_model, embedding_model_name, embedding_backend, embedding_dimensions, renormalize_embeddings
+        )
+        vector_size = await asyncio.to_thread(embedding_dimension, dense_model)
         
         client = get_qdrant_client()
-        await create_qdrant_collection(collection_name, client, vector_size)
-        logger.info(f"Successfully created Qdrant collection: {collection_name}")
+        versions = await list_collection_versions(client, collection_name)
+        version = (versions[-1] if versions else 0) + 1
+        physical_name = versioned_collection_name(collection_name, version)
+        
+        await create_qdrant_collection(physical_name, client, vector_size, **storage_options)
+        logger.info(f"Successfully created Qdrant collection: {physical_name}")
         
-        embedding_model = get_embedding_model(embedding_model_name)
+        await asyncio.to_thread(record_collection_embedding, physical_name, CollectionEmbedding(
+            embedding_backend, embedding_model_name, vector_size, embedding_dimensions, renormalize_embeddings
+        ))
         vector_store = await initialize_vector_store(
             client=client,
-            collection_name=collection_name,
-            embedding_model=embedding_model
+            collection_name=physical_name,
+            embedding_model=dense_model
         )
         
         if not vector_store:
-            try:
-                import asyncio
-                await asyncio.to_thread(client.delete_collection, collection_name)
-                logger.info(f"Cleaned up collection after vector store initialization failure: {collection_name}")
-            except Exception as cleanup_err:
-                logger.warning(f"Failed to clean up collection after error: {str(cleanup_err)}")
-            
             raise RuntimeError("Failed to initialize vector store")
         
-        logger.info(f"Successfully initialized vector store for collection: {collection_name}")
-        
+        logger.info(f"Successfully initialized vector store for collection: {physical_name}")
+        reset_flight_index(physical_name)
+        reset_facet_catalog(physical_name)
+        
+        if promote is None:
+            # Nothing is serving this name yet (neither an alias nor a legacy plain collection);
+            # a bulk-loaded version only goes live once its indexes are built
+            promote = not storage_options.get("bulk_load") and await resolve_collection(client, collection_name) is None
+        if promote:
+            await swap_collection_alias(client, collection_name, physical_name)
+            register_alias(collection_name, physical_name)
+            register_facet_alias(collection_name, physical_name)
+            await asyncio.to_thread(register_embedding_alias, collection_name, physical_name)
+            await asyncio.to_thread(shared_cache.bump_data_generation)
+            for deleted in await garbage_collect_versions(client, collection_name):
+                drop_flight_index(deleted)
+                drop_facet_catalog(deleted)
+                drop_collection_embedding(deleted)
+        
+        state = "live" if promote else f"staged; ingest into '{physical_name}' and promote version {version} to go live"
         return {
             "success": True,
             "collection_name": collection_name,
+            "physical_collection": physical_name,
+            "version": version,
+            "live": promote,
             "vector_size": vector_size,
+            "embedding_backend": embedding_backend,
             "embedding_model": embedding_model_name,
-            "message": f"Successfully created collection '{collection_name}' with Gemini embeddings (vector size {vector_size})"
+            "quantization": storage_options.get("quantization", "none"),
+            "message": f"Successfully created collection '{physical_name}' with {embedding_backend} embeddings {embedding_model_name} (vector size {vector_size}), {state}"
         }
         
     except Exception as e:
-        logger.error(f"Failed to create collection {collection_name}: {str(e)}")
+        logger.error(f"Failed to create collection {physical_name}: {str(e)}")
         
-        try:
-            client = get_qdrant_client()
-            import asyncio
-            await asyncio.to_thread(client.delete_collection, collection_name)
-            logger.info(f"Cleaned up partially created collection: {collection_name}")
-        except Exception as cleanup_err:
-            logger.warning(f"Failed to clean up collection after error: {str(cleanup_err)}")
+        # Only the new physical collection is cleaned up; the live version is never touched
+        if physical_name != collection_name:
+            try:
+                client = get_qdrant_client()
+                await asyncio.to_thread(client.delete_collection, physical_name)
+                await delete_collection_settings(client, physical_name)
+                drop_collection_embedding(physical_name)
+                logger.info(f"Cleaned up partially created collection: {physical_name}")
+            except Exception as cleanup_err:
+                logger.warning(f"Failed to clean up collection after error: {str(cleanup_err)}")
         
         return {
             "success": False,
             "error": f"Collection creation failed: {str(e)}",
             "collection_name": collection_name
         }
+
+
+async def promote_collection_version(
+    collection_name: str,
+    version: int,
+    keep_previous: int = 0
+) -> dict:
+    """
+    Make a staged version live by swapping the alias, then garbage-collect older versions.
+    The swap waits until the version's optimizer is done, so a bulk-loaded version is
+    never served before its index is built; a version still marked as bulk loading gets
+    its payload indexes and HNSW indexing first.
+    
+    Args:
+        collection_name: Logical collection (alias) name
+        version: Version to make live
+        keep_previous: Number of older versions to keep for rollback
+        
+    Returns:
+        dict: The live and previous physical collections and the deleted versions
+    """
+    client = get_qdrant_client()
+    physical_name = versioned_collection_name(collection_name, version)
+    if version not in await list_collection_versions(client, collection_name):
+        raise ValueError(f"Collection '{collection_name}' has no version {version}")
+    
+    if (await load_collection_settings(client, physical_name)).get("bulk_loading"):
+        await finish_bulk_load(client, physical_name)
+    await wait_for_collection_green(client, physical_name)
+    previous = await swap_collection_alias(client, collection_name, physical_name)
+    register_alias(collection_name, physical_name)
+    register_facet_alias(collection_name, physical_name)
+    await asyncio.to_thread(register_embedding_alias, collection_name, physical_name)
+    await asyncio.to_thread(shared_cache.bump_data_generation)
+    deleted = await garbage_collect_versions(client, collection_name, keep_previous=keep_previous)
+    for deleted_collection in deleted:
+        drop_flight_index(deleted_collection)
+        drop_facet_catalog(deleted_collection)
+        drop_collection_embedding(deleted_collection)
+    return {
+        "collection_name": collection_name,
+        "live_collection": physical_name,
+        "previous_collection": previous,
+        "deleted_collections": deleted,
+    }
+
+
+async def describe_collection_versions(collection_name: str) -> dict:
+    """List the versions of a logical collection and which one is live."""
+    client = get_qdrant_client()
+    versions = await list_collection_versions(client, collection_name)
+    live = await get_alias_target(client, collection_name)
+    return {
+        "collection_name": collection_name,
+        "live_collection": live,
+        "versions": [
+            {
+                "version": version,
+                "physical_collection": versioned_collection_name(collection_name, version),
+                "live": versioned_collection_name(collection_name, version) == live,
+            }
+            for version in versions
+        ],
+    }
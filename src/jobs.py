@@ -0,0 +1,425 @@
+import os
+import json
+import time
+import uuid
+import fcntl
+import asyncio
+import logging
+from enum import Enum
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional, Tuple
+from src.models import FileType
+from src.ingestion import (
+    IngestionProgress,
+    INGESTION_BATCH_SIZE,
+    load_sources,
+    ingest_documents,
+)
+from src.rendering import DEFAULT_RENDER_STYLE
+from src.client_qdrant import (
+    get_qdrant_client,
+    resolve_collection,
+    is_live_collection,
+    load_collection_settings,
+    begin_bulk_load,
+    finish_bulk_load,
+    restore_indexing,
+)
+
+logger = logging.getLogger(__name__)
+
+# Checkpoints live next to the logs directory so that a restarted server can resume jobs.
+# They are also how the workers of one host see each other's jobs: every lookup reads them.
+jobs_directory = "jobs"
+
+# How long a cancel waits for a job running in another worker to stop after its current batch
+REMOTE_CANCEL_WAIT_SECONDS = 30.0
+
+
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    INDEXING = "indexing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+TERMINAL_STATUSES = {JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED}
+
+
+@dataclass
+class IngestionJob:
+    """State of a background ingestion job, persisted as a checkpoint after every committed batch."""
+    job_id: str
+    sources: List[Tuple[str, FileType]]
+    filename: str
+    collection_name: str
+    render_style: str = DEFAULT_RENDER_STYLE
+    bulk_load: bool = False
+    restore_indexing_threshold: Optional[int] = None
+    batch_size: int = INGESTION_BATCH_SIZE
+    status: JobStatus = JobStatus.PENDING
+    progress: IngestionProgress = field(default_factory=IngestionProgress)
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    resumed_docs: int = 0
+
+    @property
+    def rate(self) -> float:
+        """Documents upserted per second since the job (re)started."""
+        if not self.started_at:
+            return 0.0
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return (self.progress.docs_upserted - self.resumed_docs) / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["sources"] = [[file_path, file_type.value] for file_path, file_type in self.sources]
+        data["status"] = self.status.value
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "IngestionJob":
+        data = dict(data)
+        data["sources"] = [(file_path, FileType(file_type)) for file_path, file_type in data["sources"]]
+        data["status"] = JobStatus(data["status"])
+        data["progress"] = IngestionProgress(**data.get("progress", {}))
+        return cls(**data)
+
+
+_jobs: Dict[str, IngestionJob] = {}
+_tasks: Dict[str, asyncio.Task] = {}
+# Lock files held by this process, one per job it runs; the lock says the job is alive
+_locks: Dict[str, int] = {}
+
+
+def _checkpoint_path(job_id: str) -> str:
+    return os.path.join(jobs_directory, f"{job_id}.json")
+
+
+def _lock_path(job_id: str) -> str:
+    return os.path.join(jobs_directory, f"{job_id}.lock")
+
+
+def _cancel_path(job_id: str) -> str:
+    return os.path.join(jobs_directory, f"{job_id}.cancel")
+
+
+def _acquire_lock(job_id: str) -> bool:
+    """Take the job's lock file for this process; False when another worker holds it."""
+    os.makedirs(jobs_directory, exist_ok=True)
+    fd = os.open(_lock_path(job_id), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return False
+    _locks[job_id] = fd
+    return True
+
+
+def _release_lock(job_id: str) -> None:
+    fd = _locks.pop(job_id, None)
+    if fd is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def _running_elsewhere(job_id: str) -> bool:
+    """Whether another worker process holds the job's lock, i.e. is running it."""
+    if job_id in _locks:
+        return False
+    if not _acquire_lock(job_id):
+        return True
+    _release_lock(job_id)
+    return False
+
+
+def _read_checkpoint(job_id: str) -> Optional[IngestionJob]:
+    if not job_id.isalnum():
+        return None
+    try:
+        with open(_checkpoint_path(job_id), "r", encoding="utf-8") as file:
+            return IngestionJob.from_dict(json.load(file))
+    except FileNotFoundError:
+        return None
+
+
+def _write_checkpoint(job: IngestionJob) -> None:
+    if not os.path.exists(jobs_directory):
+        os.makedirs(jobs_directory)
+    tmp_path = _checkpoint_path(job.job_id) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(job.to_dict(), file)
+    os.replace(tmp_path, _checkpoint_path(job.job_id))
+
+
+async def save_checkpoint(job: IngestionJob) -> None:
+    """Persist the job state without blocking the event loop."""
+    try:
+        await asyncio.to_thread(_write_checkpoint, job)
+    except Exception as e:
+        logger.warning(f"Failed to write checkpoint for job {job.job_id}: {str(e)}")
+
+
+def load_checkpoints() -> int:
+    """
+    Load job checkpoints left by a previous server process.
+
+    Jobs that were still pending or running when their process stopped are marked as
+    failed so they can be resumed from their last committed batch. Jobs another worker
+    is still running (it holds their lock file) are left alone.
+
+    Returns:
+        int: Number of jobs loaded
+    """
+    if not os.path.exists(jobs_directory):
+        return 0
+
+    loaded = 0
+    for entry in os.listdir(jobs_directory):
+        if not entry.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(jobs_directory, entry), "r", encoding="utf-8") as file:
+                job = IngestionJob.from_dict(json.load(file))
+        except Exception as e:
+            logger.warning(f"Skipping unreadable job checkpoint {entry}: {str(e)}")
+            continue
+
+        if job.status not in TERMINAL_STATUSES and not _running_elsewhere(job.job_id):
+            job.status = JobStatus.FAILED
+            job.error = "Interrupted by server restart"
+            _write_checkpoint(job)
+        _jobs[job.job_id] = job
+        loaded += 1
+
+    logger.info(f"Loaded {loaded} ingestion job checkpoints")
+    return loaded
+
+
+async def _run_job(job: IngestionJob) -> None:
+    """Run (or resume) an ingestion job, checkpointing after every committed batch."""
+    job.status = JobStatus.RUNNING
+    job.started_at = time.time()
+    job.finished_at = None
+    job.error = None
+    start_batch = job.progress.committed_batches
+    await save_checkpoint(job)
+    client = get_qdrant_client()
+    physical_name = job.collection_name
+
+    try:
+        # Counters restart from the last committed batch; the rate only counts this run
+        job.progress.files_read = 0
+        job.progress.docs_read = 0
+        documents, ids = await load_sources(job.sources, job.progress, job.render_style)
+        job.progress.docs_embedded = min(start_batch * job.batch_size, len(documents))
+        job.progress.docs_upserted = job.progress.docs_embedded
+        job.resumed_docs = job.progress.docs_upserted
+
+        if start_batch:
+            logger.info(f"Resuming job {job.job_id} from batch {start_batch + 1}")
+
+        physical_name = await resolve_collection(client, job.collection_name) or job.collection_name
+        if job.bulk_load and await is_live_collection(client, job.collection_name):
+            # It may have been promoted since the job was submitted
+            raise ValueError(f"Collection '{job.collection_name}' is live; bulk loads only go into staged versions")
+        # A collection created for a bulk load gets its indexes built by whichever job loads it
+        bulk_load = job.bulk_load or (await load_collection_settings(client, physical_name)).get("bulk_loading", False)
+        if bulk_load and job.restore_indexing_threshold is None:
+            job.restore_indexing_threshold = await begin_bulk_load(client, physical_name)
+            await save_checkpoint(job)
+
+        async def on_batch_committed(batch_index: int) -> None:
+            await save_checkpoint(job)
+            if os.path.exists(_cancel_path(job.job_id)):
+                # Cancelled from another worker
+                raise asyncio.CancelledError()
+
+        await ingest_documents(
+            documents=documents,
+            ids=ids,
+            collection_name=job.collection_name,
+            batch_size=job.batch_size,
+            start_batch=start_batch,
+            progress=job.progress,
+            on_batch_committed=on_batch_committed
+        )
+
+        if bulk_load:
+            job.status = JobStatus.INDEXING
+            await save_checkpoint(job)
+            await finish_bulk_load(client, physical_name, job.restore_indexing_threshold)
+            job.restore_indexing_threshold = None
+
+        job.status = JobStatus.COMPLETED
+        logger.info(f"Ingestion job {job.job_id} completed: {job.progress.docs_upserted} documents in '{job.collection_name}'")
+
+    except asyncio.CancelledError:
+        job.status = JobStatus.CANCELLED
+        logger.info(f"Ingestion job {job.job_id} cancelled after {job.progress.committed_batches} batches")
+    except Exception as e:
+        job.status = JobStatus.FAILED
+        job.error = str(e)
+        logger.error(f"Ingestion job {job.job_id} failed: {str(e)}")
+    finally:
+        if job.restore_indexing_threshold is not None:
+            # A failed or cancelled load must not leave the collection without HNSW indexing;
+            # a resumed job turns it off again
+            try:
+                await restore_indexing(client, physical_name, job.restore_indexing_threshold)
+                job.restore_indexing_threshold = None
+            except Exception as e:
+                logger.error(f"Failed to re-enable indexing on '{physical_name}' after job {job.job_id}: {str(e)}")
+        job.finished_at = time.time()
+        _tasks.pop(job.job_id, None)
+        await save_checkpoint(job)
+        # Only after the final checkpoint, so other workers never see a running job without its lock
+        _release_lock(job.job_id)
+        if os.path.exists(_cancel_path(job.job_id)):
+            os.remove(_cancel_path(job.job_id))
+
+
+def _start(job: IngestionJob) -> None:
+    _tasks[job.job_id] = asyncio.create_task(_run_job(job))
+
+
+async def submit_ingestion_job(
+    sources: List[Tuple[str, FileType]],
+    filename: str,
+    collection_name: str,
+    render_style: str = DEFAULT_RENDER_STYLE,
+    bulk_load: bool = False
+) -> IngestionJob:
+    """
+    Create an ingestion job and start it in the background.
+
+    Args:
+        sources: Absolute paths of the files to ingest and their types
+        filename: Description of the sources as given by the client
+        collection_name: Name of the Qdrant collection
+        render_style: How JSON objects are rendered into the embedded text
+        bulk_load: Disable HNSW indexing while loading, then build payload indexes concurrently,
+            re-enable indexing and wait for the optimizer before the job completes. Only
+            allowed on a staged version that searches don't read yet.
+
+    Returns:
+        IngestionJob: The newly started job
+
+    Raises:
+        ValueError: If `bulk_load` is set and the collection is live
+    """
+    if bulk_load and await is_live_collection(get_qdrant_client(), collection_name):
+        raise ValueError(
+            f"Collection '{collection_name}' is live; create a staged version with /create-collection "
+            f"and bulk load into it before promoting it"
+        )
+    job = IngestionJob(
+        job_id=uuid.uuid4().hex,
+        sources=sources,
+        filename=filename,
+        collection_name=collection_name,
+        render_style=render_style,
+        bulk_load=bulk_load
+    )
+    _jobs[job.job_id] = job
+    _acquire_lock(job.job_id)
+    await save_checkpoint(job)
+    _start(job)
+    logger.info(f"Submitted ingestion job {job.job_id} for {filename} ({len(sources)} files) into '{collection_name}'")
+    return job
+
+
+def get_job(job_id: str) -> Optional[IngestionJob]:
+    """
+    A job as last checkpointed by whichever worker runs it, or this process's own copy
+    while it runs here. A checkpoint left pending or running by a worker that no longer
+    holds the job's lock is reported as failed.
+    """
+    if job_id in _tasks:
+        return _jobs[job_id]
+    try:
+        job = _read_checkpoint(job_id)
+    except Exception as e:
+        logger.warning(f"Could not read checkpoint of job {job_id}: {str(e)}")
+        job = None
+    if job is None:
+        return _jobs.get(job_id)
+    if job.status not in TERMINAL_STATUSES and not _running_elsewhere(job_id):
+        job.status = JobStatus.FAILED
+        job.error = "Interrupted by server restart"
+    _jobs[job_id] = job
+    return job
+
+
+def list_jobs() -> List[IngestionJob]:
+    job_ids = set(_jobs)
+    if os.path.exists(jobs_directory):
+        job_ids.update(entry[:-len(".json")] for entry in os.listdir(jobs_directory) if entry.endswith(".json"))
+    jobs = [job for job in (get_job(job_id) for job_id in job_ids) if job is not None]
+    return sorted(jobs, key=lambda job: job.created_at, reverse=True)
+
+
+async def cancel_job(job_id: str) -> IngestionJob:
+    """
+    Cancel a running job. Batches already committed are kept and the job can be resumed.
+    A job running in another worker is asked to stop after its current batch; this waits
+    up to REMOTE_CANCEL_WAIT_SECONDS for it and returns the job's state either way.
+    """
+    job = get_job(job_id)
+    if job is None:
+        raise KeyError(job_id)
+    if job.status in TERMINAL_STATUSES:
+        raise ValueError(f"Job {job_id} is not running (status: {job.status.value})")
+
+    task = _tasks.get(job_id)
+    if task is None:
+        with open(_cancel_path(job_id), "w", encoding="utf-8"):
+            pass
+        deadline = time.monotonic() + REMOTE_CANCEL_WAIT_SECONDS
+        while job.status not in TERMINAL_STATUSES and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+            job = get_job(job_id)
+        return job
+
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    return job
+
+
+def resume_job(job_id: str) -> IngestionJob:
+    """
+    Restart a failed or cancelled job from its last committed batch, in this worker.
+    The job's lock file makes sure only one worker runs it.
+    """
+    if job_id in _locks:
+        job = _jobs[job_id]
+        raise ValueError(f"Only failed or cancelled jobs can be resumed (status: {job.status.value})")
+    # Unknown or malformed IDs must not leave a lock file behind
+    if get_job(job_id) is None:
+        raise KeyError(job_id)
+    if not _acquire_lock(job_id):
+        raise ValueError(f"Job {job_id} is running in another worker")
+
+    # Re-read under the lock: another worker may have resumed and finished it meanwhile
+    job = get_job(job_id)
+    if job is None:
+        _release_lock(job_id)
+        raise KeyError(job_id)
+    if job.status not in (JobStatus.FAILED, JobStatus.CANCELLED):
+        _release_lock(job_id)
+        raise ValueError(f"Only failed or cancelled jobs can be resumed (status: {job.status.value})")
+
+    if os.path.exists(_cancel_path(job_id)):
+        os.remove(_cancel_path(job_id))
+    job.status = JobStatus.PENDING
+    _start(job)
+    logger.info(f"Resuming ingestion job {job_id} from batch {job.progress.committed_batches + 1}")
+    return job
@@ -0,0 +1,160 @@
+import os
+import sys
+import json
+import uuid
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from opentelemetry import trace
+
+# Log records are formatted and written on a background thread; the event loop only enqueues them
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json or text
+LOG_FILE = os.getenv("LOG_FILE", os.path.join("logs", "app.log"))
+
+# Share of requests whose retrieved/reranked documents are logged at INFO; others log them at DEBUG
+DOCUMENT_LOG_SAMPLE_RATE = float(os.getenv("DOCUMENT_LOG_SAMPLE_RATE", "0.01"))
+
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+_documents_sampled: ContextVar[bool] = ContextVar("documents_sampled", default=False)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id", "trace_id"}
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the request ID and trace ID of the context that logged them."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        span_context = trace.get_current_span().get_span_context()
+        record.trace_id = format(span_context.trace_id, "032x") if span_context.is_valid else None
+        return True
+
+
+def _extras(record: logging.LogRecord) -> Dict[str, Any]:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request/trace IDs and `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        entry.update(_extras(record))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The previous plain-text layout, with the request ID and any `extra` fields appended."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s - %(levelname)s - %(name)s - [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        extras = _extras(record)
+        if extras:
+            text += " " + json.dumps(extras, default=str)
+        return text
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records as they are; the stdlib version formats the message on the calling thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            # Tracebacks reference frames of the calling thread; render them before handing over
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging():
+    """
+    Route all logging through a queue drained by a background thread that writes to stderr
+    and LOG_FILE. Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else TextFormatter()
+    handlers: List[logging.Handler] = [logging.StreamHandler(sys.stderr)]
+    if LOG_FILE:
+        os.makedirs(os.path.dirname(LOG_FILE) or ".", exist_ok=True)
+        handlers.append(logging.FileHandler(LOG_FILE))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    # uvicorn installs its own synchronous handlers (the access log writes on every request)
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        for handler in list(uvicorn_logger.handlers):
+            uvicorn_logger.removeHandler(handler)
+        uvicorn_logger.propagate = True
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Write out the queued records and stop the background thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def start_request(incoming_id: Optional[str] = None) -> str:
+    """Set the request ID (the caller's, or a new one) and roll the document-logging sample for this request."""
+    current = incoming_id or uuid.uuid4().hex
+    request_id.set(current)
+    _documents_sampled.set(random.random() < DOCUMENT_LOG_SAMPLE_RATE)
+    return current
+
+
+def document_log_level(logger: logging.Logger) -> Optional[int]:
+    """Level of document dumps in the current request (INFO when sampled, else DEBUG), or None if it is disabled."""
+    level = logging.INFO if _documents_sampled.get() else logging.DEBUG
+    return level if logger.isEnabledFor(level) else None
+
+
+def log_documents(logger: logging.Logger, title: str, documents: List[Any], limit: int = 3):
+    """Log the leading documents of a result list as one structured record; nothing is built when it would be dropped."""
+    level = document_log_level(logger)
+    if level is None or not documents:
+        return
+    logger.log(level, title, extra={"documents": [
+        {"content": doc.page_content[:100], "metadata": doc.metadata} for doc in documents[:limit]
+    ]})
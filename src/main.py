@@ -1,35 +1,78 @@
 import os
 import time
+import asyncio
 import logging
 import nest_asyncio
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-from src.models import DataIngestionRequest, DataIngestionResponse, CreateCollectionRequest, CreateCollectionResponse, SearchRequest, SearchResponse
-from src.ingestion import ingest_data_to_qdrant, create_collection
-from src.graph import run_search_and_answer
-
-# Create logs directory if it doesn't exist
-log_directory = "logs"
-if not os.path.exists(log_directory):
-    os.makedirs(log_directory)
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    handlers=[logging.StreamHandler(), logging.FileHandler(os.path.join(log_directory, "app.log"))],
+from contextlib import asynccontextmanager
+from typing import List
+from src.models import (
+    DataIngestionRequest, IngestionJobResponse, JobStatusResponse, CreateCollectionRequest, CreateCollectionResponse,
+    PromoteCollectionRequest, PromoteCollectionResponse, CollectionVersionsResponse, CollectionFacetsResponse, SearchRequest, SearchResponse,
+    FlightSearchRequest, FlightSearchResponse
 )
+from src.ingestion import (
+    create_collection, promote_collection_version, describe_collection_versions,
+    resolve_ingestion_sources, shutdown_process_pool
+)
+from src.jobs import IngestionJob, submit_ingestion_job, get_job, list_jobs, cancel_job, resume_job, load_checkpoints
+from src.rendering import DEFAULT_RENDER_STYLE
+from src.graph import run_search_and_answer, warm_up
+from src.timings import summarize, timing_stats
+from src.resilience import breaker_states
+from src.metrics import (
+    HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT, PROMETHEUS_MULTIPROC_DIR, render_metrics,
+    clear_multiprocess_metrics, mark_worker_dead
+)
+from src.tracing import setup_tracing, shutdown_tracing, request_span, set_span_attributes
+from src.logging_config import setup_logging, shutdown_logging, start_request, request_id
+from src.flight_search import search_flights
+from src.facets import load_facet_catalog
+from src.flight_index import FLIGHT_INDEX_ENABLED
+from src import shared_cache
+
+# Configure logging: JSON records written to stderr and logs/app.log from a background thread
+setup_logging()
 
 # Set the timezone to Karachi, Pakistan
 os.environ['TZ'] = 'Asia/Karachi'
 time.tzset()
 
 logger = logging.getLogger(__name__)
-nest_asyncio.apply()
+
+# Only needed when the app is driven from an already running event loop (e.g. a notebook); it rules out uvloop
+NEST_ASYNCIO = os.getenv("NEST_ASYNCIO", "false").lower() == "true"
+if NEST_ASYNCIO:
+    nest_asyncio.apply()
+
+# Uvicorn worker processes; each one loads models in its lifespan and shares the SQLite cache tier
+WORKERS = int(os.getenv("WORKERS", "1"))
+if WORKERS > 1 and FLIGHT_INDEX_ENABLED and not shared_cache.enabled():
+    # Without the shared data generation a worker never learns that another one changed a collection
+    raise RuntimeError("FLIGHT_INDEX_ENABLED with WORKERS > 1 needs the shared cache; set SHARED_CACHE_PATH")
+
+# Collections whose embedding models and facet catalogs each worker loads before serving
+WARMUP_COLLECTIONS = [name.strip() for name in os.getenv("WARMUP_COLLECTIONS", "").split(",") if name.strip()]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_tracing()
+    # Pick up checkpoints of ingestion jobs interrupted by a previous shutdown
+    load_checkpoints()
+    try:
+        await warm_up(WARMUP_COLLECTIONS)
+    except Exception as e:
+        logger.warning(f"Warm-up failed, models load on first use instead: {str(e)}")
+    yield
+    mark_worker_dead()
+    shutdown_process_pool()
+    shutdown_tracing()
+    shutdown_logging()
 
 #Setting up fastapi app
-app_kwargs = {"title": "JetKart"}
+app_kwargs = {"title": "JetKart", "lifespan": lifespan}
 if os.getenv("ENVIRONMENT") != "dev":
     app_kwargs["docs_url"] = None
     app_kwargs["redoc_url"] = None
@@ -44,61 +87,135 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """
+    Latency per route template (not raw path, to keep label cardinality bounded), in-flight
+    requests, and a server span continuing any trace context sent in the request headers.
+    """
+    start = time.perf_counter()
+    status = 500
+    in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(request.method)
+    in_flight.inc()
+    with request_span(f"{request.method} {request.url.path}", request.headers) as span:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            in_flight.dec()
+            route = request.scope.get("route")
+            route_path = route.path if route else "unmatched"
+            span.update_name(f"{request.method} {route_path}")
+            set_span_attributes(**{"http.method": request.method, "http.route": route_path, "http.status_code": status})
+            HTTP_REQUEST_DURATION.labels(request.method, route_path, str(status)).observe(time.perf_counter() - start)
+
+
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    """
+    Give every request an ID (the caller's X-Request-ID, or a new one), stamped on each log
+    record written while serving it and echoed in the response. Registered last, so it runs
+    outermost and the metrics/tracing middleware logs carry the ID too.
+    """
+    current_id = start_request(request.headers.get("x-request-id"))
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = current_id
+    return response
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics."""
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
+
 @app.get("/")
 async def read_root():
     return {"message": "JetKart at your service."}
 
 
-@app.post("/ingest", response_model=DataIngestionResponse)
+def _job_status_response(job: IngestionJob) -> JobStatusResponse:
+    return JobStatusResponse(
+        job_id=job.job_id,
+        status=job.status.value,
+        filename=job.filename,
+        files_total=len(job.sources),
+        files_read=job.progress.files_read,
+        collection_name=job.collection_name,
+        docs_read=job.progress.docs_read,
+        docs_embedded=job.progress.docs_embedded,
+        docs_upserted=job.progress.docs_upserted,
+        committed_batches=job.progress.committed_batches,
+        total_batches=job.progress.total_batches,
+        rate=job.rate,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        error=job.error
+    )
+
+
+@app.post("/ingest", response_model=IngestionJobResponse, status_code=202)
 async def ingest_data(request: DataIngestionRequest):
     """
-    Ingest data from a file into Qdrant vector store.
+    Start a background job that ingests data from files into Qdrant vector store.
+    
+    Files can be given as a single `filename`, a list of `filenames`, a `directory`
+    and/or a glob `pattern` (e.g. "data/policies/**/*.md" with `recursive`). When
+    `file_type` is omitted it is inferred from each file's extension.
     
     Supports JSON, Markdown, and Text files:
-    - JSON: Each JSON object becomes a document with the object as both content and metadata
+    - JSON: Each JSON object becomes a document; the object is kept in metadata and a compact
+      text rendering of it (`render_style`: natural, key_value or json) is embedded
     - Markdown: Content is chunked into smaller documents with file metadata
     - Text: Content is chunked into smaller documents with file metadata
+    
+    Files are read and chunked in a process pool and all of them feed one embedding/upsert
+    pipeline. The response carries a job ID; progress is available from `/jobs/{job_id}`.
     """
+    description = request.describe_sources()
     try:
-        logger.info(f"Starting data ingestion for file: {request.filename}, type: {request.file_type}")
+        logger.info(f"Starting data ingestion for: {description}, type: {request.file_type}")
         
-        # Validate file path (ensure it's within allowed directories)
-        if not os.path.isabs(request.filename):
-            # Convert relative path to absolute path relative to project root
-            project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            file_path = os.path.join(project_root, request.filename)
-        else:
-            file_path = request.filename
-        
-        # Basic security check - ensure file is within project directory
+        # Resolve files relative to the project root; paths outside it are rejected
         project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        if not os.path.commonpath([file_path, project_root]) == project_root:
-            raise HTTPException(
-                status_code=400,
-                detail="File path must be within the project directory"
-            )
-        
-        # Ingest the data
-        documents_processed = await ingest_data_to_qdrant(
-            file_path=file_path,
-            file_type=request.file_type,
-            collection_name=request.collection_name
+        filenames = ([request.filename] if request.filename else []) + (request.filenames or [])
+        sources = await asyncio.to_thread(
+            resolve_ingestion_sources,
+            project_root,
+            filenames=filenames,
+            directory=request.directory,
+            pattern=request.pattern,
+            recursive=request.recursive,
+            file_type=request.file_type
         )
         
-        logger.info(f"Successfully ingested {documents_processed} documents from {request.filename}")
+        if not sources:
+            raise FileNotFoundError(f"No files found for: {description}")
+        
+        job = await submit_ingestion_job(
+            sources=sources,
+            filename=description,
+            collection_name=request.collection_name,
+            render_style=request.render_style or DEFAULT_RENDER_STYLE,
+            bulk_load=request.bulk_load
+        )
         
-        return DataIngestionResponse(
+        return IngestionJobResponse(
             success=True,
-            message=f"Successfully ingested {documents_processed} documents from {request.filename}",
-            documents_processed=documents_processed,
+            message=f"Ingestion of {len(sources)} file(s) from {description} started as job {job.job_id}",
+            job_id=job.job_id,
+            status=job.status.value,
             collection_name=request.collection_name
         )
         
-    except FileNotFoundError:
-        logger.error(f"File not found: {request.filename}")
+    except FileNotFoundError as e:
+        logger.error(str(e))
         raise HTTPException(
             status_code=404,
-            detail=f"File not found: {request.filename}"
+            detail=str(e)
         )
     except ValueError as e:
         logger.error(f"Validation error: {str(e)}")
@@ -107,20 +224,69 @@ async def ingest_data(request: DataIngestionRequest):
             detail=str(e)
         )
     except Exception as e:
-        logger.error(f"Error during data ingestion: {str(e)}")
+        logger.error(f"Error starting data ingestion: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error during data ingestion: {str(e)}"
         )
 
 
+@app.get("/jobs", response_model=List[JobStatusResponse])
+async def get_ingestion_jobs():
+    """List ingestion jobs, most recent first."""
+    return [_job_status_response(job) for job in list_jobs()]
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_ingestion_job(job_id: str):
+    """
+    Report the progress of an ingestion job: documents read, embedded and upserted,
+    committed batches and the current upsert rate (documents per second).
+    """
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return _job_status_response(job)
+
+
+@app.post("/jobs/{job_id}/cancel", response_model=JobStatusResponse)
+async def cancel_ingestion_job(job_id: str):
+    """Cancel a running ingestion job. Committed batches are kept."""
+    try:
+        job = await cancel_job(job_id)
+        logger.info(f"Cancelled ingestion job {job_id}")
+        return _job_status_response(job)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.post("/jobs/{job_id}/resume", response_model=JobStatusResponse)
+async def resume_ingestion_job(job_id: str):
+    """Restart a failed or cancelled ingestion job from its last committed batch."""
+    try:
+        job = resume_job(job_id)
+        return _job_status_response(job)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
 @app.post("/create-collection", response_model=CreateCollectionResponse)
 async def create_new_collection(request: CreateCollectionRequest):
     """
     Create a new Qdrant collection with vector store initialization.
     
-    This endpoint creates a collection using Gemini text-embedding-004 model
-    with 768 dimensions.
+    This endpoint creates a collection embedded with the requested backend and model
+    (Gemini text-embedding-004 by default); the vector size follows the model unless
+    `embedding_dimensions` truncates it.
+    
+    Collections are versioned behind an alias: each call creates `{name}_v{n+1}`.
+    The first version goes live immediately; a rebuild is staged until it is
+    promoted with `/collections/{name}/promote`, so searches never see an empty
+    or half-loaded collection.
     
     Args:
         request: Collection creation parameters with collection name
@@ -131,9 +297,14 @@ async def create_new_collection(request: CreateCollectionRequest):
     try:
         logger.info(f"Creating new collection: {request.collection_name}")
         
-        # Create the collection using Gemini embeddings
         result = await create_collection(
-            collection_name=request.collection_name
+            collection_name=request.collection_name,
+            promote=request.promote,
+            embedding_backend=request.embedding_backend,
+            embedding_model=request.embedding_model,
+            embedding_dimensions=request.embedding_dimensions,
+            renormalize_embeddings=request.renormalize_embeddings,
+            **request.storage_options()
         )
         
         if result["success"]:
@@ -142,8 +313,13 @@ async def create_new_collection(request: CreateCollectionRequest):
                 success=True,
                 message=result["message"],
                 collection_name=result["collection_name"],
+                physical_collection=result["physical_collection"],
+                version=result["version"],
+                live=result["live"],
                 vector_size=result["vector_size"],
-                embedding_model=result["embedding_model"]
+                embedding_backend=result["embedding_backend"],
+                embedding_model=result["embedding_model"],
+                quantization=result["quantization"]
             )
         else:
             logger.error(f"Failed to create collection: {result.get('error', 'Unknown error')}")
@@ -170,6 +346,102 @@ async def create_new_collection(request: CreateCollectionRequest):
         )
 
 
+@app.post("/collections/{collection_name}/promote", response_model=PromoteCollectionResponse)
+async def promote_collection(collection_name: str, request: PromoteCollectionRequest):
+    """
+    Atomically point the collection alias at a staged version and garbage-collect
+    older versions (keeping `keep_previous` of them for rollback).
+    """
+    try:
+        result = await promote_collection_version(
+            collection_name=collection_name,
+            version=request.version,
+            keep_previous=request.keep_previous
+        )
+        return PromoteCollectionResponse(
+            success=True,
+            message=f"Collection '{collection_name}' now serves '{result['live_collection']}'",
+            **result
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error promoting collection {collection_name}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error during collection promotion: {str(e)}"
+        )
+
+
+@app.get("/collections/{collection_name}/versions", response_model=CollectionVersionsResponse)
+async def get_collection_versions(collection_name: str):
+    """List the physical versions of a collection and which one the alias serves."""
+    try:
+        return CollectionVersionsResponse(**await describe_collection_versions(collection_name))
+    except Exception as e:
+        logger.error(f"Error listing versions of {collection_name}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/collections/{collection_name}/facets", response_model=CollectionFacetsResponse)
+async def get_collection_facets(collection_name: str):
+    """Distinct filter values with counts and numeric ranges of the flights in a collection."""
+    try:
+        catalog = await load_facet_catalog(collection_name)
+        return CollectionFacetsResponse(collection_name=collection_name, **catalog.to_dict())
+    except Exception as e:
+        logger.error(f"Error loading facets of {collection_name}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/flights/search", response_model=FlightSearchResponse)
+async def structured_flight_search(request: FlightSearchRequest):
+    """
+    Filter, sort and page through flights without calling any model.
+
+    Answered by a single Qdrant scroll over the indexed payload fields. Pass the
+    returned `next_cursor` back as `cursor` to fetch the following page.
+
+    Args:
+        request: Filters, sort order, page size, cursor and fields to return
+
+    Returns:
+        The matching flights for this page and the cursor of the next one
+    """
+    try:
+        start_time = time.time()
+        result = await search_flights(
+            collection_name=request.collection_name,
+            filters=request.filters(),
+            sort_by=request.sort_by,
+            order=request.order,
+            limit=request.limit,
+            cursor=request.cursor,
+            fields=request.fields
+        )
+        return FlightSearchResponse(**result, took_ms=(time.time() - start_time) * 1000)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error during flight search in {request.collection_name}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/timings")
+async def get_timings():
+    """
+    Per-node latency, upstream time, token and cost aggregates of /search since start-up.
+    With several workers these are the answering worker's own, identified by `pid`; /metrics has all of them.
+    """
+    return {"pid": os.getpid(), **timing_stats()}
+
+
+@app.get("/circuit-breakers")
+async def get_circuit_breakers():
+    """State of the upstream circuit breakers of this worker, identified by `pid`, and its current hedge delays."""
+    return {"pid": os.getpid(), **breaker_states()}
+
+
 @app.post("/search", response_model=SearchResponse)
 async def search_with_langgraph(request: SearchRequest):
     """
@@ -191,18 +463,58 @@ async def search_with_langgraph(request: SearchRequest):
     """
     try:
         logger.info(f"Starting LangGraph search for query: '{request.query}' in collection: {request.collection_name}")
+        set_span_attributes(collection_name=request.collection_name, request_id=request_id.get())
         
         start_time = time.time()
+        search_params = {
+            "hnsw_ef": request.hnsw_ef,
+            "oversampling": request.oversampling,
+            "rescore": request.rescore,
+            "exact": request.exact,
+        }
+        
+        # Answers are shared by all workers until the TTL passes or any collection changes;
+        # a session's answers also depend on its earlier turns
+        answer_key = None
+        if shared_cache.enabled("answers") and not request.session_id:
+            answer_key = shared_cache.cache_key(
+                shared_cache.data_generation(), request.collection_name, " ".join(request.query.lower().split()), search_params
+            )
+            cached = await asyncio.to_thread(shared_cache.get_json, "answers", answer_key)
+            if cached is not None:
+                logger.info("Serving cached answer")
+                return SearchResponse(
+                    success=True,
+                    message="Search completed successfully",
+                    answer=cached["answer"],
+                    query_type=cached["query_type"],
+                    filters_applied=cached["filters"],
+                    documents_used=cached["documents_used"],
+                    processing_time=time.time() - start_time,
+                    timings={"nodes": {}, "total": summarize({})} if request.include_timings else None,
+                    cached=True
+                )
         
         # Run the LangGraph search workflow
         result = await run_search_and_answer(
             query=request.query,
-            collection_name=request.collection_name
+            collection_name=request.collection_name,
+            search_params=search_params,
+            session_id=request.session_id,
+            timeout=request.timeout_seconds
         )
         
         processing_time = time.time() - start_time
         
         if result.get("success", False):
+            # Degraded answers would outlive the slow patch that caused them
+            if answer_key is not None and not result.get("degraded"):
+                await asyncio.to_thread(shared_cache.put_json, "answers", answer_key, {
+                    "answer": result.get("answer", "No answer generated"),
+                    "query_type": result.get("query_type", "unknown"),
+                    "filters": result.get("filters", {}),
+                    "documents_used": result.get("documents_used", 0),
+                })
             logger.info(f"Successfully completed search in {processing_time:.2f}s")
             return SearchResponse(
                 success=True,
@@ -211,13 +523,18 @@ async def search_with_langgraph(request: SearchRequest):
                 query_type=result.get("query_type", "unknown"),
                 filters_applied=result.get("filters", {}),
                 documents_used=result.get("documents_used", 0),
-                processing_time=processing_time
+                processing_time=processing_time,
+                degraded=result.get("degraded", []),
+                timings={
+                    "nodes": result.get("timings", {}),
+                    "total": summarize(result.get("timings", {}))
+                } if request.include_timings else None
             )
         else:
             error_msg = result.get('error', 'Unknown error')
             logger.error(f"Search failed: {error_msg}")
             raise HTTPException(
-                status_code=500,
+                status_code=504 if result.get("timed_out") else 500,
                 detail=f"Search operation failed: {error_msg}"
             )
             
@@ -240,6 +557,16 @@ async def search_with_langgraph(request: SearchRequest):
 
 if __name__ == "__main__":
     try:
-        uvicorn.run(app, host="0.0.0.0", port=8000)
+        if WORKERS > 1 and not PROMETHEUS_MULTIPROC_DIR:
+            logger.warning("WORKERS > 1 without PROMETHEUS_MULTIPROC_DIR: /metrics only reports the worker that answers each scrape")
+        clear_multiprocess_metrics()
+        # Workers are separate processes that import the app themselves
+        uvicorn.run(
+            "src.main:app" if WORKERS > 1 else app,
+            host="0.0.0.0",
+            port=8000,
+            workers=WORKERS,
+            loop="asyncio" if NEST_ASYNCIO else "auto"
+        )
     except Exception as e:
         logger.exception(f"Error starting the server: {e}")
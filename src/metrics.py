@@ -0,0 +1,111 @@
+import os
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client import multiprocess
+
+# Directory where each worker process writes its metric values (prometheus_client multiprocess
+# mode); set it whenever WORKERS > 1 so /metrics aggregates all workers instead of the one that answers
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR") or None
+
+# Buckets from 5 ms to 60 s: covers in-process lookups up to slow LLM calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "jetkart_http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "jetkart_http_requests_in_flight",
+    "HTTP requests currently being served",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+GRAPH_NODE_DURATION = Histogram(
+    "jetkart_graph_node_duration_seconds",
+    "Wall time of LangGraph nodes",
+    ["node"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_DURATION = Histogram(
+    "jetkart_upstream_duration_seconds",
+    "Latency of calls to upstream services (gemini, qdrant, retrieval, reranker)",
+    ["upstream"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_ERRORS = Counter(
+    "jetkart_upstream_errors_total",
+    "Failed calls to upstream services",
+    ["upstream"],
+)
+LLM_TOKENS = Counter(
+    "jetkart_llm_tokens_total",
+    "Tokens sent to and received from chat models",
+    ["model", "direction"],
+)
+CACHE_REQUESTS = Counter(
+    "jetkart_cache_requests_total",
+    "Lookups in in-process caches by result (hit/miss)",
+    ["cache", "result"],
+)
+INGESTED_DOCUMENTS = Counter(
+    "jetkart_ingested_documents_total",
+    "Documents passing each ingestion stage",
+    ["stage"],
+)
+INGESTION_BATCH_DURATION = Histogram(
+    "jetkart_ingestion_batch_duration_seconds",
+    "Time to embed and upsert one ingestion batch",
+    buckets=LATENCY_BUCKETS,
+)
+
+QUERY_EMBEDDING_BATCH_SIZE = Histogram(
+    "jetkart_query_embedding_batch_size",
+    "Distinct queries embedded per model call",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+
+CIRCUIT_BREAKER_STATE = Gauge(
+    "jetkart_circuit_breaker_state",
+    "Circuit breaker state per upstream: 0 closed, 1 half-open, 2 open; the worst of the live workers",
+    ["upstream"],
+    multiprocess_mode="livemax",
+)
+CIRCUIT_BREAKER_TRANSITIONS = Counter(
+    "jetkart_circuit_breaker_transitions_total",
+    "Circuit breaker state changes by upstream and new state",
+    ["upstream", "state"],
+)
+HEDGED_REQUESTS = Counter(
+    "jetkart_hedged_requests_total",
+    "Duplicate upstream requests sent after the hedge delay (sent) and those that answered first (won)",
+    ["operation", "result"],
+)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def render_metrics():
+    """Exposition payload and content type for the /metrics endpoint, summed over all workers in multiprocess mode."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def clear_multiprocess_metrics():
+    """Remove the metric files of a previous server run, before the workers start."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+        for entry in os.listdir(PROMETHEUS_MULTIPROC_DIR):
+            if entry.endswith(".db"):
+                os.remove(os.path.join(PROMETHEUS_MULTIPROC_DIR, entry))
+
+
+def mark_worker_dead():
+    """Drop this worker's live gauges (in-flight requests, breaker states) from the aggregate when it exits."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
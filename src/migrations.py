@@ -0,0 +1,324 @@
+"""
+Maintenance commands for existing collections.
+
+Usage:
+    python -m src.migrations compact-payloads --collection flights [--dry-run]
+    python -m src.migrations reembed --collection flights [--style natural]
+    python -m src.migrations reproject --collection flights --dimensions 256 [--promote]
+"""
+import json
+import asyncio
+import logging
+import argparse
+from typing import Any, Dict, Optional
+from qdrant_client import QdrantClient
+from qdrant_client.models import OverwritePayloadOperation, SetPayload, PointStruct
+from src.client_qdrant import get_qdrant_client, create_filter_indexes, initialize_vector_store
+from src.embeddings import collection_embedding_model, get_collection_embedding, truncate_vectors
+from src.ingestion import embed_texts, create_collection, promote_collection_version
+from src.facets import update_facets
+from src.flight_index import update_flight_index
+from src.rendering import DEFAULT_RENDER_STYLE, RENDER_STYLES, render_record
+from src.payloads import METADATA_PAYLOAD_KEY, FLIGHT_INDEX_FIELDS, FLIGHT_DOCUMENT, JSON_DOCUMENT, compact_metadata
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_BATCH_SIZE = 256
+
+
+async def compact_collection_payloads(
+    collection_name: str,
+    client: Optional[QdrantClient] = None,
+    batch_size: int = MIGRATION_BATCH_SIZE,
+    dry_run: bool = False
+) -> Dict[str, int]:
+    """
+    Rewrite the payload of every point in a collection to the compact per-document-type schema.
+
+    Placeholder flight fields are dropped from markdown/text chunks, flights get
+    `document_type` "flight", and payload indexes are recreated on the `metadata.*`
+    paths where the fields actually live. Legacy indexes on top-level keys are removed.
+
+    Args:
+        collection_name: Name of the collection to migrate
+        client: Qdrant client, created from the environment when omitted
+        batch_size: Number of points read and rewritten per request
+        dry_run: Only count what would change
+
+    Returns:
+        Dict[str, int]: Points scanned and rewritten, and payload bytes before and after
+    """
+    client = client or get_qdrant_client()
+    stats = {"scanned": 0, "rewritten": 0, "bytes_before": 0, "bytes_after": 0}
+    offset = None
+
+    while True:
+        points, offset = await asyncio.to_thread(
+            client.scroll,
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False,
+        )
+
+        operations = []
+        for point in points:
+            payload = point.payload or {}
+            metadata = payload.get(METADATA_PAYLOAD_KEY)
+            compacted = compact_metadata(metadata)
+            stats["scanned"] += 1
+            stats["bytes_before"] += len(json.dumps(payload))
+
+            new_payload = dict(payload)
+            new_payload[METADATA_PAYLOAD_KEY] = compacted
+            stats["bytes_after"] += len(json.dumps(new_payload))
+
+            if compacted != metadata:
+                stats["rewritten"] += 1
+                operations.append(
+                    OverwritePayloadOperation(
+                        overwrite_payload=SetPayload(payload=new_payload, points=[point.id])
+                    )
+                )
+
+        if operations and not dry_run:
+            await asyncio.to_thread(
+                client.batch_update_points,
+                collection_name=collection_name,
+                update_operations=operations,
+                wait=True
+            )
+
+        logger.info(f"Compacted {stats['rewritten']}/{stats['scanned']} points in '{collection_name}'")
+        if offset is None:
+            break
+
+    if not dry_run:
+        for field_name, _ in FLIGHT_INDEX_FIELDS:
+            try:
+                await asyncio.to_thread(client.delete_payload_index, collection_name, field_name)
+            except Exception:
+                # Index did not exist at the top level
+                pass
+        await create_filter_indexes(client, collection_name)
+
+    return stats
+
+
+async def reembed_collection(
+    collection_name: str,
+    style: str = DEFAULT_RENDER_STYLE,
+    client: Optional[QdrantClient] = None,
+    batch_size: int = MIGRATION_BATCH_SIZE
+) -> Dict[str, int]:
+    """
+    Re-render structured records from their payload and replace their text and vectors.
+
+    Only flight and JSON points are touched; markdown and text chunks keep their vectors.
+    Point IDs and metadata are unchanged; vectors come from the collection's own embedding model.
+
+    Args:
+        collection_name: Name of the collection to re-embed
+        style: Render style for the new text (see src/rendering.py)
+        client: Qdrant client, created from the environment when omitted
+        batch_size: Number of points re-embedded per request
+
+    Returns:
+        Dict[str, int]: Points scanned and re-embedded, and characters of embedded text before and after
+    """
+    if style not in RENDER_STYLES:
+        raise ValueError(f"Unknown render style '{style}', expected one of {', '.join(RENDER_STYLES)}")
+
+    client = client or get_qdrant_client()
+    vector_store = await initialize_vector_store(
+        client=client,
+        collection_name=collection_name,
+        embedding_model=await asyncio.to_thread(collection_embedding_model, collection_name)
+    )
+    if not vector_store:
+        raise RuntimeError("Failed to initialize vector store")
+
+    stats = {"scanned": 0, "reembedded": 0, "chars_before": 0, "chars_after": 0}
+    offset = None
+
+    while True:
+        points, offset = await asyncio.to_thread(
+            client.scroll,
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False,
+        )
+        stats["scanned"] += len(points)
+
+        records = [
+            point for point in points
+            if (point.payload or {}).get(METADATA_PAYLOAD_KEY, {}).get("document_type") in (FLIGHT_DOCUMENT, JSON_DOCUMENT, "json")
+        ]
+        if records:
+            texts = [render_record(point.payload[METADATA_PAYLOAD_KEY], style) for point in records]
+            vectors = await asyncio.to_thread(embed_texts, vector_store, texts)
+            updated = []
+            for point, text, vector in zip(records, texts, vectors):
+                stats["chars_before"] += len(point.payload.get(vector_store.content_payload_key) or "")
+                stats["chars_after"] += len(text)
+                payload = dict(point.payload)
+                payload[vector_store.content_payload_key] = text
+                updated.append(PointStruct(id=point.id, vector=vector, payload=payload))
+
+            await asyncio.to_thread(
+                client.upsert,
+                collection_name=collection_name,
+                points=updated,
+                wait=True
+            )
+            stats["reembedded"] += len(updated)
+
+        logger.info(f"Re-embedded {stats['reembedded']}/{stats['scanned']} points in '{collection_name}'")
+        if offset is None:
+            break
+
+    return stats
+
+
+async def reproject_collection(
+    collection_name: str,
+    dimensions: int,
+    renormalize: bool = True,
+    promote: bool = False,
+    client: Optional[QdrantClient] = None,
+    batch_size: int = MIGRATION_BATCH_SIZE,
+    **storage_options
+) -> Dict[str, Any]:
+    """
+    Copy a collection into a new version with its dense vectors truncated to `dimensions`.
+
+    Truncating a stored vector gives the same direction as truncating a fresh embedding,
+    so nothing is re-embedded. Sparse vectors and payloads are copied unchanged. The new
+    version is recorded with the truncation, so ingestion and search apply it too. It is
+    staged unless `promote` is set.
+
+    Args:
+        collection_name: Logical collection (alias) to re-project
+        dimensions: Number of leading vector components to keep
+        renormalize: Scale truncated vectors back to unit length
+        promote: Make the new version live once it is loaded
+        client: Qdrant client, created from the environment when omitted
+        batch_size: Number of points copied per request
+        storage_options: HNSW, quantization and on-disk options of the new version
+
+    Returns:
+        Dict[str, Any]: The new physical collection and version, points copied and both vector sizes
+    """
+    client = client or get_qdrant_client()
+    source = get_collection_embedding(collection_name)
+    if dimensions >= source.vector_size:
+        raise ValueError(f"'{collection_name}' has {source.vector_size}-dimensional vectors; re-projection can only reduce them")
+
+    created = await create_collection(
+        collection_name,
+        promote=False,
+        embedding_backend=source.backend,
+        embedding_model=source.model,
+        embedding_dimensions=dimensions,
+        renormalize_embeddings=renormalize,
+        **storage_options
+    )
+    if not created["success"]:
+        raise RuntimeError(created["error"])
+    target = created["physical_collection"]
+
+    stats = {"collection": target, "version": created["version"], "copied": 0,
+             "dimensions_before": source.vector_size, "dimensions_after": dimensions, "live": False}
+    offset = None
+    while True:
+        points, offset = await asyncio.to_thread(
+            client.scroll,
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if points:
+            dense_vectors = truncate_vectors([point.vector[""] for point in points], dimensions, renormalize)
+            await asyncio.to_thread(
+                client.upsert,
+                collection_name=target,
+                points=[
+                    PointStruct(id=point.id, vector={**point.vector, "": dense_vector}, payload=point.payload)
+                    for point, dense_vector in zip(points, dense_vectors)
+                ],
+                wait=True
+            )
+            point_ids = [str(point.id) for point in points]
+            records = [(point.payload or {}).get(METADATA_PAYLOAD_KEY, {}) for point in points]
+            update_flight_index(target, point_ids, records)
+            update_facets(target, point_ids, records)
+            stats["copied"] += len(points)
+
+        logger.info(f"Re-projected {stats['copied']} points from '{collection_name}' into '{target}'")
+        if offset is None:
+            break
+
+    if promote:
+        await promote_collection_version(collection_name, created["version"])
+        stats["live"] = True
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JetKart collection maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compact_parser = subparsers.add_parser("compact-payloads", help="Rewrite payloads to the compact per-document-type schema")
+    compact_parser.add_argument("--collection", required=True, help="Collection to migrate")
+    compact_parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE)
+    compact_parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+
+    reembed_parser = subparsers.add_parser("reembed", help="Re-render flight/JSON records and replace their text and vectors")
+    reembed_parser.add_argument("--collection", required=True, help="Collection to re-embed")
+    reembed_parser.add_argument("--style", choices=RENDER_STYLES, default=DEFAULT_RENDER_STYLE)
+    reembed_parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE)
+
+    reproject_parser = subparsers.add_parser("reproject", help="Copy a collection into a new version with truncated (Matryoshka) vectors")
+    reproject_parser.add_argument("--collection", required=True, help="Logical collection to re-project")
+    reproject_parser.add_argument("--dimensions", type=int, required=True, help="Leading vector components to keep, e.g. 256")
+    reproject_parser.add_argument("--no-renormalize", action="store_true", help="Keep the truncated vectors as they are")
+    reproject_parser.add_argument("--quantization", choices=["none", "scalar", "binary"], default="none")
+    reproject_parser.add_argument("--promote", action="store_true", help="Make the new version live once it is loaded")
+    reproject_parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+
+    if args.command == "compact-payloads":
+        stats = asyncio.run(compact_collection_payloads(
+            args.collection,
+            batch_size=args.batch_size,
+            dry_run=args.dry_run
+        ))
+        print(json.dumps(stats, indent=2))
+    elif args.command == "reembed":
+        stats = asyncio.run(reembed_collection(
+            args.collection,
+            style=args.style,
+            batch_size=args.batch_size
+        ))
+        print(json.dumps(stats, indent=2))
+    elif args.command == "reproject":
+        stats = asyncio.run(reproject_collection(
+            args.collection,
+            args.dimensions,
+            renormalize=not args.no_renormalize,
+            promote=args.promote,
+            batch_size=args.batch_size,
+            quantization=args.quantization
+        ))
+        print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
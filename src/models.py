@@ -1,6 +1,8 @@
-from pydantic import BaseModel, validator
-from typing import Literal, Optional
+import os
+from pydantic import BaseModel, Field, validator, root_validator
+from typing import Any, Dict, List, Literal, Optional
 from enum import Enum
+from src.embeddings import EMBEDDING_BACKENDS
 
 
 class FileType(str, Enum):
@@ -10,16 +12,46 @@ class FileType(str, Enum):
 
 
 class DataIngestionRequest(BaseModel):
-    filename: str
-    file_type: FileType
+    filename: Optional[str] = None
+    filenames: Optional[List[str]] = None
+    directory: Optional[str] = None
+    pattern: Optional[str] = None
+    recursive: bool = False
+    file_type: Optional[FileType] = None
+    render_style: Optional[Literal["natural", "key_value", "json"]] = None
+    bulk_load: bool = False
     collection_name: str
     
     @validator('filename')
     def validate_filename(cls, v):
-        if not v or not v.strip():
+        if v is None:
+            return v
+        if not v.strip():
             raise ValueError('Filename cannot be empty')
         return v.strip()
     
+    @validator('filenames')
+    def validate_filenames(cls, v):
+        if v is None:
+            return v
+        if any(not name or not name.strip() for name in v):
+            raise ValueError('Filenames cannot be empty')
+        return [name.strip() for name in v]
+    
+    @root_validator(skip_on_failure=True)
+    def validate_sources(cls, values):
+        if not any(values.get(key) for key in ('filename', 'filenames', 'directory', 'pattern')):
+            raise ValueError('One of filename, filenames, directory or pattern is required')
+        return values
+    
+    def describe_sources(self) -> str:
+        """Human readable summary of what the request asks to ingest."""
+        parts = [self.filename] if self.filename else []
+        parts.extend(self.filenames or [])
+        if self.directory or self.pattern:
+            parts.append(os.path.join(self.directory or '', self.pattern or ''))
+        return ", ".join(parts)
+    
     @validator('collection_name')
     def validate_collection_name(cls, v):
         if not v or not v.strip():
@@ -34,8 +66,49 @@ class DataIngestionResponse(BaseModel):
     collection_name: str
 
 
+class IngestionJobResponse(BaseModel):
+    success: bool
+    message: str
+    job_id: str
+    status: str
+    collection_name: str
+
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    filename: str
+    files_total: int
+    files_read: int
+    collection_name: str
+    docs_read: int
+    docs_embedded: int
+    docs_upserted: int
+    committed_batches: int
+    total_batches: int
+    rate: float
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+
 class CreateCollectionRequest(BaseModel):
     collection_name: str
+    promote: Optional[bool] = None
+    bulk_load: bool = False
+    hnsw_m: Optional[int] = Field(None, ge=0)
+    hnsw_ef_construct: Optional[int] = Field(None, ge=4)
+    quantization: Literal["none", "scalar", "binary"] = "none"
+    quantization_always_ram: bool = True
+    on_disk_vectors: bool = False
+    on_disk_payload: bool = False
+    indexing_threshold: Optional[int] = Field(None, ge=0)
+    memmap_threshold: Optional[int] = Field(None, ge=0)
+    embedding_backend: Optional[str] = None
+    embedding_model: Optional[str] = None
+    embedding_dimensions: Optional[int] = Field(None, ge=1)
+    renormalize_embeddings: bool = True
     
     @validator('collection_name')
     def validate_collection_name(cls, v):
@@ -46,19 +119,88 @@ class CreateCollectionRequest(BaseModel):
         if not clean_name.replace('_', '').isalnum():
             raise ValueError('Collection name must contain only alphanumeric characters, spaces, hyphens, or underscores')
         return clean_name
+    
+    @validator('embedding_backend')
+    def validate_embedding_backend(cls, v):
+        if v is not None and v not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Embedding backend must be one of: {', '.join(EMBEDDING_BACKENDS)}")
+        return v
+    
+    @root_validator(skip_on_failure=True)
+    def validate_bulk_load(cls, values):
+        if values.get('bulk_load') and values.get('promote'):
+            raise ValueError('A bulk-loaded version is staged until it is indexed; promote it once loaded')
+        return values
+    
+    def storage_options(self) -> dict:
+        """Collection storage options, as accepted by `create_qdrant_collection`."""
+        return self.dict(exclude={
+            'collection_name', 'promote', 'embedding_backend', 'embedding_model', 'embedding_dimensions', 'renormalize_embeddings'
+        })
 
 
 class CreateCollectionResponse(BaseModel):
     success: bool
     message: str
     collection_name: str
+    physical_collection: str
+    version: int
+    live: bool
     vector_size: int
+    embedding_backend: str
     embedding_model: str
+    quantization: str = "none"
+
+
+class PromoteCollectionRequest(BaseModel):
+    version: int = Field(..., ge=1)
+    keep_previous: int = Field(0, ge=0)
+
+
+class PromoteCollectionResponse(BaseModel):
+    success: bool
+    message: str
+    collection_name: str
+    live_collection: str
+    previous_collection: Optional[str] = None
+    deleted_collections: List[str] = []
+
+
+class CollectionVersion(BaseModel):
+    version: int
+    physical_collection: str
+    live: bool
+
+
+class CollectionVersionsResponse(BaseModel):
+    collection_name: str
+    live_collection: Optional[str] = None
+    versions: List[CollectionVersion]
+
+
+class FacetValue(BaseModel):
+    value: Any
+    count: int
+
+
+class CollectionFacetsResponse(BaseModel):
+    collection_name: str
+    version: int
+    total: int
+    values: Dict[str, List[FacetValue]]
+    ranges: Dict[str, Dict[str, float]]
 
 
 class SearchRequest(BaseModel):
     query: str
     collection_name: str
+    hnsw_ef: Optional[int] = Field(None, ge=1)
+    oversampling: Optional[float] = Field(None, ge=1.0)
+    rescore: Optional[bool] = None
+    exact: bool = False
+    include_timings: bool = False
+    session_id: Optional[str] = Field(None, max_length=128)
+    timeout_seconds: Optional[float] = Field(None, gt=0, le=300)
     
     @validator('query')
     def validate_query(cls, v):
@@ -71,6 +213,12 @@ class SearchRequest(BaseModel):
         if not v or not v.strip():
             raise ValueError('Collection name cannot be empty')
         return v.strip()
+    
+    @validator('session_id')
+    def validate_session_id(cls, v):
+        if v is None:
+            return v
+        return v.strip() or None
 
 
 class SearchResponse(BaseModel):
@@ -80,4 +228,43 @@ class SearchResponse(BaseModel):
     query_type: str
     filters_applied: Optional[dict] = None
     documents_used: int
-    processing_time: float
\ No newline at end of file
+    processing_time: float
+    timings: Optional[Dict[str, Any]] = None
+    cached: bool = False
+    degraded: List[str] = []
+
+class FlightSearchRequest(BaseModel):
+    collection_name: str
+    airline: Optional[str] = None
+    alliance: Optional[str] = None
+    from_country: Optional[str] = None
+    to_country: Optional[str] = None
+    travel_class: Optional[str] = None
+    refundable: Optional[bool] = None
+    baggage_included: Optional[bool] = None
+    wifi_available: Optional[bool] = None
+    meal_service: Optional[str] = None
+    aircraft_type: Optional[str] = None
+    min_price: Optional[int] = Field(None, ge=0)
+    max_price: Optional[int] = Field(None, ge=0)
+    sort_by: Optional[Literal["price_usd", "flight_duration_hours", "departure_date"]] = None
+    order: Literal["asc", "desc"] = "asc"
+    limit: int = Field(20, ge=1, le=500)
+    cursor: Optional[str] = None
+    fields: Optional[List[str]] = None
+
+    @validator('collection_name')
+    def validate_collection_name(cls, v):
+        if not v or not v.strip():
+            raise ValueError('Collection name cannot be empty')
+        return v.strip()
+
+    def filters(self) -> dict:
+        """The filter fields of the request, in the format used by src/filters.py."""
+        return self.dict(exclude={"collection_name", "sort_by", "order", "limit", "cursor", "fields"}, exclude_none=True)
+
+
+class FlightSearchResponse(BaseModel):
+    flights: List[dict]
+    next_cursor: Optional[str] = None
+    took_ms: float
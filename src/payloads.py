@@ -0,0 +1,124 @@
+from typing import Any, Dict, Optional
+
+# Key under which langchain_qdrant stores document metadata in the point payload
+METADATA_PAYLOAD_KEY = "metadata"
+
+# Values of the `document_type` discriminator
+FLIGHT_DOCUMENT = "flight"
+JSON_DOCUMENT = "json"
+MARKDOWN_DOCUMENT = "markdown"
+TEXT_DOCUMENT = "text"
+CHUNK_DOCUMENT_TYPES = (MARKDOWN_DOCUMENT, TEXT_DOCUMENT)
+
+# Metadata added at ingestion time that is not part of the record itself
+PROVENANCE_FIELDS = ("source", "document_type", "item_index")
+
+# Fields of a flight record, in the order they appear in data/flights.json
+FLIGHT_FIELDS = [
+    "flight_id", "airline", "alliance",
+    "from", "from_airport", "from_country",
+    "to", "to_airport", "to_country",
+    "departure_date", "return_date", "travel_class",
+    "layovers", "layover_duration_hours", "price_usd",
+    "refundable", "cancellation_fee_percent", "baggage_included",
+    "wifi_available", "meal_service", "flight_duration_hours",
+    "aircraft_type", "availability",
+]
+
+# Payload indexes used for filtering and sorting flights, as (field, schema) pairs
+FLIGHT_INDEX_FIELDS = [
+    ("document_type", "keyword"),
+    ("airline", "keyword"),
+    ("alliance", "keyword"),
+    ("from_country", "keyword"),
+    ("to_country", "keyword"),
+    ("travel_class", "keyword"),
+    ("price_usd", "integer"),
+    ("refundable", "bool"),
+    ("baggage_included", "bool"),
+    ("wifi_available", "bool"),
+    ("meal_service", "keyword"),
+    ("aircraft_type", "keyword"),
+    ("flight_duration_hours", "float"),
+    ("departure_date", "datetime"),
+]
+
+
+def payload_key(field: str) -> str:
+    """Full payload path of a metadata field, as used by filters and payload indexes."""
+    return f"{METADATA_PAYLOAD_KEY}.{field}"
+
+
+def is_flight_record(item: Dict[str, Any]) -> bool:
+    return "flight_id" in item
+
+
+def build_flight_metadata(item: Dict[str, Any], source: str, item_index: int) -> Dict[str, Any]:
+    """
+    Metadata of a flight document: the flight record itself plus its provenance.
+
+    Args:
+        item: Flight record
+        source: File the record was read from
+        item_index: Position of the record in the file
+
+    Returns:
+        Dict[str, Any]: Metadata with `document_type` "flight"
+    """
+    metadata = {key: value for key, value in item.items() if value is not None}
+    metadata.update({
+        "source": source,
+        "document_type": FLIGHT_DOCUMENT,
+        "item_index": item_index,
+    })
+    return metadata
+
+
+def build_json_metadata(item: Dict[str, Any], source: str, item_index: int) -> Dict[str, Any]:
+    """Metadata of a non-flight JSON object: its own fields plus its provenance."""
+    metadata = {key: value for key, value in item.items() if value is not None}
+    metadata.update({
+        "source": source,
+        "document_type": JSON_DOCUMENT,
+        "item_index": item_index,
+    })
+    return metadata
+
+
+def build_chunk_metadata(document_type: str, source: str, chunk_index: int) -> Dict[str, Any]:
+    """Metadata of a markdown or text chunk. No flight fields are stored on chunks."""
+    return {
+        "source": source,
+        "document_type": document_type,
+        "chunk_index": chunk_index,
+    }
+
+
+def compact_metadata(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Convert metadata written by older ingestion code to the compact schema.
+
+    Older chunks carried empty placeholders for every flight field and flights
+    carried `document_type` "json" plus a `total_items` counter.
+
+    Args:
+        metadata: Stored metadata of a point
+
+    Returns:
+        Dict[str, Any]: Metadata in the compact schema for its document type
+    """
+    metadata = metadata or {}
+    document_type = metadata.get("document_type")
+
+    if document_type in CHUNK_DOCUMENT_TYPES:
+        chunk_index = metadata.get("chunk_index", metadata.get("item_index", 0))
+        return build_chunk_metadata(document_type, metadata.get("source", ""), chunk_index)
+
+    item = {
+        key: value for key, value in metadata.items()
+        if key not in PROVENANCE_FIELDS and key != "total_items"
+    }
+    if is_flight_record(item):
+        return build_flight_metadata(item, metadata.get("source", ""), metadata.get("item_index", 0))
+    return build_json_metadata(item, metadata.get("source", ""), metadata.get("item_index", 0))
+
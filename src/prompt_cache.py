@@ -0,0 +1,136 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from src.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# How static system prompts are reused across requests:
+#   gemini - registered once with Gemini context caching; requests send only the user suffix
+#            and reference the cache through `cached_content`
+#   local  - rendered once and kept in process, sent first and byte-identical on every request
+#            so the provider's implicit prefix caching can apply
+#   off    - rebuilt for every request
+PROMPT_CACHE_MODE = os.getenv("PROMPT_CACHE", "local")
+PROMPT_CACHE_TTL_SECONDS = int(os.getenv("PROMPT_CACHE_TTL_SECONDS", "3600"))
+
+# Provider caches are recreated this long before they expire
+REFRESH_MARGIN_SECONDS = 60
+
+# After a failed cache creation the prompt is sent inline for this long before retrying
+RETRY_AFTER_SECONDS = 300
+
+# Local prefix store: prompt name -> (prompt hash, system message)
+_prefixes: Dict[str, Tuple[str, SystemMessage]] = {}
+
+# Provider caches: prompt hash -> (cache name, expiry timestamp); prompt name -> current hash
+_provider_caches: Dict[str, Tuple[str, float]] = {}
+_active: Dict[str, str] = {}
+_unsupported: Dict[str, float] = {}
+_locks: Dict[str, asyncio.Lock] = {}
+_cache_client = None
+
+
+def _prompt_hash(model: str, system_prompt: str) -> str:
+    return hashlib.sha256(f"{model}\n{system_prompt}".encode()).hexdigest()
+
+
+def _local_prefix(name: str, key: str, system_prompt: str) -> SystemMessage:
+    stored = _prefixes.get(name)
+    record_cache("prompt_prefix", stored is not None and stored[0] == key)
+    if stored is None or stored[0] != key:
+        stored = (key, SystemMessage(content=system_prompt))
+        _prefixes[name] = stored
+    return stored[1]
+
+
+def _get_cache_client():
+    global _cache_client
+    if _cache_client is None:
+        from google.ai.generativelanguage_v1beta import CacheServiceAsyncClient
+        _cache_client = CacheServiceAsyncClient(client_options={"api_key": os.getenv("GOOGLE_API_KEY")})
+    return _cache_client
+
+
+async def _delete_provider_cache(cache_name: str):
+    try:
+        await _get_cache_client().delete_cached_content(name=cache_name)
+    except Exception as e:
+        logger.warning(f"Could not delete context cache {cache_name}: {e}")
+
+
+async def _provider_cache(name: str, key: str, model: str, system_prompt: str) -> Optional[str]:
+    """Name of a live Gemini context cache holding `system_prompt`, creating it if needed."""
+    cached = _provider_caches.get(key)
+    fresh = bool(cached) and cached[1] - REFRESH_MARGIN_SECONDS > time.time()
+    record_cache("gemini_context_cache", fresh)
+    if fresh:
+        return cached[0]
+
+    lock = _locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        cached = _provider_caches.get(key)
+        if cached and cached[1] - REFRESH_MARGIN_SECONDS > time.time():
+            return cached[0]
+
+        from google.ai.generativelanguage_v1beta.types import CachedContent, Content, Part
+        from google.protobuf.duration_pb2 import Duration
+
+        cache = await _get_cache_client().create_cached_content(
+            cached_content=CachedContent(
+                model=model if model.startswith("models/") else f"models/{model}",
+                display_name=f"jetkart-{name}",
+                system_instruction=Content(parts=[Part(text=system_prompt)]),
+                ttl=Duration(seconds=PROMPT_CACHE_TTL_SECONDS),
+            )
+        )
+        _provider_caches[key] = (cache.name, time.time() + PROMPT_CACHE_TTL_SECONDS)
+        logger.info(f"Created context cache {cache.name} for prompt '{name}'")
+
+    # The prompt changed (e.g. new facet catalog version): the previous cache is no longer used
+    previous = _active.get(name)
+    _active[name] = key
+    if previous and previous != key and previous in _provider_caches:
+        stale_name, _ = _provider_caches.pop(previous)
+        asyncio.ensure_future(_delete_provider_cache(stale_name))
+    return cache.name
+
+
+async def prompt_messages(
+    name: str,
+    system_prompt: str,
+    user_prompt: str,
+    model: str
+) -> Tuple[List[BaseMessage], Dict[str, Any]]:
+    """
+    Messages and model kwargs for a call made of a static system prompt and a per-request suffix.
+
+    Args:
+        name: Name of the prompt, e.g. "classify_query"
+        system_prompt: Static instructions, identical across requests
+        user_prompt: Request-specific part
+        model: Gemini model the prompt is sent to
+
+    Returns:
+        Tuple[List[BaseMessage], Dict[str, Any]]: Messages to send, and kwargs for
+        `invoke` (`cached_content` when the prefix lives in a Gemini context cache)
+    """
+    if PROMPT_CACHE_MODE == "off":
+        return [SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)], {}
+
+    key = _prompt_hash(model, system_prompt)
+    if PROMPT_CACHE_MODE == "gemini" and _unsupported.get(key, 0) <= time.time():
+        try:
+            cache_name = await _provider_cache(name, key, model, system_prompt)
+            return [HumanMessage(content=user_prompt)], {"cached_content": cache_name}
+        except Exception as e:
+            # Typically a prompt below the provider's minimum cacheable size, which will not
+            # change until the prompt does, or a transient API error
+            logger.warning(f"Context caching unavailable for prompt '{name}', sending it inline: {e}")
+            _unsupported[key] = time.time() + RETRY_AFTER_SECONDS
+
+    return [_local_prefix(name, key, system_prompt), HumanMessage(content=user_prompt)], {}
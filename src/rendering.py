@@ -0,0 +1,128 @@
+import os
+import json
+from typing import Any, Dict
+from src.payloads import PROVENANCE_FIELDS, is_flight_record
+
+# How structured records are turned into the text that gets embedded:
+#   natural   - a short English description ("Emirates business class flight FL1 from ...")
+#   key_value - one "field: value" pair per field, separated by " | "
+#   json      - the indented JSON dump used before renderers existed
+RENDER_STYLES = ("natural", "key_value", "json")
+DEFAULT_RENDER_STYLE = os.getenv("RECORD_RENDER_STYLE", "natural")
+
+
+def _date(value: Any) -> str:
+    """Trim ISO timestamps to minutes: 2025-12-31T03:50:31.260656 -> 2025-12-31 03:50."""
+    text = str(value)
+    return text[:16].replace("T", " ") if len(text) >= 16 and text[10:11] == "T" else text
+
+
+def _hours(value: Any) -> str:
+    return f"{value:g} h" if isinstance(value, (int, float)) else f"{value} h"
+
+
+def _layover(layover: Any) -> str:
+    """Frankfurt (FRA, 0.5 h) for a layover dict, the value itself otherwise."""
+    if not isinstance(layover, dict):
+        return str(layover)
+    details = [str(layover["airport"])] if layover.get("airport") else []
+    if layover.get("duration_hours") is not None:
+        details.append(_hours(layover["duration_hours"]))
+    name = str(layover.get("city") or layover.get("airport") or "")
+    return f"{name} ({', '.join(details)})" if details else name
+
+
+def _scalar(key: str, value: Any) -> str:
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    if isinstance(value, list):
+        return ", ".join(_layover(item) for item in value) if value else "none"
+    if isinstance(value, dict):
+        return " ".join(f"{k}={v}" for k, v in value.items())
+    if key.endswith("_date"):
+        return _date(value)
+    return str(value)
+
+
+def render_key_value(record: Dict[str, Any]) -> str:
+    """Render any record as "field: value | field: value"."""
+    return " | ".join(
+        f"{key.replace('_', ' ')}: {_scalar(key, value)}"
+        for key, value in record.items()
+        if value is not None and value != ""
+    )
+
+
+def render_flight_natural(flight: Dict[str, Any]) -> str:
+    """Render a flight record as a few short English sentences covering every field."""
+    get = flight.get
+    travel_class = str(get("travel_class", "")).replace("_", " ")
+    alliance = f" ({get('alliance')})" if get("alliance") else ""
+
+    sentences = [
+        f"{get('airline', 'Unknown airline')}{alliance} {travel_class} class flight {get('flight_id', '')} "
+        f"from {get('from', '')} ({get('from_airport', '')}), {get('from_country', '')} "
+        f"to {get('to', '')} ({get('to_airport', '')}), {get('to_country', '')}."
+    ]
+
+    if get("departure_date"):
+        dates = f"Departs {_date(get('departure_date'))}"
+        if get("return_date"):
+            dates += f", returns {_date(get('return_date'))}"
+        sentences.append(dates + ".")
+
+    layovers = get("layovers") or []
+    if layovers:
+        stops = f"{len(layovers)} layover{'s' if len(layovers) > 1 else ''} via {', '.join(map(_layover, layovers))}"
+        if get("layover_duration_hours") and len(layovers) > 1:
+            stops += f", {_hours(get('layover_duration_hours'))} in total"
+        sentences.append(stops + ".")
+    else:
+        sentences.append("Nonstop.")
+
+    if get("flight_duration_hours") is not None or get("aircraft_type"):
+        sentences.append(f"Duration {_hours(get('flight_duration_hours'))} on {get('aircraft_type', 'unknown aircraft')}.")
+
+    if get("price_usd") is not None:
+        refund = "refundable" if get("refundable") else "non-refundable"
+        if get("cancellation_fee_percent") is not None:
+            refund += f", {get('cancellation_fee_percent')}% cancellation fee"
+        sentences.append(f"Price {get('price_usd')} USD, {refund}.")
+
+    extras = [
+        "baggage included" if get("baggage_included") else "no baggage included",
+        "wifi" if get("wifi_available") else "no wifi",
+        f"meal service: {str(get('meal_service', 'none')).replace('_', ' ')}",
+    ]
+    sentences.append(", ".join(extras).capitalize() + ".")
+
+    if get("availability") is not None:
+        sentences.append(f"{get('availability')} seats available.")
+
+    return " ".join(sentences)
+
+
+def render_record(record: Dict[str, Any], style: str = DEFAULT_RENDER_STYLE) -> str:
+    """
+    Turn a structured record into the text that is embedded for it.
+
+    Flights get a natural-language description in the "natural" style; other
+    records fall back to key/value text. Provenance fields are never rendered.
+
+    Args:
+        record: Record (or document metadata) to render
+        style: One of RENDER_STYLES
+
+    Returns:
+        str: Text to embed
+    """
+    if style not in RENDER_STYLES:
+        raise ValueError(f"Unknown render style '{style}', expected one of {', '.join(RENDER_STYLES)}")
+
+    record = {key: value for key, value in record.items() if key not in PROVENANCE_FIELDS}
+
+    if style == "json":
+        return json.dumps(record, indent=2)
+    if style == "natural" and is_flight_record(record):
+        return render_flight_natural(record)
+    return render_key_value(record)
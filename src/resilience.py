@@ -0,0 +1,303 @@
+"""
+Circuit breakers and hedged requests for the upstreams of the search path.
+
+Calls go through `call_upstream` (from async code) or `call_upstream_sync` (from worker
+threads such as the query embedding batcher). Both run the blocking call in a thread:
+
+- Each upstream (gemini, reranker, embeddings) has a circuit breaker. After
+  BREAKER_FAILURE_THRESHOLD consecutive errors or timeouts it opens, and calls fail
+  at once with CircuitOpenError so callers take their fallback straight away. After
+  BREAKER_RESET_SECONDS one probe call is let through; its outcome closes the breaker
+  or opens it again.
+- Idempotent calls can be hedged: when the first attempt hasn't answered within the
+  recent p95 latency of the operation, a duplicate is sent and the first reply wins.
+  The slower attempt keeps running in its thread and its result is discarded.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict
+from src.metrics import CIRCUIT_BREAKER_STATE, CIRCUIT_BREAKER_TRANSITIONS, HEDGED_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+# Longest wait for one upstream call, hedges included; slower calls count as failures
+UPSTREAM_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_TIMEOUT_SECONDS", "30"))
+
+HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "true").lower() == "true"
+HEDGE_QUANTILE = 0.95
+# Hedge delay until an operation has HEDGE_MIN_SAMPLES latencies, and the floor after that
+HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("HEDGE_DEFAULT_DELAY_SECONDS", "2.0"))
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "0.05"))
+HEDGE_MIN_SAMPLES = 20
+HEDGE_WINDOW = 200
+
+# Threads running synchronous upstream calls and their hedges
+UPSTREAM_POOL_SIZE = 32
+
+STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class CircuitOpenError(Exception):
+    """The upstream's circuit breaker is open; the call was not made."""
+
+    def __init__(self, upstream: str):
+        super().__init__(f"Circuit breaker for '{upstream}' is open")
+        self.upstream = upstream
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker: closed -> open after `failure_threshold` failures
+    in a row; open -> half_open once `reset_timeout` has passed, letting a single probe
+    through; the probe's success closes it and its failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self._lock = threading.Lock()
+        CIRCUIT_BREAKER_STATE.labels(name).set(STATE_VALUES["closed"])
+
+    def _transition(self, state: str):
+        if state != self.state:
+            logger.warning(f"Circuit breaker '{self.name}': {self.state} -> {state}")
+            self.state = state
+            CIRCUIT_BREAKER_STATE.labels(self.name).set(STATE_VALUES[state])
+            CIRCUIT_BREAKER_TRANSITIONS.labels(self.name, state).inc()
+
+    def _due_for_probe(self) -> bool:
+        return time.monotonic() - self.opened_at >= self.reset_timeout
+
+    def available(self) -> bool:
+        """Whether a call would be let through now; unlike `before_call`, doesn't claim the probe."""
+        with self._lock:
+            if self.state == "open":
+                return self._due_for_probe()
+            return not (self.state == "half_open" and self.probing)
+
+    def before_call(self):
+        """
+        Let a call through or refuse it.
+
+        Raises:
+            CircuitOpenError: While open, or while another call is probing
+        """
+        with self._lock:
+            if self.state == "open":
+                if not self._due_for_probe():
+                    raise CircuitOpenError(self.name)
+                self._transition("half_open")
+            if self.state == "half_open":
+                if self.probing:
+                    raise CircuitOpenError(self.name)
+                self.probing = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.probing = False
+            self._transition("closed")
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.probing = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._transition("open")
+
+    def release(self):
+        """Forget a call that was cancelled by its caller before the upstream answered."""
+        with self._lock:
+            self.probing = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = self.reset_timeout - (time.monotonic() - self.opened_at) if self.state == "open" else None
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "retry_in_seconds": round(max(retry_in, 0.0), 3) if retry_in is not None else None,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+_latencies: Dict[str, Deque[float]] = {}
+_latencies_lock = threading.Lock()
+
+_pool = ThreadPoolExecutor(max_workers=UPSTREAM_POOL_SIZE, thread_name_prefix="upstream")
+
+
+def get_breaker(upstream: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if upstream not in _breakers:
+            _breakers[upstream] = CircuitBreaker(upstream)
+        return _breakers[upstream]
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    """State of every circuit breaker used so far, with each operation's current hedge delay."""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {
+        "breakers": {name: breaker.snapshot() for name, breaker in sorted(breakers.items())},
+        "hedge_delays_seconds": {operation: round(hedge_delay(operation), 3) for operation in sorted(list(_latencies))},
+    }
+
+
+def _record_latency(operation: str, seconds: float):
+    with _latencies_lock:
+        _latencies.setdefault(operation, deque(maxlen=HEDGE_WINDOW)).append(seconds)
+
+
+def hedge_delay(operation: str) -> float:
+    """How long the first attempt of `operation` gets before a duplicate is sent: its recent p95 latency."""
+    with _latencies_lock:
+        samples = sorted(_latencies.get(operation, ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY_SECONDS
+    return max(samples[min(int(len(samples) * HEDGE_QUANTILE), len(samples) - 1)], HEDGE_MIN_DELAY_SECONDS)
+
+
+def _timed(operation: str, call: Callable[[], Any]) -> Callable[[], Any]:
+    """`call`, recording its own latency when it succeeds."""
+    def attempt():
+        start = time.perf_counter()
+        result = call()
+        _record_latency(operation, time.perf_counter() - start)
+        return result
+    return attempt
+
+
+def _consume_result(task: asyncio.Future):
+    # Losing attempts may fail after the winner returned; don't log them as unretrieved
+    if not task.cancelled():
+        task.exception()
+
+
+async def _hedged(operation: str, call: Callable[[], Any]) -> Any:
+    start = time.monotonic()
+    first = asyncio.ensure_future(asyncio.to_thread(call))
+    first.add_done_callback(_consume_result)
+    pending = {first}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=min(hedge_delay(operation), UPSTREAM_TIMEOUT_SECONDS))
+        if done:
+            return first.result()
+
+        HEDGED_REQUESTS.labels(operation, "sent").inc()
+        second = asyncio.ensure_future(asyncio.to_thread(call))
+        second.add_done_callback(_consume_result)
+        pending = {first, second}
+        error = None
+        while pending:
+            timeout = UPSTREAM_TIMEOUT_SECONDS - (time.monotonic() - start)
+            done, pending = await asyncio.wait(pending, timeout=max(timeout, 0), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                raise asyncio.TimeoutError()
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        HEDGED_REQUESTS.labels(operation, "won").inc()
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def call_upstream(upstream: str, operation: str, call: Callable[[], Any], hedge: bool = False) -> Any:
+    """
+    Run the blocking `call` in a thread through the upstream's circuit breaker.
+
+    Args:
+        upstream: Circuit breaker to go through (gemini, reranker, embeddings)
+        operation: Name the hedge delay is learnt under, e.g. the graph node
+        call: The upstream call; must be idempotent when `hedge` is set
+        hedge: Send a duplicate when the first attempt is slower than the operation's p95
+
+    Returns:
+        The result of the first attempt to succeed
+
+    Raises:
+        CircuitOpenError: The breaker is open; the upstream was not called
+        asyncio.TimeoutError: No attempt answered within UPSTREAM_TIMEOUT_SECONDS
+    """
+    breaker = get_breaker(upstream)
+    breaker.before_call()
+    try:
+        if hedge and HEDGING_ENABLED:
+            result = await _hedged(operation, _timed(operation, call))
+        else:
+            result = await asyncio.wait_for(asyncio.to_thread(_timed(operation, call)), UPSTREAM_TIMEOUT_SECONDS)
+    except asyncio.CancelledError:
+        # The caller gave up (e.g. its deadline passed); that says nothing about the upstream
+        breaker.release()
+        raise
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    return result
+
+
+def _hedged_sync(operation: str, call: Callable[[], Any]) -> Any:
+    start = time.monotonic()
+    first = _pool.submit(call)
+    done, _ = wait([first], timeout=min(hedge_delay(operation), UPSTREAM_TIMEOUT_SECONDS))
+    if done:
+        return first.result()
+
+    HEDGED_REQUESTS.labels(operation, "sent").inc()
+    second = _pool.submit(call)
+    pending = {first, second}
+    error = None
+    while pending:
+        timeout = UPSTREAM_TIMEOUT_SECONDS - (time.monotonic() - start)
+        done, pending = wait(pending, timeout=max(timeout, 0), return_when=FIRST_COMPLETED)
+        if not done:
+            raise TimeoutError()
+        for future in done:
+            if future.exception() is None:
+                if future is second:
+                    HEDGED_REQUESTS.labels(operation, "won").inc()
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def call_upstream_sync(upstream: str, operation: str, call: Callable[[], Any], hedge: bool = False) -> Any:
+    """`call_upstream` for callers on worker threads; blocks until the first attempt succeeds."""
+    breaker = get_breaker(upstream)
+    breaker.before_call()
+    try:
+        if hedge and HEDGING_ENABLED:
+            result = _hedged_sync(operation, _timed(operation, call))
+        else:
+            result = _pool.submit(_timed(operation, call)).result(timeout=UPSTREAM_TIMEOUT_SECONDS)
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    return result
+
+
+def upstream_available(upstream: str) -> bool:
+    """Whether the upstream's breaker would let a call through now."""
+    return get_breaker(upstream).available()
@@ -0,0 +1,167 @@
+"""
+Search sessions: follow-up queries ("now only refundable ones") that narrow the flights
+an earlier turn already retrieved instead of searching and reranking again.
+
+The graph state of each session is kept by a LangGraph checkpointer under the
+session ID. Besides the per-turn fields it carries `session`, written at the end of
+every turn: the effective filters, the flight candidates in ranked order and what
+they were retrieved with. A later turn whose filters only add to or tighten the
+previous ones is answered from those candidates.
+"""
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from langchain_core.documents import Document
+from langgraph.checkpoint.memory import InMemorySaver
+from src import shared_cache
+from src.filters import matches_filters
+
+logger = logging.getLogger(__name__)
+
+# memory (per worker process) or sqlite (shared by the workers on a host; needs langgraph-checkpoint-sqlite)
+SESSION_CHECKPOINTER = os.getenv("SESSION_CHECKPOINTER", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join("cache", "sessions.sqlite"))
+
+# Seconds of inactivity after which a session's candidates are no longer reused
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))
+
+# Sessions kept by the in-memory checkpointer; the least recently used are dropped
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+
+# A refinement leaving fewer candidates than this searches Qdrant again
+SESSION_MIN_CANDIDATES = int(os.getenv("SESSION_MIN_CANDIDATES", "3"))
+
+# Earlier queries of a session given to the LLM as context
+SESSION_HISTORY = 5
+
+_checkpointer = None
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """InMemorySaver that forgets the least recently updated sessions beyond `max_sessions`."""
+
+    def __init__(self, max_sessions: int):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self._threads: "OrderedDict[str, None]" = OrderedDict()
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        self._threads[thread_id] = None
+        self._threads.move_to_end(thread_id)
+        while len(self._threads) > self.max_sessions:
+            expired, _ = self._threads.popitem(last=False)
+            self.delete_thread(expired)
+        return super().put(config, checkpoint, metadata, new_versions)
+
+
+async def get_session_checkpointer():
+    """The checkpointer selected by SESSION_CHECKPOINTER, created on first use."""
+    global _checkpointer
+    if _checkpointer is None:
+        if SESSION_CHECKPOINTER == "sqlite":
+            import aiosqlite
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+            os.makedirs(os.path.dirname(SESSION_DB_PATH) or ".", exist_ok=True)
+            connection = await aiosqlite.connect(SESSION_DB_PATH)
+            await connection.execute("PRAGMA journal_mode=WAL")
+            _checkpointer = AsyncSqliteSaver(connection)
+            await _checkpointer.setup()
+        elif SESSION_CHECKPOINTER == "memory":
+            _checkpointer = BoundedMemorySaver(SESSION_MAX)
+        else:
+            raise ValueError(f"Unknown SESSION_CHECKPOINTER '{SESSION_CHECKPOINTER}', expected memory or sqlite")
+        logger.info(f"Search sessions are kept by the {SESSION_CHECKPOINTER} checkpointer")
+    return _checkpointer
+
+
+def active_session(state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The previous turn of the state's session, unless there is none or it has expired."""
+    session = state.get("session")
+    if not session or time.time() - session.get("updated_at", 0) > SESSION_TTL:
+        return None
+    return session
+
+
+def session_history(state: Dict[str, Any]) -> List[str]:
+    """Earlier queries of the session, oldest first."""
+    session = active_session(state)
+    return list(session["queries"]) if session else []
+
+
+def is_refinement(previous: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """
+    Whether `filters` select a subset of what `previous` selected: every previous filter
+    is kept, price bounds may only tighten, and any number of filters may be added.
+    """
+    for name, value in previous.items():
+        current = filters.get(name)
+        if current is None:
+            return False
+        if name == "max_price":
+            if current > value:
+                return False
+        elif name == "min_price":
+            if current < value:
+                return False
+        elif current != value:
+            return False
+    return True
+
+
+def _retrieved_with(state: Dict[str, Any]) -> Dict[str, Any]:
+    """What a turn's candidates depend on besides the filters."""
+    return {
+        "collection_name": state["collection_name"],
+        "search_params": state.get("search_params") or {},
+        "retrieval": state.get("retrieval") or {},
+        "generation": shared_cache.data_generation(),
+    }
+
+
+def refined_candidates(state: Dict[str, Any], filters: Dict[str, Any]) -> Optional[List[Document]]:
+    """
+    The previous turn's candidates that match the filters `filters` adds to the previous
+    ones, in their ranked order, when the turn refines the previous one. None when Qdrant
+    has to be searched again: there is no session, the collection, search settings or data
+    changed, the previous turn had no filters or these are not a refinement of them, its
+    candidates were cut off at flight_k, or too few candidates are left.
+    """
+    session = active_session(state)
+    if not session or not session.get("candidates") or session.get("retrieved_with") != _retrieved_with(state):
+        return None
+    # Unfiltered candidates are only the nearest few of the whole collection
+    if not session.get("filters") or not is_refinement(session["filters"], filters):
+        return None
+    # Matches ranked below flight_k were never retrieved and would be lost
+    if not session.get("complete"):
+        return None
+    # The candidates already reflect the previous filters; each added or tightened one must hold as well
+    added = {name: value for name, value in filters.items() if session["filters"].get(name) != value}
+    candidates = [doc for doc in session["candidates"] if matches_filters(doc.metadata, added)]
+    if len(candidates) < min(SESSION_MIN_CANDIDATES, len(session["candidates"])):
+        return None
+    return candidates
+
+
+def session_record(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    What the next turn of the session needs from this one: the query history, the
+    effective filters, and the flight candidates with the reranked ones first. Candidates
+    of the unfiltered fallback search don't match the filters and are not kept; `complete`
+    tells whether they are every match of the filters.
+    """
+    rank = {doc.metadata.get("_id"): position for position, doc in enumerate(state.get("reranked_docs") or [])}
+    candidates = (state.get("filtered_docs") or []) if state.get("filters_applied") else []
+    ordered = sorted(range(len(candidates)), key=lambda i: (rank.get(candidates[i].metadata.get("_id"), len(rank)), i))
+    return {
+        "queries": (session_history(state) + [state["query"]])[-SESSION_HISTORY:],
+        "query_type": state.get("query_type"),
+        "filters": state.get("filters") or {},
+        "candidates": [candidates[i] for i in ordered],
+        "complete": bool(state.get("filters_applied") and state.get("candidates_complete")),
+        "retrieved_with": _retrieved_with(state),
+        "updated_at": time.time(),
+    }
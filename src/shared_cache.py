@@ -0,0 +1,188 @@
+"""
+Host-local cache shared by every worker process: a SQLite database in WAL mode, so
+readers never wait for writers and all workers on a host warm the same entries.
+
+Entries live in namespaces with their own TTL. A data generation counter in the same
+database is bumped whenever ingestion or a promotion changes what a collection serves;
+caches whose entries depend on collection contents key them by generation.
+"""
+import os
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from src.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# Database file; empty disables the shared cache
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", os.path.join("cache", "shared.sqlite"))
+SHARED_CACHE_MAX_ENTRIES = int(os.getenv("SHARED_CACHE_MAX_ENTRIES", "200000"))
+
+# Seconds entries stay valid, per namespace; answers are only cached when ANSWER_CACHE_TTL is set
+NAMESPACE_TTLS = {
+    "answers": float(os.getenv("ANSWER_CACHE_TTL", "0")),
+    "embeddings": float(os.getenv("EMBEDDING_CACHE_TTL", str(7 * 24 * 3600))),
+    "facets": float(os.getenv("FACET_CACHE_TTL", "3600")),
+}
+
+# How long a process trusts the data generation it last read
+GENERATION_CHECK_INTERVAL = 1.0
+
+# One in this many writes also deletes expired entries and trims the table
+PRUNE_EVERY = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_expiry ON entries (expires_at);
+CREATE TABLE IF NOT EXISTS generations (
+    name TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL
+);
+"""
+
+_local = threading.local()
+_generation: Tuple[int, float] = (0, 0.0)  # (generation, monotonic time it was read)
+
+
+def enabled(namespace: Optional[str] = None) -> bool:
+    return bool(SHARED_CACHE_PATH) and (namespace is None or NAMESPACE_TTLS.get(namespace, 0) > 0)
+
+
+def _connection() -> sqlite3.Connection:
+    """This thread's connection; reopened after a fork or a change of SHARED_CACHE_PATH."""
+    state = (os.getpid(), SHARED_CACHE_PATH)
+    if getattr(_local, "state", None) != state:
+        os.makedirs(os.path.dirname(SHARED_CACHE_PATH) or ".", exist_ok=True)
+        connection = sqlite3.connect(SHARED_CACHE_PATH, timeout=5.0, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SCHEMA)
+        _local.connection, _local.state = connection, state
+    return _local.connection
+
+
+def cache_key(*parts: Any) -> str:
+    """Stable key for any JSON-serialisable parts."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def get_many(namespace: str, keys: Iterable[str]) -> Dict[str, bytes]:
+    """Unexpired values of the given keys; missing keys are left out."""
+    keys = list(dict.fromkeys(keys))
+    if not keys or not enabled(namespace):
+        return {}
+    try:
+        rows = _connection().execute(
+            f"SELECT key, value FROM entries WHERE namespace = ? AND expires_at > ? AND key IN ({','.join('?' * len(keys))})",
+            [namespace, time.time(), *keys]
+        ).fetchall()
+    except sqlite3.Error as e:
+        logger.warning(f"Shared cache read failed: {str(e)}")
+        return {}
+    found = dict(rows)
+    for key in keys:
+        record_cache(f"shared_{namespace}", key in found)
+    return found
+
+
+def get(namespace: str, key: str) -> Optional[bytes]:
+    return get_many(namespace, [key]).get(key)
+
+
+def put_many(namespace: str, items: Dict[str, bytes]):
+    """Store values for NAMESPACE_TTLS[namespace] seconds. Failures are logged, never raised."""
+    if not items or not enabled(namespace):
+        return
+    expires_at = time.time() + NAMESPACE_TTLS[namespace]
+    try:
+        connection = _connection()
+        connection.executemany(
+            "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            [(namespace, key, value, expires_at) for key, value in items.items()]
+        )
+        if random.random() < len(items) / PRUNE_EVERY:
+            prune(connection)
+    except sqlite3.Error as e:
+        logger.warning(f"Shared cache write failed: {str(e)}")
+
+
+def put(namespace: str, key: str, value: bytes):
+    put_many(namespace, {key: value})
+
+
+def get_json(namespace: str, key: str) -> Optional[Any]:
+    value = get(namespace, key)
+    return json.loads(value) if value is not None else None
+
+
+def put_json(namespace: str, key: str, value: Any):
+    put(namespace, key, json.dumps(value, default=str).encode())
+
+
+def prune(connection: Optional[sqlite3.Connection] = None):
+    """Delete expired entries, then the soonest-expiring ones beyond SHARED_CACHE_MAX_ENTRIES."""
+    connection = connection or _connection()
+    connection.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+    connection.execute(
+        "DELETE FROM entries WHERE (namespace, key) IN "
+        "(SELECT namespace, key FROM entries ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+        (SHARED_CACHE_MAX_ENTRIES,)
+    )
+
+
+def data_generation() -> int:
+    """Current data generation, re-read at most every GENERATION_CHECK_INTERVAL seconds."""
+    global _generation
+    if not enabled():
+        return 0
+    generation, read_at = _generation
+    now = time.monotonic()
+    if now - read_at < GENERATION_CHECK_INTERVAL:
+        return generation
+    try:
+        row = _connection().execute("SELECT generation FROM generations WHERE name = 'data'").fetchone()
+    except sqlite3.Error as e:
+        logger.warning(f"Shared cache read failed: {str(e)}")
+        return generation
+    _generation = (row[0] if row else 0, now)
+    return _generation[0]
+
+
+def bump_data_generation() -> int:
+    """Invalidate everything keyed by the data generation, in every worker."""
+    global _generation
+    if not enabled():
+        return 0
+    try:
+        connection = _connection()
+        connection.execute(
+            "INSERT INTO generations (name, generation) VALUES ('data', 1) "
+            "ON CONFLICT(name) DO UPDATE SET generation = generation + 1"
+        )
+        generation = connection.execute("SELECT generation FROM generations WHERE name = 'data'").fetchone()[0]
+    except sqlite3.Error as e:
+        logger.warning(f"Shared cache write failed: {str(e)}")
+        return _generation[0]
+    _generation = (generation, time.monotonic())
+    return generation
+
+
+def stats() -> Dict[str, Any]:
+    """Entry counts per namespace and the current data generation."""
+    if not enabled():
+        return {"enabled": False}
+    rows: List[Tuple[str, int]] = _connection().execute(
+        "SELECT namespace, COUNT(*) FROM entries WHERE expires_at > ? GROUP BY namespace", (time.time(),)
+    ).fetchall()
+    return {"enabled": True, "path": SHARED_CACHE_PATH, "entries": dict(rows), "data_generation": data_generation()}
@@ -0,0 +1,173 @@
+import time
+import logging
+import dataclasses
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from opentelemetry.trace import SpanKind
+from src.metrics import GRAPH_NODE_DURATION, UPSTREAM_DURATION, UPSTREAM_ERRORS, LLM_TOKENS
+from src.tracing import tracer, set_span_attributes
+
+logger = logging.getLogger(__name__)
+
+# USD per million input / output tokens, used for cost estimates
+MODEL_PRICES = {
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+# Timing record of the graph node running in the current context
+_current: ContextVar[Optional[Dict[str, Any]]] = ContextVar("node_timings", default=None)
+
+
+def _new_record() -> Dict[str, Any]:
+    return {"wall_ms": 0.0, "upstream_ms": {}, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0}
+
+
+def merge_timings(left: Optional[Dict[str, Any]], right: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    GraphState reducer: each node adds its own entry to `timings`. The empty dict of a
+    run's input starts over, so a checkpointed session doesn't carry earlier turns' entries.
+    """
+    if not right:
+        return {}
+    return {**(left or {}), **right}
+
+
+def _span_attributes(update: Dict[str, Any], record: Dict[str, Any]) -> Dict[str, Any]:
+    """Span attributes describing what a node produced."""
+    attributes = {
+        "query_type": update.get("query_type"),
+        "filter_count": len(update["filters"]) if "filters" in update else None,
+        "input_tokens": record["input_tokens"] or None,
+        "output_tokens": record["output_tokens"] or None,
+    }
+    for key in ("filtered_docs", "info_docs", "reranked_docs"):
+        if key in update:
+            attributes["docs_returned"] = len(update[key])
+    return attributes
+
+
+def timed_node(name: str):
+    """
+    Decorator for graph nodes returning a Command: runs the node in its own trace span,
+    measures wall time and collects the upstream latency and token usage recorded while
+    the node runs, and adds them to the Command's update as `timings[name]`.
+    """
+    def decorator(node):
+        @functools.wraps(node)
+        async def wrapper(state, *args, **kwargs):
+            record = _new_record()
+            token = _current.set(record)
+            start = time.perf_counter()
+            with tracer.start_as_current_span(name):
+                try:
+                    command = await node(state, *args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - start
+                    record["wall_ms"] = elapsed * 1000
+                    GRAPH_NODE_DURATION.labels(name).observe(elapsed)
+                    _current.reset(token)
+                update = dict(command.update or {})
+                set_span_attributes(**_span_attributes(update, record))
+            update["timings"] = {name: record}
+            return dataclasses.replace(command, update=update)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def track_upstream(upstream: str):
+    """
+    Time a call to an upstream service (gemini, qdrant, retrieval, reranker) in a client
+    span, add it to the current node's record and to the upstream latency/error metrics.
+    Works inside `asyncio.to_thread`, which copies the context.
+    """
+    start = time.perf_counter()
+    try:
+        with tracer.start_as_current_span(upstream, kind=SpanKind.CLIENT):
+            yield
+    except Exception:
+        UPSTREAM_ERRORS.labels(upstream).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        UPSTREAM_DURATION.labels(upstream).observe(elapsed)
+        record = _current.get()
+        if record is not None:
+            record["upstream_ms"][upstream] = record["upstream_ms"].get(upstream, 0.0) + elapsed * 1000
+
+
+def _model_key(model: str) -> str:
+    return model.split("/")[-1]
+
+
+def record_usage(model: str, response: Any):
+    """Add the token usage of a chat model response, and its estimated cost, to the current node."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    if not usage:
+        return
+    input_tokens = usage.get("input_tokens", 0)
+    output_tokens = usage.get("output_tokens", 0)
+    LLM_TOKENS.labels(_model_key(model), "input").inc(input_tokens)
+    LLM_TOKENS.labels(_model_key(model), "output").inc(output_tokens)
+    record = _current.get()
+    if record is None:
+        return
+    record["input_tokens"] += input_tokens
+    record["output_tokens"] += output_tokens
+    input_price, output_price = MODEL_PRICES.get(_model_key(model), (0.0, 0.0))
+    record["cost_usd"] += (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def summarize(timings: Dict[str, Any]) -> Dict[str, Any]:
+    """Totals over the nodes of one request."""
+    return {
+        "wall_ms": sum(node["wall_ms"] for node in timings.values()),
+        "input_tokens": sum(node["input_tokens"] for node in timings.values()),
+        "output_tokens": sum(node["output_tokens"] for node in timings.values()),
+        "cost_usd": sum(node["cost_usd"] for node in timings.values()),
+    }
+
+
+# In-process aggregates per node since start-up
+_aggregates: Dict[str, Dict[str, Any]] = {}
+_requests = 0
+
+
+def record_request(timings: Dict[str, Any]):
+    """Add the per-node timings of a finished request to the in-process aggregates."""
+    global _requests
+    _requests += 1
+    for node, record in timings.items():
+        aggregate = _aggregates.setdefault(node, {
+            "calls": 0, "wall_ms": 0.0, "max_wall_ms": 0.0, "upstream_ms": {},
+            "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0,
+        })
+        aggregate["calls"] += 1
+        aggregate["wall_ms"] += record["wall_ms"]
+        aggregate["max_wall_ms"] = max(aggregate["max_wall_ms"], record["wall_ms"])
+        for upstream, elapsed in record["upstream_ms"].items():
+            aggregate["upstream_ms"][upstream] = aggregate["upstream_ms"].get(upstream, 0.0) + elapsed
+        aggregate["input_tokens"] += record["input_tokens"]
+        aggregate["output_tokens"] += record["output_tokens"]
+        aggregate["cost_usd"] += record["cost_usd"]
+
+
+def timing_stats() -> Dict[str, Any]:
+    """Per-node call counts, mean and max wall time, mean upstream time, and token/cost totals."""
+    nodes = {}
+    for node, aggregate in _aggregates.items():
+        calls = aggregate["calls"]
+        nodes[node] = {
+            "calls": calls,
+            "mean_wall_ms": aggregate["wall_ms"] / calls,
+            "max_wall_ms": aggregate["max_wall_ms"],
+            "mean_upstream_ms": {upstream: total / calls for upstream, total in aggregate["upstream_ms"].items()},
+            "input_tokens": aggregate["input_tokens"],
+            "output_tokens": aggregate["output_tokens"],
+            "cost_usd": aggregate["cost_usd"],
+        }
+    return {"requests": _requests, "nodes": nodes}
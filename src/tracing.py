@@ -0,0 +1,74 @@
+import os
+import logging
+from contextlib import contextmanager
+from typing import Any, Mapping
+from opentelemetry import trace, propagate
+
+logger = logging.getLogger(__name__)
+
+# Where spans go:
+#   none - tracing disabled; spans are no-ops
+#   otlp - OTLP over HTTP to OTEL_EXPORTER_OTLP_ENDPOINT (default http://localhost:4318)
+#   file - one JSON span per line in TRACING_FILE, for inspecting traces without a collector
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none")
+TRACING_FILE = os.getenv("TRACING_FILE", os.path.join("logs", "traces.jsonl"))
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "jetkart")
+
+tracer = trace.get_tracer("jetkart")
+
+
+def setup_tracing():
+    """Install a tracer provider with the configured exporter. Without one every span is a no-op."""
+    if TRACING_EXPORTER == "none":
+        return
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+    if TRACING_EXPORTER == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.warning("TRACING_EXPORTER=otlp needs opentelemetry-exporter-otlp; tracing disabled")
+            return
+        exporter = OTLPSpanExporter()
+    elif TRACING_EXPORTER == "file":
+        os.makedirs(os.path.dirname(TRACING_FILE) or ".", exist_ok=True)
+        exporter = ConsoleSpanExporter(
+            out=open(TRACING_FILE, "a", encoding="utf-8"),
+            formatter=lambda span: span.to_json(indent=None) + os.linesep,
+        )
+    else:
+        logger.warning(f"Unknown TRACING_EXPORTER '{TRACING_EXPORTER}'; tracing disabled")
+        return
+
+    provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    logger.info(f"Tracing enabled with the {TRACING_EXPORTER} exporter")
+
+
+def shutdown_tracing():
+    provider = trace.get_tracer_provider()
+    if hasattr(provider, "shutdown"):
+        provider.shutdown()
+
+
+@contextmanager
+def request_span(name: str, headers: Mapping[str, str]):
+    """Server span for an HTTP request, continuing the trace in the incoming `traceparent` header."""
+    with tracer.start_as_current_span(
+        name, context=propagate.extract(headers), kind=trace.SpanKind.SERVER
+    ) as span:
+        yield span
+
+
+def set_span_attributes(**attributes: Any):
+    """Set attributes on the current span; None values are skipped."""
+    span = trace.get_current_span()
+    if not span.is_recording():
+        return
+    for key, value in attributes.items():
+        if value is not None:
+            span.set_attribute(key, value)